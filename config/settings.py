@@ -29,6 +29,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.RequestLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,6 +67,46 @@ DATABASES = {
     }
 }
 
+# DB_PROFILE=production (core.db): WAL journal plus SQLITE_PRAGMAS on every new connection;
+# up to DB_POOL_SIZE idle connections kept open per process; writes take the lock up front
+# (BEGIN IMMEDIATE) and wait up to busy_timeout ms for it. Catalog and dashboard reads go
+# to 'replica', a read-only connection to the same file, so they keep running while an
+# import writes.
+DB_PROFILE = os.environ.get('DB_PROFILE', '')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 16))
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 64 * 1024)),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'temp_store': 'MEMORY',
+}
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'core.db',
+        'OPTIONS': {'pragmas': {'journal_mode': 'WAL', **SQLITE_PRAGMAS}, 'pool_size': DB_POOL_SIZE,
+                    'transaction_mode': 'IMMEDIATE'},
+    })
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': {'pragmas': {**SQLITE_PRAGMAS, 'query_only': 'ON'}, 'pool_size': DB_POOL_SIZE},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['core.db.CatalogReadRouter']
+
+# Per-process cache for derived data; the data-version stamp lives in the
+# file-based 'shared' cache so every worker and management command sees it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'metabolome',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+}
+
 LANGUAGE_CODE = 'ko-kr'
 TIME_ZONE = 'Asia/Seoul'
 USE_I18N = True
@@ -75,10 +117,23 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Logging
-LOG_DIR = BASE_DIR / 'logs'
+# Logging: JSON lines written by a background thread (core.logs), rotated by size
+# (LOG_MAX_BYTES) or, with LOG_ROTATE_WHEN (e.g. 'midnight'), by time. Rotation is
+# per process; with several workers give each its own LOG_DIR.
+LOG_DIR = Path(os.environ.get('LOG_DIR') or BASE_DIR / 'logs')
 LOG_DIR.mkdir(exist_ok=True)
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 50 * 1024 * 1024))
+LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN', '')
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 10))
+# Share of page requests (PAGE and REQ records) logged; warnings are always kept
+LOG_PAGE_SAMPLE_RATE = float(os.environ.get('LOG_PAGE_SAMPLE_RATE', 1.0))
+
+if LOG_ROTATE_WHEN:
+    _log_rotation = {'class': 'logging.handlers.TimedRotatingFileHandler', 'when': LOG_ROTATE_WHEN}
+else:
+    _log_rotation = {'class': 'logging.handlers.RotatingFileHandler', 'maxBytes': LOG_MAX_BYTES}
 
+LOGGING_CONFIG = 'core.logs.configure'
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -88,13 +143,22 @@ LOGGING = {
             'style': '{',
             'datefmt': '%Y-%m-%d %H:%M:%S',
         },
+        'json': {
+            '()': 'core.logs.JSONFormatter',
+        },
+    },
+    'filters': {
+        'request': {
+            '()': 'core.logs.RequestContextFilter',
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': LOG_DIR / 'platform.log',
-            'formatter': 'verbose',
+            **_log_rotation,
+            'filename': LOG_DIR / 'platform.jsonl',
+            'backupCount': LOG_BACKUP_COUNT,
+            'formatter': 'json',
             'encoding': 'utf-8',
         },
         'console': {
@@ -106,11 +170,13 @@ LOGGING = {
     'loggers': {
         'core': {
             'handlers': ['file', 'console'],
+            'filters': ['request'],
             'level': 'INFO',
             'propagate': False,
         },
         'django.request': {
             'handlers': ['file', 'console'],
+            'filters': ['request'],
             'level': 'INFO',
             'propagate': False,
         },
@@ -120,3 +186,78 @@ LOGGING = {
 # Groq AI Settings
 GROQ_API_KEY = os.environ.get('GROQ_API_KEY', '')
 GROQ_MODEL = os.environ.get('GROQ_MODEL', 'llama-3.3-70b-versatile')
+GROQ_BASE_URL = os.environ.get('GROQ_BASE_URL') or None
+# Upstream call policy (core.resilience): each attempt times out after AI_ATTEMPT_TIMEOUT s
+# and a call gives up after AI_DEADLINE s. Timeouts, connection errors, 429 and 5xx are
+# retried up to AI_RETRIES times with full-jitter backoff (AI_RETRY_BASE * 2^n, at most
+# AI_RETRY_MAX s). After AI_BREAKER_THRESHOLD failed calls in a row, calls fail at once for
+# AI_BREAKER_COOLDOWN s; interpretations then fall back to the last cached answer.
+AI_ATTEMPT_TIMEOUT = float(os.environ.get('AI_ATTEMPT_TIMEOUT', 20))
+AI_DEADLINE = float(os.environ.get('AI_DEADLINE', 45))
+AI_RETRIES = int(os.environ.get('AI_RETRIES', 2))
+AI_RETRY_BASE = float(os.environ.get('AI_RETRY_BASE', 0.5))
+AI_RETRY_MAX = float(os.environ.get('AI_RETRY_MAX', 8))
+AI_BREAKER_THRESHOLD = int(os.environ.get('AI_BREAKER_THRESHOLD', 5))
+AI_BREAKER_COOLDOWN = float(os.environ.get('AI_BREAKER_COOLDOWN', 30))
+# Upper bound on concurrent upstream LLM calls per process, across all event loops (so it holds
+# under runserver/WSGI too). Upstream keep-alive connections are pooled per event loop, which
+# only outlives a request under an ASGI server (uvicorn).
+AI_MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', 256))
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', 7 * 24 * 3600))
+AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', 5000))
+# Admission control for the AI endpoints (core.throttle): a token bucket per client IP and
+# endpoint (AI_RATE_LIMIT_PER_MINUTE, bursts of AI_RATE_LIMIT_BURST; 0 disables), kept per
+# process or, with AI_RATE_LIMIT_DB (a SQLite file path), shared by all workers on the host;
+# then AI_ADMISSION_CONCURRENCY requests in flight per process (WSGI or ASGI) with
+# AI_ADMISSION_QUEUE more waiting up to AI_ADMISSION_WAIT seconds. Rejections are 429/503
+# with Retry-After.
+AI_RATE_LIMIT_PER_MINUTE = float(os.environ.get('AI_RATE_LIMIT_PER_MINUTE', 20))
+AI_RATE_LIMIT_BURST = int(os.environ.get('AI_RATE_LIMIT_BURST', 10))
+AI_RATE_LIMIT_DB = os.environ.get('AI_RATE_LIMIT_DB', '')
+AI_ADMISSION_CONCURRENCY = int(os.environ.get('AI_ADMISSION_CONCURRENCY', 128))
+AI_ADMISSION_QUEUE = int(os.environ.get('AI_ADMISSION_QUEUE', 64))
+AI_ADMISSION_WAIT = float(os.environ.get('AI_ADMISSION_WAIT', 2))
+AI_ADMISSION_RETRY_AFTER = int(os.environ.get('AI_ADMISSION_RETRY_AFTER', 5))
+# Chat sessions (core.chat): each upstream chat request is kept under CHAT_TOKEN_BUDGET
+# estimated prompt tokens; older turns are folded into a rolling summary of at most
+# CHAT_SUMMARY_MAX_TOKENS. Sessions idle for CHAT_SESSION_TTL seconds are deleted.
+CHAT_TOKEN_BUDGET = int(os.environ.get('CHAT_TOKEN_BUDGET', 4000))
+CHAT_SUMMARY_MAX_TOKENS = int(os.environ.get('CHAT_SUMMARY_MAX_TOKENS', 400))
+CHAT_SESSION_TTL = int(os.environ.get('CHAT_SESSION_TTL', 7 * 24 * 3600))
+# Chat grounding (core.rag): the RAG_TOP_K catalog records (compounds, crops, regional
+# environment) most similar to each message by TF-IDF, in at most RAG_TOKEN_BUDGET
+# estimated tokens (and a quarter of CHAT_TOKEN_BUDGET). RAG_TOP_K=0 disables retrieval.
+RAG_TOP_K = int(os.environ.get('RAG_TOP_K', 8))
+RAG_TOKEN_BUDGET = int(os.environ.get('RAG_TOKEN_BUDGET', 600))
+# Batch interpretation jobs (run_ai_worker)
+AI_WORKER_CONCURRENCY = int(os.environ.get('AI_WORKER_CONCURRENCY', 8))
+AI_JOB_MAX_ITEMS = int(os.environ.get('AI_JOB_MAX_ITEMS', 2000))
+AI_JOB_MAX_ATTEMPTS = int(os.environ.get('AI_JOB_MAX_ATTEMPTS', 5))
+# Requeues after a 429 or an open circuit, with backoff; these do not use up AI_JOB_MAX_ATTEMPTS
+AI_JOB_MAX_DEFERRALS = int(os.environ.get('AI_JOB_MAX_DEFERRALS', 20))
+
+# Trained origin-discrimination models (train_origin_model), memory-mapped by web workers
+ORIGIN_MODEL_DIR = os.environ.get('ORIGIN_MODEL_DIR') or BASE_DIR / 'origin_models'
+
+# Catalog data-package exports (/api/export/, export_catalog), cached by request checksum
+EXPORT_DIR = os.environ.get('EXPORT_DIR') or BASE_DIR / 'exports'
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+EXPORT_CACHE_MAX_AGE = int(os.environ.get('EXPORT_CACHE_MAX_AGE', 24 * 3600))
+
+# Read-only pages: ETag = data version + query parameters + PAGE_CACHE_SALT (set per release,
+# since templates change without a data write); rendered bodies kept in a per-process LRU and,
+# with PAGE_CACHE_SHARED, in the 'shared' cache for other workers.
+PAGE_CACHE_SALT = os.environ.get('PAGE_CACHE_SALT', '')
+PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 256))
+PAGE_CACHE_SHARED = os.environ.get('PAGE_CACHE_SHARED', '') == '1'
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 24 * 3600))
+
+# Prometheus metrics at /metrics (core.metrics). Each process snapshots its counters to
+# METRICS_DIR every METRICS_FLUSH_INTERVAL seconds so one scrape covers all workers
+# (set METRICS_DIR='' for a single-process view); snapshots not rewritten for
+# METRICS_SNAPSHOT_MAX_AGE seconds are deleted. With METRICS_TOKEN, scrapes need
+# "Authorization: Bearer <token>".
+METRICS_DIR = os.environ.get('METRICS_DIR', BASE_DIR / 'metrics')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_SNAPSHOT_MAX_AGE = float(os.environ.get('METRICS_SNAPSHOT_MAX_AGE', 3600))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
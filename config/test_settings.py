@@ -0,0 +1,33 @@
+"""Settings for ``manage.py test`` (selected by manage.py).
+
+The shared cache, logs and metrics snapshots stay out of the working tree, so a test
+run never bumps the live data version or adds to /metrics.
+"""
+import atexit
+import shutil
+import tempfile
+from pathlib import Path
+
+from . import settings as _base
+
+globals().update((name, value) for name, value in vars(_base).items() if name.isupper())
+
+_test_dir = Path(tempfile.mkdtemp(prefix='metabolome-test-'))
+atexit.register(shutil.rmtree, _test_dir, ignore_errors=True)
+
+CACHES = {
+    **_base.CACHES,
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+}
+
+LOG_DIR = _test_dir / 'logs'
+LOG_DIR.mkdir()
+LOGGING = {
+    **_base.LOGGING,
+    'handlers': {
+        **_base.LOGGING['handlers'],
+        'file': {**_base.LOGGING['handlers']['file'], 'filename': LOG_DIR / 'platform.jsonl'},
+    },
+}
+
+METRICS_DIR = ''
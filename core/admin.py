@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Crop, Compound, EnvironmentData
+from .models import Crop, Compound, EnvironmentData, Region
 
 admin.site.register(Crop)
 admin.site.register(Compound)
 admin.site.register(EnvironmentData)
+admin.site.register(Region)
@@ -0,0 +1,154 @@
+"""Persistent cache for AI interpretations.
+
+Entries are keyed by a SHA-256 of the prompt template, model name and the
+canonicalized input JSON, stored in the AICacheEntry table with a TTL and
+least-recently-used eviction. Concurrent misses for the same key are
+coalesced so only one upstream call is in flight per process (per event
+loop for the async path). When that call fails, the last stored answer for
+the key is served instead, even past its TTL, marked ``"stale": true``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .models import AICacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Only bump accessed_at this often so cache hits rarely write.
+TOUCH_INTERVAL = timedelta(minutes=5)
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def make_key(template, model, payload):
+    """Hash of prompt template, model and canonical input; identical questions share a key."""
+    blob = json.dumps([template, model, _canonical(payload)],
+                      sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def get(key, stale=False):
+    """The stored response, or None; ``stale`` also returns entries past AI_CACHE_TTL."""
+    entry = AICacheEntry.objects.filter(key=key).first()
+    if entry is None:
+        return None
+    now = timezone.now()
+    if now - entry.created_at > timedelta(seconds=settings.AI_CACHE_TTL) and not stale:
+        return None
+    if now - entry.accessed_at > TOUCH_INTERVAL:
+        AICacheEntry.objects.filter(pk=entry.pk).update(accessed_at=now, hits=entry.hits + 1)
+    return entry.response
+
+
+def put(key, kind, response):
+    now = timezone.now()
+    AICacheEntry.objects.update_or_create(
+        key=key, defaults={'kind': kind, 'response': response, 'created_at': now, 'accessed_at': now})
+    stale = AICacheEntry.objects.order_by('-accessed_at').values_list('pk', flat=True)[settings.AI_CACHE_MAX_ENTRIES:]
+    evicted, _ = AICacheEntry.objects.filter(pk__in=list(stale)).delete()
+    if evicted:
+        logger.info("AI cache evicted %d LRU entries", evicted)
+
+
+def _fallback(key, kind, result):
+    """``result`` unless it is an error with an older answer for ``key`` to serve instead."""
+    if 'error' not in result:
+        return result
+    stale = get(key, stale=True)
+    if stale is None:
+        return result
+    logger.warning("AI cache STALE | %s %s served after: %s", kind, key[:12], result['error'])
+    metrics.inc('ai_cache_requests_total', kind=kind, result='stale')
+    return {**stale, 'stale': True}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def get_or_compute(key, kind, compute):
+    """Return the cached response or run ``compute`` once for all concurrent callers.
+
+    Responses containing ``error`` are not stored; callers get the stale answer, if any, or the error.
+    """
+    cached = get(key)
+    if cached is not None:
+        logger.info("AI cache HIT | %s %s", kind, key[:12])
+        metrics.inc('ai_cache_requests_total', kind=kind, result='hit')
+        return cached
+
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _Call()
+    metrics.inc('ai_cache_requests_total', kind=kind, result='miss' if leader else 'coalesced')
+    if not leader:
+        call.done.wait()
+        return call.result
+
+    try:
+        call.result = compute()
+        if 'error' not in call.result:
+            put(key, kind, call.result)
+        call.result = _fallback(key, kind, call.result)
+        return call.result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        call.done.set()
+
+
+_ainflight = {}
+
+
+async def _acompute(key, kind, compute):
+    result = await compute()
+    if 'error' not in result:
+        await sync_to_async(put)(key, kind, result)
+        return result
+    return await sync_to_async(_fallback)(key, kind, result)
+
+
+async def aget_or_compute(key, kind, compute):
+    """Async ``get_or_compute``; ``compute`` is a coroutine function.
+
+    The shared call is shielded so one client disconnecting does not cancel it for the others.
+    """
+    cached = await sync_to_async(get)(key)
+    if cached is not None:
+        logger.info("AI cache HIT | %s %s", kind, key[:12])
+        metrics.inc('ai_cache_requests_total', kind=kind, result='hit')
+        return cached
+
+    task = _ainflight.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = _ainflight[key] = asyncio.ensure_future(_acompute(key, kind, compute))
+        task.add_done_callback(lambda t: _ainflight.pop(key, None) if _ainflight.get(key) is t else None)
+        metrics.inc('ai_cache_requests_total', kind=kind, result='miss')
+    else:
+        metrics.inc('ai_cache_requests_total', kind=kind, result='coalesced')
+    return await asyncio.shield(task)
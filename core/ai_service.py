@@ -1,15 +1,78 @@
+import asyncio
+import importlib.util
 import json
 import logging
+import time
+import weakref
+from contextlib import contextmanager
 
 from django.conf import settings
 
+from . import ai_cache, metrics, resilience, throttle
+
 logger = logging.getLogger(__name__)
 
-try:
-    from groq import Groq
-    client = Groq(api_key=settings.GROQ_API_KEY) if settings.GROQ_API_KEY else None
-except Exception:
-    client = None
+NO_KEY_ERROR = "GROQ_API_KEY가 설정되지 않았습니다."
+
+client = None
+_config = {}
+# Async client per event loop (it binds to the loop it first runs on)
+_loop_state = weakref.WeakKeyDictionary()
+# Upstream calls in flight, capped at AI_MAX_CONCURRENCY across all loops of this process
+_slots = None
+
+
+def configure(api_key=None, base_url=None):
+    """(Re)build the Groq clients; called at import with settings values.
+
+    The SDK's own retries are off: core.resilience retries, within a deadline.
+    """
+    global client, _slots
+    _config.update(api_key=api_key or settings.GROQ_API_KEY,
+                   base_url=base_url or settings.GROQ_BASE_URL,
+                   max_retries=0, timeout=settings.AI_ATTEMPT_TIMEOUT)
+    _loop_state.clear()
+    _slots = throttle.Gate(settings.AI_MAX_CONCURRENCY)
+    try:
+        from groq import Groq
+        client = Groq(**_config) if _config['api_key'] else None
+    except Exception:
+        client = None
+
+
+def _make_async_client():
+    if not _config['api_key']:
+        return None
+    # A broken SDK install should fail here, not pass for a missing API key.
+    import httpx
+    from groq import AsyncGroq, DefaultAioHttpClient, DefaultAsyncHttpxClient
+    # Size the pool to the concurrency cap (the SDK default is 100 connections).
+    pool = httpx.Limits(max_connections=settings.AI_MAX_CONCURRENCY,
+                        max_keepalive_connections=settings.AI_MAX_CONCURRENCY)
+    # The aiohttp transport (optional) scales far better past ~100 connections.
+    if importlib.util.find_spec('httpx_aiohttp'):
+        http_client = DefaultAioHttpClient(limits=pool)
+    else:
+        http_client = DefaultAsyncHttpxClient(limits=pool)
+    return AsyncGroq(**_config, http_client=http_client)
+
+
+def _loop_resources():
+    """(the running loop's async client, the process-wide gate capping in-flight calls)."""
+    loop = asyncio.get_running_loop()
+    if loop not in _loop_state:
+        _loop_state[loop] = _make_async_client()
+    return _loop_state[loop], _slots
+
+
+async def aclose():
+    """Close the running loop's async client (for scripts that own their event loop)."""
+    async_client = _loop_state.pop(asyncio.get_running_loop(), None)
+    if async_client:
+        await async_client.close()
+
+
+configure()
 
 SYSTEM_PROMPT = """당신은 '특용작물 대사체 통합 디지털 플랫폼'의 AI 어시스턴트입니다.
 한국의 특용작물(인삼, 당귀, 황기, 결명자, 단삼, 상황버섯, 동충하초 등)에 대한 대사체(metabolomics) 전문 지식을 갖고 있습니다.
@@ -23,6 +86,7 @@ SYSTEM_PROMPT = """당신은 '특용작물 대사체 통합 디지털 플랫폼'
 주의사항:
 - 의학적 진단이나 처방은 제공하지 않습니다
 - 데이터에 근거한 객관적 해석을 제공합니다
+- '플랫폼 데이터' 메시지가 있으면 그 기록의 수치를 우선 근거로 삼습니다
 - 불확실한 내용은 명시적으로 한계를 안내합니다
 - 한국어로 답변합니다"""
 
@@ -57,92 +121,258 @@ DASHBOARD_INTERPRET_PROMPT = """아래 두 작물의 비교 데이터를 분석
 }}"""
 
 
-def chat_completion(messages):
-    """General chat completion with conversation history."""
-    if not client:
-        return {"error": "GROQ_API_KEY가 설정되지 않았습니다. 환경변수를 확인하세요."}
+class _Upstream:
+    usage = None
+
+
+@contextmanager
+def _upstream(operation):
+    """Record one provider call: latency, token usage (set ``call.usage``) and errors."""
+    call = _Upstream()
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        metrics.inc('llm_errors_total', operation=operation, error=type(e).__name__)
+        raise
+    finally:
+        metrics.observe('llm_request_duration_seconds', time.perf_counter() - start, operation=operation)
+        if call.usage is not None:
+            metrics.inc('llm_tokens_total', call.usage.prompt_tokens or 0, operation=operation, type='prompt')
+            metrics.inc('llm_tokens_total', call.usage.completion_tokens or 0, operation=operation, type='completion')
+
+
+def _complete(operation, messages, **params):
+    """Chat completion on the sync client, with the deadline, retries and breaker of core.resilience."""
+    def attempt(timeout):
+        with _upstream(operation) as call:
+            response = client.chat.completions.create(
+                model=settings.GROQ_MODEL, messages=messages, timeout=timeout, **params)
+            call.usage = response.usage
+        return response
+    return resilience.call(operation, attempt)
+
+
+async def _acomplete(operation, messages, retries=None, **params):
+    """Async ``_complete`` on the running loop's client; waiting for a concurrency slot is not
+    counted against the deadline."""
+    async_client, slots = _loop_resources()
+    if not async_client:
+        raise AIServiceError(NO_KEY_ERROR)
+
+    async def attempt(timeout):
+        with _upstream(operation) as call:
+            response = await async_client.chat.completions.create(
+                model=settings.GROQ_MODEL, messages=messages, timeout=timeout, **params)
+            call.usage = response.usage
+        return response
+
+    async with slots:
+        return await resilience.acall(operation, attempt, retries)
+
+
+def _chat_messages(messages):
+    return [{"role": "system", "content": SYSTEM_PROMPT}, *messages]
 
+
+def _interpret_messages(template, field, data):
+    prompt = template.format(**{field: json.dumps(data, ensure_ascii=False, indent=2)})
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _parse_structured(content):
     try:
-        chat_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        chat_messages.extend(messages)
-
-        response = client.chat.completions.create(
-            model=settings.GROQ_MODEL,
-            messages=chat_messages,
-            temperature=0.7,
-            max_tokens=1024,
-        )
+        return json.loads(content)
+    except json.JSONDecodeError:
+        # Try extracting JSON from markdown code block
+        if "```" in content:
+            json_str = content.split("```")[1]
+            if json_str.startswith("json"):
+                json_str = json_str[4:]
+            return json.loads(json_str.strip())
+        return {"raw_text": content}
+
+
+async def achat_completion(messages):
+    """Async chat completion; waits for a concurrency slot instead of a worker thread."""
+    try:
+        response = await _acomplete('chat', _chat_messages(messages), temperature=0.7, max_tokens=1024)
         return {
             "role": "assistant",
             "content": response.choices[0].message.content,
         }
+    except AIServiceError as e:
+        return {"error": str(e) + " 환경변수를 확인하세요."}
+    except resilience.CircuitOpenError as e:
+        return {"error": str(e)}
     except Exception as e:
-        logger.exception("Groq chat_completion error")
+        logger.exception("Groq achat_completion error")
         return {"error": str(e)}
 
 
-def interpret_compound(compound_data):
-    """Interpret a single compound's data with structured output."""
+class AIServiceError(Exception):
+    pass
+
+
+async def achat_stream(messages):
+    """Yield reply text deltas as the provider streams them.
+
+    Cancelling the consumer (e.g. on client disconnect) closes the upstream stream.
+    """
+    async_client, slots = _loop_resources()
+    if not async_client:
+        raise AIServiceError(NO_KEY_ERROR + " 환경변수를 확인하세요.")
+
+    async with slots:
+        with _upstream('chat_stream') as call:
+            # Retries and the deadline cover opening the stream; afterwards each read waits
+            # at most AI_ATTEMPT_TIMEOUT.
+            stream = await resilience.acall('chat_stream', lambda timeout: async_client.chat.completions.create(
+                model=settings.GROQ_MODEL,
+                messages=_chat_messages(messages),
+                temperature=0.7,
+                max_tokens=1024,
+                stream=True,
+                timeout=timeout,
+            ))
+            try:
+                async for chunk in stream:
+                    # Groq reports usage on the last chunk, under x_groq.
+                    usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or getattr(chunk, 'usage', None)
+                    if usage is not None:
+                        call.usage = usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+            finally:
+                await stream.close()
+
+
+CHAT_SUMMARY_PROMPT = """아래는 사용자와 AI 어시스턴트의 이전 대화 요약과 그 뒤에 이어진 대화입니다.
+둘을 합쳐 이후 답변에 필요한 사실·수치·성분명·사용자의 관심사를 담은 새 요약을 한국어로 작성하세요.
+요약 본문만 출력하세요.
+
+이전 요약:
+{summary}
+
+이어진 대화:
+{transcript}"""
+
+
+async def asummarize_chat(summary, turns):
+    """Fold ``turns`` [(role, content)] into the rolling ``summary``; raises provider errors."""
+    transcript = '\n'.join(f"{'사용자' if role == 'user' else '어시스턴트'}: {content}" for role, content in turns)
+    prompt = CHAT_SUMMARY_PROMPT.format(summary=summary or '(없음)', transcript=transcript)
+    response = await _acomplete('chat_summary', [{"role": "user", "content": prompt}],
+                                temperature=0.3, max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS)
+    return response.choices[0].message.content.strip()
+
+
+def _interpret(template, field, data, label):
+    """Structured JSON interpretation of ``data`` rendered into ``template``."""
     if not client:
-        return {"error": "GROQ_API_KEY가 설정되지 않았습니다."}
+        return {"error": NO_KEY_ERROR}
 
     try:
-        prompt = COMPOUND_INTERPRET_PROMPT.format(
-            compound_data=json.dumps(compound_data, ensure_ascii=False, indent=2)
-        )
-        response = client.chat.completions.create(
-            model=settings.GROQ_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.5,
-            max_tokens=1024,
-        )
-        content = response.choices[0].message.content
-        try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            # Try extracting JSON from markdown code block
-            if "```" in content:
-                json_str = content.split("```")[1]
-                if json_str.startswith("json"):
-                    json_str = json_str[4:]
-                return json.loads(json_str.strip())
-            return {"raw_text": content}
+        response = _complete(label, _interpret_messages(template, field, data), temperature=0.5, max_tokens=1024)
+        return _parse_structured(response.choices[0].message.content)
+    except resilience.CircuitOpenError as e:
+        return {"error": str(e)}
     except Exception as e:
-        logger.exception("Groq interpret_compound error")
+        logger.exception("Groq %s error", label)
         return {"error": str(e)}
 
 
-def interpret_dashboard(dashboard_data):
-    """Interpret dashboard comparison data with structured output."""
-    if not client:
-        return {"error": "GROQ_API_KEY가 설정되지 않았습니다."}
+async def _acreate_interpretation(template, field, data, retries=None):
+    """Structured interpretation that lets provider errors (rate limits, timeouts) propagate."""
+    response = await _acomplete('interpret_' + field.removesuffix('_data'), _interpret_messages(template, field, data),
+                                retries, temperature=0.5, max_tokens=1024)
+    return _parse_structured(response.choices[0].message.content)
 
+
+async def _ainterpret(template, field, data, label):
     try:
-        prompt = DASHBOARD_INTERPRET_PROMPT.format(
-            dashboard_data=json.dumps(dashboard_data, ensure_ascii=False, indent=2)
-        )
-        response = client.chat.completions.create(
-            model=settings.GROQ_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.5,
-            max_tokens=1024,
-        )
-        content = response.choices[0].message.content
-        try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            if "```" in content:
-                json_str = content.split("```")[1]
-                if json_str.startswith("json"):
-                    json_str = json_str[4:]
-                return json.loads(json_str.strip())
-            return {"raw_text": content}
+        return await _acreate_interpretation(template, field, data)
+    except (AIServiceError, resilience.CircuitOpenError) as e:
+        return {"error": str(e)}
     except Exception as e:
-        logger.exception("Groq interpret_dashboard error")
+        logger.exception("Groq %s error", label)
         return {"error": str(e)}
+
+
+def compound_payload(compound):
+    """Interpretation input for one compound, in the shape the catalog page sends."""
+    crop = compound.crop
+    return {
+        'name': compound.name,
+        'crop': crop.name_ko,
+        'crop_en': crop.name_en,
+        'plant_part': crop.plant_part,
+        'origin': crop.origin,
+        'year': crop.year,
+        'annotation_level': compound.annotation_level,
+        'source': compound.source,
+        'score': compound.score,
+        'similarity': compound.similarity,
+        'qc_status': compound.qc_status,
+        'compound_class': compound.compound_class,
+        'molecular_weight': compound.molecular_weight,
+        'retention_time': compound.retention_time,
+    }
+
+
+def dashboard_payload(crop_a_name, compounds_a, crop_b_name, compounds_b, env_data):
+    """Interpretation input for a crop comparison, in the shape the dashboard page sends."""
+    environment = {}
+    if env_data:
+        environment = {
+            'region': str(env_data.region),
+            'period': env_data.period.isoformat(),
+            'avg_temperature': env_data.avg_temperature,
+            'avg_rainfall': env_data.avg_rainfall,
+            'soil_grade': env_data.soil_grade,
+        }
+    return {
+        'crop_a': {'name': crop_a_name, 'compounds': compounds_a},
+        'crop_b': {'name': crop_b_name, 'compounds': compounds_b},
+        'environment': environment,
+    }
+
+
+def compound_cache_key(compound_data):
+    return ai_cache.make_key(COMPOUND_INTERPRET_PROMPT, settings.GROQ_MODEL, compound_data)
+
+
+def interpret_compound(compound_data):
+    """Interpret a single compound's data, served from the AI cache when possible."""
+    return ai_cache.get_or_compute(compound_cache_key(compound_data), 'compound', lambda: _interpret(
+        COMPOUND_INTERPRET_PROMPT, 'compound_data', compound_data, 'interpret_compound'))
+
+
+def interpret_dashboard(dashboard_data):
+    """Interpret dashboard comparison data, served from the AI cache when possible."""
+    key = ai_cache.make_key(DASHBOARD_INTERPRET_PROMPT, settings.GROQ_MODEL, dashboard_data)
+    return ai_cache.get_or_compute(key, 'dashboard', lambda: _interpret(
+        DASHBOARD_INTERPRET_PROMPT, 'dashboard_data', dashboard_data, 'interpret_dashboard'))
+
+
+async def ainterpret_compound(compound_data):
+    return await ai_cache.aget_or_compute(compound_cache_key(compound_data), 'compound', lambda: _ainterpret(
+        COMPOUND_INTERPRET_PROMPT, 'compound_data', compound_data, 'interpret_compound'))
+
+
+async def ainterpret_compound_uncached(compound_data, retries=None):
+    """Compound interpretation bypassing the cache; raises provider errors so callers can retry.
+
+    ``retries`` overrides AI_RETRIES (0 for callers that schedule their own retries).
+    """
+    return await _acreate_interpretation(COMPOUND_INTERPRET_PROMPT, 'compound_data', compound_data, retries)
+
+
+async def ainterpret_dashboard(dashboard_data):
+    key = ai_cache.make_key(DASHBOARD_INTERPRET_PROMPT, settings.GROQ_MODEL, dashboard_data)
+    return await ai_cache.aget_or_compute(key, 'dashboard', lambda: _ainterpret(
+        DASHBOARD_INTERPRET_PROMPT, 'dashboard_data', dashboard_data, 'interpret_dashboard'))
@@ -1,5 +1,28 @@
+from importlib import import_module
+
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def _restore_search_triggers(using, **kwargs):
+    from django.db import connections
+    from . import search
+    conn = connections[using]
+    if search.TABLE in conn.introspection.table_names():
+        search.install(conn)
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Imported for its receivers (data version, summary refresh).
+        import_module(f'{self.name}.signals')
+        # A migration that rebuilds core_compound/core_crop drops the search triggers.
+        post_migrate.connect(_restore_search_triggers, sender=self)
+        from .metrics import install_query_counter
+        connection_created.connect(install_query_counter)
+        from .origin import preload
+        # Map trained origin models now so the first prediction does not pay for it.
+        preload()
@@ -0,0 +1,71 @@
+"""Research catalog filters and row payloads, shared by the catalog views, AI jobs and exports."""
+from .models import Compound
+
+
+def catalog_filters(params):
+    return {
+        'crop': params.get('crop', ''),
+        'part': params.get('part', ''),
+        'origin': params.get('origin', ''),
+        'year': params.get('year', ''),
+        'qc': params.get('qc', 'PASS'),
+    }
+
+
+def filter_compounds(filters):
+    """Apply catalog filters. Raises ValueError on a malformed year."""
+    compounds = Compound.objects.select_related('crop')
+    if filters['crop']:
+        compounds = compounds.filter(crop__name_ko=filters['crop'])
+    if filters['part']:
+        compounds = compounds.filter(crop__plant_part=filters['part'])
+    if filters['origin']:
+        compounds = compounds.filter(crop__origin=filters['origin'])
+    if filters['year']:
+        compounds = compounds.filter(crop__year=int(filters['year']))
+    if filters['qc']:
+        compounds = compounds.filter(qc_status=filters['qc'])
+    return compounds
+
+
+# Fields of the columnar payload's rows; the crop ones are sent once per crop, in a crop table.
+COLUMN_FIELDS = ('id', 'score', 'name', 'annotation_level', 'source', 'qc_status', 'compound_class',
+                 'similarity', 'molecular_weight', 'retention_time',
+                 'crop_id', 'crop__name_ko', 'crop__name_en', 'crop__plant_part', 'crop__origin', 'crop__year')
+PLAIN = {'id': 'id', 'score': 'score', 'name': 'name', 'similarity': 'similarity',
+         'molecular_weight': 'mw', 'retention_time': 'rt'}
+# Low-cardinality fields, sent as indexes into a value list
+ENCODED = {'annotation_level': 'level', 'source': 'source', 'qc_status': 'qc', 'compound_class': 'class'}
+CROP_FIELDS = {'crop_id': 'id', 'crop__name_ko': 'name', 'crop__name_en': 'name_en',
+               'crop__plant_part': 'part', 'crop__origin': 'origin', 'crop__year': 'year'}
+
+
+def column_rows(compounds):
+    """``compounds`` as COLUMN_FIELDS tuples, for ``columnar``."""
+    return compounds.values_list(*COLUMN_FIELDS)
+
+
+def columnar(rows):
+    """Column-oriented catalog payload for COLUMN_FIELDS tuples.
+
+    Each column is one array with an entry per row. Repeated strings (level, source, QC, class)
+    are indexes into ``dicts``, and ``crop`` indexes the ``crops`` table, which holds each crop's
+    name, part, origin and year once rather than once per compound.
+    """
+    columns = dict(zip(COLUMN_FIELDS, zip(*rows))) if rows else dict.fromkeys(COLUMN_FIELDS, ())
+    payload = {'count': len(rows), 'columns': {}, 'dicts': {}}
+    for field, key in PLAIN.items():
+        payload['columns'][key] = list(columns[field])
+    for field, key in ENCODED.items():
+        values = list(dict.fromkeys(columns[field]))
+        codes = {value: i for i, value in enumerate(values)}
+        payload['dicts'][key] = values
+        payload['columns'][key] = [codes[value] for value in columns[field]]
+
+    first = {}
+    for i, pk in enumerate(columns['crop_id']):
+        first.setdefault(pk, i)
+    payload['crops'] = {key: [columns[field][i] for i in first.values()] for field, key in CROP_FIELDS.items()}
+    index = {pk: n for n, pk in enumerate(first)}
+    payload['columns']['crop'] = [index[pk] for pk in columns['crop_id']]
+    return payload
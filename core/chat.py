@@ -0,0 +1,129 @@
+"""Server-side chat sessions kept under a token budget.
+
+Clients post only the new message and the session key. Each upstream request
+holds SYSTEM_PROMPT, the session's rolling summary, the most recent turns
+verbatim, any catalog records retrieved for the message (core.rag) and the
+new message, estimated at no more than CHAT_TOKEN_BUDGET tokens. When the recent turns no longer fit, the oldest are folded into the
+summary by one extra LLM call. The fold leaves the window half full, so it
+runs once every few turns rather than on every message. The summary is
+stored on the session and reused until the next fold. If the summary call
+fails, the folded turns are simply dropped from the prompt.
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import ai_service
+from .models import ChatSession, ChatTurn
+
+logger = logging.getLogger(__name__)
+
+# Role markers and separators the chat template adds around every message
+MESSAGE_OVERHEAD = 4
+SUMMARY_HEADER = '이전 대화 요약:\n'
+
+
+def estimate_tokens(text):
+    """Rough Llama-3 token count: about 4 ASCII characters per token, one per Hangul or other character."""
+    ascii_chars = sum(1 for ch in text if ch < '\x80')
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars + MESSAGE_OVERHEAD
+
+
+def fits(message):
+    """Whether a single new message leaves room for the summary and some history."""
+    return estimate_tokens(message) <= settings.CHAT_TOKEN_BUDGET // 2
+
+
+def _context_tokens(context):
+    return estimate_tokens(context) if context else 0
+
+
+def fit_messages(messages, context=''):
+    """Client-held history (legacy requests): the newest messages within the budget."""
+    available = settings.CHAT_TOKEN_BUDGET - estimate_tokens(ai_service.SYSTEM_PROMPT) - _context_tokens(context)
+    kept = []
+    for message in reversed(messages):
+        available -= estimate_tokens(message.get('content', ''))
+        if available < 0 and kept:
+            break
+        kept.append(message)
+    return kept[::-1]
+
+
+def _load(key):
+    """The live session for ``key`` (a new one when missing or expired) and its unsummarized turns."""
+    stale = timezone.now() - timedelta(seconds=settings.CHAT_SESSION_TTL)
+    session = None
+    if key:
+        try:
+            session = ChatSession.objects.filter(key=key, updated_at__gte=stale).first()
+        except ValidationError:
+            pass  # not a session key: start over
+    if session is None:
+        deleted, _ = ChatSession.objects.filter(updated_at__lt=stale).delete()
+        if deleted:
+            logger.info("Chat sessions expired: %d rows", deleted)
+        return ChatSession.objects.create(), []
+    return session, list(session.turns.filter(id__gt=session.summarized_until))
+
+
+def _split(turns, message, context=''):
+    """(turns kept verbatim, oldest turns to fold into the summary)."""
+    available = (settings.CHAT_TOKEN_BUDGET - estimate_tokens(ai_service.SYSTEM_PROMPT)
+                 - estimate_tokens(SUMMARY_HEADER) - settings.CHAT_SUMMARY_MAX_TOKENS - estimate_tokens(message)
+                 - _context_tokens(context))
+    if sum(turn.tokens for turn in turns) <= available:
+        return turns, []
+    kept = 0
+    keep = len(turns)
+    while keep and kept + turns[keep - 1].tokens <= available // 2:
+        keep -= 1
+        kept += turns[keep].tokens
+    return turns[keep:], turns[:keep]
+
+
+def _fold(session, summary, last_turn_id):
+    session.summary = summary
+    session.summarized_until = last_turn_id
+    session.save(update_fields=['summary', 'summarized_until', 'updated_at'])
+
+
+async def aprepare(key, message, context=''):
+    """(session, upstream messages without SYSTEM_PROMPT) for ``message`` in session ``key``.
+
+    ``context`` (retrieved records) goes in a system message just before ``message``.
+    """
+    session, turns = await sync_to_async(_load)(key)
+    window, folded = _split(turns, message, context)
+    if folded:
+        summary = session.summary
+        try:
+            summary = await ai_service.asummarize_chat(summary, [(turn.role, turn.content) for turn in folded])
+        except Exception as e:
+            logger.warning("Chat summary failed, dropping %d turns | session=%s | %s", len(folded), session.key, e)
+        await sync_to_async(_fold)(session, summary, folded[-1].pk)
+        logger.info("Chat summary | session=%s folded=%d kept=%d", session.key, len(folded), len(window))
+    messages = [{'role': turn.role, 'content': turn.content} for turn in window]
+    if session.summary:
+        messages.insert(0, {'role': 'system', 'content': SUMMARY_HEADER + session.summary})
+    if context:
+        messages.append({'role': 'system', 'content': context})
+    messages.append({'role': 'user', 'content': message})
+    return session, messages
+
+
+def _record(session, message, reply):
+    ChatTurn.objects.bulk_create([
+        ChatTurn(session=session, role='user', content=message, tokens=estimate_tokens(message)),
+        ChatTurn(session=session, role='assistant', content=reply, tokens=estimate_tokens(reply)),
+    ])
+    session.save(update_fields=['updated_at'])
+
+
+async def arecord(session, message, reply):
+    """Store a completed exchange; failed calls are not recorded, so a retry resends the same message."""
+    await sync_to_async(_record)(session, message, reply)
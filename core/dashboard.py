@@ -0,0 +1,47 @@
+"""Data behind the public crop comparison dashboard, served from CropSummary rows."""
+from .summaries import summaries_by_name
+
+
+def _label(name, limit, keep):
+    return name if len(name) <= limit else name[:keep] + '..'
+
+
+def chart_data(crop_a_name, compounds_a, crop_b_name, compounds_b):
+    """Chart.js datasets for the distribution (crop A) and A vs B comparison charts."""
+    scores_a = {c['name']: c['score'] for c in compounds_a}
+    scores_b = {c['name']: c['score'] for c in compounds_b}
+    names = list(dict.fromkeys([*scores_a, *scores_b]))
+    return {
+        'distribution': {
+            'labels': [_label(c['name'], 15, 13) for c in compounds_a],
+            'data': [c['score'] for c in compounds_a],
+        },
+        'comparison': {
+            'labels': [_label(name, 12, 10) for name in names],
+            'a': [scores_a.get(name, 0) for name in names],
+            'b': [scores_b.get(name, 0) for name in names],
+        },
+    }
+
+
+def load_dashboard(crop_a_name, crop_b_name):
+    crops = summaries_by_name([crop_a_name, crop_b_name])
+    crop_a = crops.get(crop_a_name)
+    crop_b = crops.get(crop_b_name)
+    summary_a = crop_a.summary if crop_a else None
+    summary_b = crop_b.summary if crop_b else None
+    # No environment panel rather than another region's figures when crop A has none.
+    env_data = summary_a.environment if summary_a else None
+
+    compounds_a = summary_a.compounds if summary_a else []
+    compounds_b = summary_b.compounds if summary_b else []
+    return {
+        'crop_a': crop_a,
+        'crop_b': crop_b,
+        'summary_a': summary_a,
+        'summary_b': summary_b,
+        'compounds_a': compounds_a,
+        'compounds_b': compounds_b,
+        'env_data': env_data,
+        'charts': chart_data(crop_a_name, compounds_a, crop_b_name, compounds_b),
+    }
@@ -0,0 +1,40 @@
+"""SQLite production profile (DB_PROFILE=production).
+
+``ENGINE: 'core.db'`` is the stock SQLite backend plus tuned PRAGMAs and a
+per-process pool of open connections (see ``base``). ``CatalogReadRouter``
+sends catalog and dashboard reads to the read-only ``replica`` alias: the
+same database file, opened with ``query_only``. In WAL mode these reads keep
+going while an import holds the write lock; every write, and any read inside
+a transaction on the writer, stays on ``default``.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_ALIAS = 'replica'
+
+# Tables the catalog, dashboard and search pages read; written only by imports and maintenance.
+CATALOG_MODELS = frozenset({'crop', 'compound', 'cropsummary', 'environmentdata', 'region', 'spectrum'})
+
+
+def read_alias():
+    """Alias for raw catalog reads (the search index), following the router."""
+    if READ_ALIAS in connections.settings and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return READ_ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+class CatalogReadRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'core' and model._meta.model_name in CATALOG_MODELS:
+            # Inside an atomic block on the writer, read its own uncommitted rows.
+            return read_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != READ_ALIAS
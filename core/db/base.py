@@ -0,0 +1,85 @@
+"""SQLite backend with connection PRAGMAs and a per-process connection pool.
+
+``OPTIONS['pragmas']`` are applied once, when a connection is opened.
+``OPTIONS['pool_size']`` idle connections per alias are kept open instead of
+being closed at the end of each request. CONN_MAX_AGE cannot do this under
+ASGI: every request runs its sync code on a fresh thread, and Django's
+connections are per thread. A returned connection is rolled back first, so
+the next request finds it idle. In-memory databases (the test runner) are
+never pooled.
+"""
+import os
+import threading
+
+from django.db.backends.sqlite3 import base
+from django.utils.asyncio import async_unsafe
+
+Database = base.Database
+
+_pools = {}
+_lock = threading.Lock()
+# Connections inherited over fork(); closing them in the child could release the parent's locks.
+_abandoned = []
+
+
+def _after_fork():
+    _abandoned.extend(conn for pool in _pools.values() for conn in pool)
+    _pools.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pragmas = {}
+    pool_size = 0
+
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', {})
+        self.pool_size = 0 if self.is_in_memory_db() else options.get('pool_size', 0)
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('pool_size', None)
+        return params
+
+    def _pool_key(self):
+        return self.alias, str(self.settings_dict['NAME'])
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        if self.pool_size:
+            with _lock:
+                pool = _pools.get(self._pool_key())
+                if pool:
+                    return pool.pop()
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _close(self):
+        # Closed inside atomic() the wrapper keeps the connection, so it cannot go back to the pool.
+        if self.connection is not None and self.pool_size and not self.in_atomic_block:
+            try:
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+            except Database.Error:
+                pass
+            else:
+                with _lock:
+                    pool = _pools.setdefault(self._pool_key(), [])
+                    if len(pool) < self.pool_size:
+                        pool.append(self.connection)
+                        return
+        super()._close()
+
+
+def close_pooled():
+    """Close every idle pooled connection in this process."""
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        for conn in pool:
+            conn.close()
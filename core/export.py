@@ -0,0 +1,316 @@
+"""Streaming standard data-package export of filtered catalog rows.
+
+A package is a zip holding one data file (CSV, JSON Lines or Parquet) and a
+``datapackage.json`` manifest in the Frictionless Data Package layout. The
+manifest records the field schema, the filters, MSI level / QC / source
+breakdowns, provenance and the data file's SHA-256. Rows are read with
+``.iterator(chunk_size=...)`` and the zip is written into a sink that the
+response drains after every chunk, so memory stays flat at any row count.
+
+Finished packages are kept under EXPORT_DIR, named by a checksum of
+(format, filters, data version), and an identical request is served from
+that file. A write bumps the data version, so stale packages are never
+matched again and are pruned after EXPORT_CACHE_MAX_AGE.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+
+from .versioning import data_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+# Bump when COLUMNS or the manifest change, so cached packages are not reused.
+SCHEMA_VERSION = 1
+
+# (column, queryset field, Table Schema type)
+COLUMNS = [
+    ('compound_id', 'id', 'integer'),
+    ('name', 'name', 'string'),
+    ('synonyms', 'synonyms', 'string'),
+    ('compound_class', 'compound_class', 'string'),
+    ('annotation_level', 'annotation_level', 'string'),
+    ('source', 'source', 'string'),
+    ('score', 'score', 'integer'),
+    ('similarity', 'similarity', 'number'),
+    ('qc_status', 'qc_status', 'string'),
+    ('molecular_weight', 'molecular_weight', 'number'),
+    ('retention_time', 'retention_time', 'number'),
+    ('crop', 'crop__name_ko', 'string'),
+    ('crop_en', 'crop__name_en', 'string'),
+    ('crop_scientific', 'crop__name_scientific', 'string'),
+    ('plant_part', 'crop__plant_part', 'string'),
+    ('origin', 'crop__origin', 'string'),
+    ('region_code', 'crop__region__code', 'string'),
+    ('year', 'crop__year', 'integer'),
+]
+NAMES = [name for name, _, _ in COLUMNS]
+# Columns broken down by value in the manifest
+COUNTED = ('annotation_level', 'qc_status', 'source')
+
+# Metabolomics Standards Initiative identification levels (Sumner et al., 2007)
+MSI_LEVELS = {
+    'L1': 'Identified compound (confirmed against a reference standard)',
+    'L2': 'Putatively annotated compound (spectral library match)',
+    'L3': 'Putatively characterised compound class',
+    'L4': 'Unknown compound',
+}
+
+DATA_FILES = {
+    'csv': ('compounds.csv', 'text/csv'),
+    'jsonl': ('compounds.jsonl', 'application/x-ndjson'),
+    'parquet': ('compounds.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+class _Sink:
+    """Write-only, unseekable file for ZipFile; the response drains it between chunks."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class _Hashed(io.RawIOBase):
+    """Pass-through writer recording the SHA-256, size and position of what it writes."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+    def tell(self):
+        return self.size
+
+
+class CSVWriter:
+    def __init__(self, fh):
+        # BOM so spreadsheet software detects UTF-8 (Hangul names).
+        self.text = io.TextIOWrapper(fh, encoding='utf-8-sig', newline='', write_through=True)
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(NAMES)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+
+
+class JSONLinesWriter:
+    def __init__(self, fh):
+        self.fh = fh
+
+    def write(self, rows):
+        self.fh.write(''.join(json.dumps(dict(zip(NAMES, row)), ensure_ascii=False) + '\n'
+                              for row in rows).encode())
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    """Buffers chunks into row groups of ROW_GROUP rows (small groups compress poorly)."""
+    TYPES = {'integer': 'int64', 'number': 'float64', 'string': 'string'}
+    ROW_GROUP = 20_000
+
+    def __init__(self, fh):
+        self.schema = pa.schema([(name, self.TYPES[kind]) for name, _, kind in COLUMNS])
+        self.writer = pq.ParquetWriter(pa.PythonFile(fh, mode='w'), self.schema)
+        self.pending = []
+
+    def write(self, rows):
+        self.pending += rows
+        if len(self.pending) >= self.ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if self.pending:
+            columns = list(zip(*self.pending))
+            self.writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+                schema=self.schema))
+            self.pending = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+WRITERS = {'csv': CSVWriter, 'jsonl': JSONLinesWriter, 'parquet': ParquetWriter}
+
+
+def check_format(fmt):
+    """Raises ValueError for an unknown format or Parquet without pyarrow."""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if fmt == 'parquet' and pa is None:
+        raise ValueError('parquet export requires pyarrow (pip install pyarrow)')
+
+
+def _member(name, compression):
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = compression
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _chunks(rows, size):
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def manifest(fmt, filters, version, data, counts, row_count):
+    path, mediatype = DATA_FILES[fmt]
+    return {
+        'profile': 'tabular-data-package' if fmt == 'csv' else 'data-package',
+        'name': 'metabolome-catalog',
+        'title': '특용작물 대사체 카탈로그 표준 데이터 패키지',
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'resources': [{
+            'name': 'compounds',
+            'path': path,
+            'format': fmt,
+            'mediatype': mediatype,
+            **({'encoding': 'utf-8-sig'} if fmt == 'csv' else {}),
+            'bytes': data.size,
+            'hash': f'sha256:{data.sha256.hexdigest()}',
+            'schema': {
+                'fields': [{'name': name, 'type': kind} for name, _, kind in COLUMNS],
+                'primaryKey': 'compound_id',
+            },
+        }],
+        'row_count': row_count,
+        'annotation_levels': {level: {'count': n, 'description': MSI_LEVELS.get(level, '')}
+                              for level, n in sorted(counts['annotation_level'].items())},
+        'qc_status': dict(sorted(counts['qc_status'].items())),
+        'provenance': {
+            'generator': 'metabolome_platform catalog export',
+            'data_version': version,
+            'filters': filters,
+            'order': 'score desc, compound_id',
+            'sources': dict(sorted(counts['source'].items())),
+        },
+    }
+
+
+def stream(compounds, fmt, filters, chunk_size=None):
+    """Yield the zip package for ``compounds`` (a filtered Compound queryset) in pieces."""
+    check_format(fmt)
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    version = data_version()
+    rows = (compounds.order_by('-score', 'id')
+            .values_list(*(field for _, field, _ in COLUMNS))
+            .iterator(chunk_size=chunk_size))
+    counts = {name: Counter() for name in COUNTED}
+    positions = [(counts[name], NAMES.index(name)) for name in COUNTED]
+    row_count = 0
+
+    sink = _Sink()
+    compression = zipfile.ZIP_STORED if fmt == 'parquet' else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(sink, 'w', compression=compression) as zf:
+        path, _ = DATA_FILES[fmt]
+        with zf.open(_member(path, compression), 'w', force_zip64=True) as member:
+            data = _Hashed(member)
+            writer = WRITERS[fmt](data)
+            for chunk in _chunks(rows, chunk_size):
+                writer.write(chunk)
+                row_count += len(chunk)
+                for counter, i in positions:
+                    counter.update(row[i] for row in chunk)
+                yield sink.drain()
+            writer.close()
+        zf.writestr(_member('datapackage.json', zipfile.ZIP_DEFLATED), json.dumps(
+            manifest(fmt, filters, version, data, counts, row_count), ensure_ascii=False, indent=2))
+    yield sink.drain()
+
+
+def _export_dir():
+    return Path(settings.EXPORT_DIR)
+
+
+def cache_key(fmt, filters):
+    raw = json.dumps({'format': fmt, 'filters': filters, 'data_version': data_version(),
+                      'schema': SCHEMA_VERSION}, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def cached_package(key):
+    """Path of a finished package for ``key``, or None."""
+    path = _export_dir() / f'{key}.zip'
+    return path if path.exists() else None
+
+
+def stream_and_cache(compounds, fmt, filters, key):
+    """``stream`` while saving the package as ``<key>.zip``; an interrupted export leaves nothing behind."""
+    base = _export_dir()
+    base.mkdir(parents=True, exist_ok=True)
+    tmp = base / f'{key}.zip.{os.getpid()}.{threading.get_ident()}.part'
+    try:
+        with open(tmp, 'wb') as f:
+            for piece in stream(compounds, fmt, filters):
+                f.write(piece)
+                yield piece
+        os.replace(tmp, base / f'{key}.zip')
+    finally:
+        tmp.unlink(missing_ok=True)
+    prune()
+
+
+def prune(max_age=None):
+    """Delete packages and abandoned partial files older than ``max_age`` seconds."""
+    max_age = settings.EXPORT_CACHE_MAX_AGE if max_age is None else max_age
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in _export_dir().glob('*.zip*'):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
@@ -0,0 +1,43 @@
+"""Catalog facet lists and headline counts, cached per data version."""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Crop
+from .versioning import data_version
+
+FACETS_TIMEOUT = 24 * 60 * 60
+
+
+def _build_facets():
+    rows = (Crop.objects.order_by()
+            .values('name_ko', 'plant_part', 'origin', 'year')
+            .annotate(n=Count('compounds')))
+    crops, parts, origins, years = Counter(), Counter(), Counter(), Counter()
+    for row in rows:
+        crops[row['name_ko']] += row['n']
+        parts[row['plant_part']] += row['n']
+        origins[row['origin']] += row['n']
+        years[row['year']] += row['n']
+    return {
+        'crops': sorted(crops.items()),
+        'parts': sorted(parts.items()),
+        'origins': sorted(origins.items()),
+        'years': sorted(years.items(), reverse=True),
+        'crop_count': len(crops),
+        'compound_count': sum(crops.values()),
+    }
+
+
+def catalog_facets():
+    """Facet options as (value, compound count) pairs plus crop/compound totals.
+
+    Built with a single grouped query the first time a data version is seen.
+    """
+    key = f'core:facets:{data_version()}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = _build_facets()
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
@@ -0,0 +1,173 @@
+"""Local OpenAI-compatible stand-in for the Groq API, for benchmarks and tests.
+
+Answers ``POST .../chat/completions`` with a fixed reply after a configurable
+delay, or as an SSE token stream when the request sets ``stream`` (usage on the
+last chunk, as Groq reports it). ``fail(n, status)`` makes the next ``n``
+requests fail with that HTTP status; ``latency`` can be raised at any time to
+simulate a slow provider. ``connections`` counts accepted TCP connections, so
+tests can check that clients keep them alive. It runs an asyncio server on a background
+thread so hundreds of concurrent keep-alive connections cost no threads. Point the client at it
+with ``ai_service.configure(base_url=server.base_url)``.
+"""
+import asyncio
+import json
+import threading
+import time
+
+DEFAULT_REPLY = json.dumps({"one_line_summary": "벤치마크용 가짜 응답입니다."}, ensure_ascii=False)
+
+
+class FakeLLMServer:
+    def __init__(self, latency=0.5, reply=DEFAULT_REPLY, port=0, token_interval=0.01):
+        self.latency = latency
+        self.reply = reply
+        self.token_interval = token_interval
+        self.port = port
+        self.requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.last_request = None
+        self.failures = 0
+        self.failure_status = 503
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def fail(self, count, status=503):
+        """Answer the next ``count`` completion requests with ``status`` (after ``latency``)."""
+        self.failures = count
+        self.failure_status = status
+
+    def usage(self, request):
+        prompt_tokens = sum(len(m.get('content', '')) for m in request.get('messages', [])) // 4
+        completion_tokens = len(self.reply) // 4
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+
+    def completion(self, request):
+        return 200, {
+            'id': f'fake-{self.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.reply},
+                'finish_reason': 'stop',
+            }],
+            'usage': self.usage(request),
+        }
+
+    async def _respond(self, writer, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        writer.write(f'HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+    async def _stream(self, writer, request):
+        """Chunked SSE: first token after ``latency``, the rest every ``token_interval``."""
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                     b'Transfer-Encoding: chunked\r\n\r\n')
+        await asyncio.sleep(self.latency)
+        pieces = [self.reply[i:i + 4] for i in range(0, len(self.reply), 4)]
+        for i, piece in enumerate(pieces + [None]):
+            chunk = {
+                'id': f'fake-{self.requests}',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': request.get('model', 'fake'),
+                'choices': [{
+                    'index': 0,
+                    'delta': {'content': piece} if piece is not None else {},
+                    'finish_reason': None if piece is not None else 'stop',
+                }],
+            }
+            if piece is None:
+                chunk['x_groq'] = {'usage': self.usage(request)}
+            if writer.is_closing():
+                raise ConnectionResetError('client closed the stream')
+            data = f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode()
+            writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+            await writer.drain()
+            if i:
+                await asyncio.sleep(self.token_interval)
+        done = b'data: [DONE]\n\n'
+        writer.write(b'%x\r\n%s\r\n0\r\n\r\n' % (len(done), done))
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                path = lines[0].split(' ')[1]
+                headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+                length = int({k.lower(): v for k, v in headers.items()}.get('content-length', 0))
+                request = json.loads(await reader.readexactly(length) or b'{}')
+                if not path.endswith('/chat/completions'):
+                    await self._respond(writer, 404, {'error': {'message': 'not found'}})
+                    continue
+                self.requests += 1
+                self.last_request = request
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                try:
+                    if self.failures:
+                        self.failures -= 1
+                        await asyncio.sleep(self.latency)
+                        await self._respond(writer, self.failure_status,
+                                            {'error': {'message': 'injected failure', 'type': 'server_error'}})
+                        continue
+                    if request.get('stream'):
+                        await self._stream(writer, request)
+                        continue
+                    await asyncio.sleep(self.latency)
+                    await self._respond(writer, *self.completion(request))
+                finally:
+                    self.in_flight -= 1
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, '127.0.0.1', self.port, backlog=4096))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._server.close()
+        # Drop idle keep-alive connections still parked in _handle.
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
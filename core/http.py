@@ -0,0 +1,113 @@
+"""Request helpers and the conditional-GET / rendered-page cache for read-only pages.
+
+Pages change only when catalog data does, so a page is fully determined by
+(view, data version, the query parameters it reads). ``versioned_page`` hashes
+those into an ETag. It answers a matching If-None-Match with 304 and serves a
+miss from a per-process LRU of rendered bodies, and optionally from the
+``shared`` cache, before falling back to the view. Ingest bumps the data
+version, so every ETag and cache entry changes with it.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .versioning import data_version
+
+logger = logging.getLogger('core')
+
+
+def client_ip(request):
+    xff = request.META.get('HTTP_X_FORWARDED_FOR')
+    return xff.split(',')[0].strip() if xff else request.META.get('REMOTE_ADDR', '-')
+
+
+class LRU:
+    """Thread-safe bounded mapping; the least recently used entry is dropped first."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.get(key)
+            if value is not None:
+                self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+pages = LRU(settings.PAGE_CACHE_SIZE)
+
+
+def page_key(name, request, params):
+    """Hash of view name, data version, release salt and the view's query parameters.
+
+    Parameters the view does not read are ignored; an absent parameter differs from
+    an empty one, since views apply defaults only when it is absent.
+    """
+    query = [(p, request.GET.get(p)) for p in params]
+    raw = repr((name, data_version(), settings.PAGE_CACHE_SALT, query))
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def versioned_page(*params):
+    """Decorator for GET-only pages whose output depends only on catalog data and ``params``."""
+    def decorator(view):
+        name = view.__name__
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = page_key(name, request, params)
+            etag = quote_etag(key)
+
+            response = get_conditional_response(request, etag=etag)
+            source = 'not-modified'
+            if response is None:
+                cached = pages.get(key)
+                source = 'hit'
+                if cached is None and settings.PAGE_CACHE_SHARED:
+                    cached = caches['shared'].get(f'core:page:{key}')
+                    if cached is not None:
+                        source = 'shared'
+                        pages.set(key, cached)
+                if cached is not None:
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+            if response is not None:
+                logger.info("PAGE  %s | ip=%s cache=%s", name, client_ip(request), source)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    cached = (response.content, response['Content-Type'])
+                    pages.set(key, cached)
+                    if settings.PAGE_CACHE_SHARED:
+                        caches['shared'].set(f'core:page:{key}', cached, settings.PAGE_CACHE_TIMEOUT)
+            response['ETag'] = etag
+            # Revalidate every time: the check is one cache read, and data can change at any moment.
+            patch_cache_control(response, no_cache=True)
+            return response
+        wrapper.versioned_page = True
+        return wrapper
+    return decorator
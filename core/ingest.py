@@ -0,0 +1,326 @@
+"""Streaming readers and batched upsert writer for instrument annotation exports.
+
+Readers yield one flat record (dict) per annotated feature and never hold
+more than the current row/record in memory. ``write_batch`` upserts a batch
+of records on the (crop, name) natural key, and MS/MS peaks (MSP) on the
+spectrum natural key, so re-running an import is idempotent.
+"""
+import csv
+import gzip
+import math
+
+from django.db import transaction
+
+from .models import Crop, Compound, Spectrum
+from .regions import RegionResolver
+from .spectra import pack
+
+CROP_KEY = ('name_ko', 'origin', 'year', 'plant_part')
+COMPOUND_FIELDS = ['annotation_level', 'source', 'score', 'similarity', 'qc_status',
+                   'compound_class', 'synonyms', 'molecular_weight', 'retention_time']
+SPECTRUM_KEY = ['compound', 'precursor_type', 'ion_mode', 'collision_energy']
+
+# Alternative column names seen in exports -> model field.
+ALIASES = {
+    'crop': 'name_ko',
+    'crop_ko': 'name_ko',
+    'crop_en': 'name_en',
+    'scientific_name': 'name_scientific',
+    'part': 'plant_part',
+    'plantpart': 'plant_part',
+    'compound': 'name',
+    'compound_name': 'name',
+    'level': 'annotation_level',
+    'msi_level': 'annotation_level',
+    'annotationlevel': 'annotation_level',
+    'qc': 'qc_status',
+    'qcstatus': 'qc_status',
+    'class': 'compound_class',
+    'compoundclass': 'compound_class',
+    'ontology': 'compound_class',
+    'synonym': 'synonyms',
+    'synon': 'synonyms',
+    'aliases': 'synonyms',
+    'mw': 'molecular_weight',
+    'exact_mass': 'molecular_weight',
+    'exactmass': 'molecular_weight',
+    'rt': 'retention_time',
+    'retentiontime': 'retention_time',
+    'precursormz': 'precursor_mz',
+    'precursortype': 'precursor_type',
+    'ionmode': 'ion_mode',
+    'collisionenergy': 'collision_energy',
+}
+
+FORMATS = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.txt': 'tsv',
+    '.msp': 'msp',
+    '.mztab': 'mztab',
+}
+
+
+class IngestError(ValueError):
+    def __init__(self, row, message):
+        super().__init__(f"row {row}: {message}")
+        self.row = row
+
+
+def guess_format(path):
+    name = str(path).lower().removesuffix('.gz')
+    for ext, fmt in FORMATS.items():
+        if name.endswith(ext):
+            return fmt
+    return None
+
+
+def open_text(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def _normalize(raw):
+    record = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        key = key.strip().lower()
+        record[ALIASES.get(key, key)] = value.strip() if isinstance(value, str) else value
+    return record
+
+
+def read_delimited(fh, delimiter=','):
+    for raw in csv.DictReader(fh, delimiter=delimiter):
+        yield _normalize(raw)
+
+
+def read_msp(fh):
+    """NIST MSP: ``Key: value`` lines, ``Num Peaks: n`` followed by peak lines, blank line between records.
+
+    Raises IngestError (numbered by record, like the other readers) for a malformed peak count or peak.
+    """
+    record, peaks, peaks_left = {}, [], 0
+    row = 1
+    for lineno, line in enumerate(fh, start=1):
+        line = line.strip()
+        if not line:
+            if record:
+                record['peaks'] = peaks
+                yield _normalize(record)
+                row += 1
+            record, peaks, peaks_left = {}, [], 0
+            continue
+        try:
+            if peaks_left:
+                for pair in line.replace(';', '\n').splitlines():
+                    parts = pair.split()
+                    if len(parts) >= 2:
+                        peaks.append((_finite(parts[0]), _finite(parts[1])))
+                        peaks_left -= 1
+                continue
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            key = key.strip().lower().replace(' ', '')
+            if key == 'numpeaks':
+                peaks_left = int(value)
+                continue
+        except ValueError as e:
+            raise IngestError(row, f"line {lineno}: {e}")
+        if key == 'synon' and record.get(key):
+            # Repeated "Synon:" lines
+            record[key] += '; ' + value.strip()
+        else:
+            record[key] = value.strip()
+    if record:
+        record['peaks'] = peaks
+        yield _normalize(record)
+
+
+MZTAB_COLUMNS = {
+    'chemical_name': 'name',
+    'theoretical_neutral_mass': 'molecular_weight',
+    'reliability': 'annotation_level',
+    'best_id_confidence_value': 'similarity',
+    'opt_global_retention_time': 'retention_time',
+    'opt_global_compound_class': 'compound_class',
+}
+
+
+def read_mztab_m(fh):
+    """mzTab-M small molecule summary (SMH/SML) rows.
+
+    Retention times live in the SMF section, which follows SML; they are only
+    picked up from an ``opt_global_retention_time`` column on SML itself.
+    """
+    header = None
+    for line in fh:
+        cells = line.rstrip('\r\n').split('\t')
+        if cells[0] == 'SMH':
+            header = cells
+        elif cells[0] == 'SML' and header:
+            raw = dict(zip(header, cells))
+            record = {MZTAB_COLUMNS[k]: v for k, v in raw.items() if k in MZTAB_COLUMNS and v != 'null'}
+            if 'name' in record:
+                record['name'], *synonyms = record['name'].split('|')
+                if synonyms:
+                    record['synonyms'] = '; '.join(synonyms)
+            level = record.get('annotation_level', '')
+            if level[:1].isdigit():
+                record['annotation_level'] = f'L{level[:1]}'
+            yield _normalize(record)
+
+
+def read_records(fh, fmt):
+    if fmt == 'csv':
+        return read_delimited(fh, ',')
+    if fmt == 'tsv':
+        return read_delimited(fh, '\t')
+    if fmt == 'msp':
+        return read_msp(fh)
+    if fmt == 'mztab':
+        return read_mztab_m(fh)
+    raise ValueError(f"unknown format: {fmt}")
+
+
+def _finite(value):
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
+
+
+def _float(value):
+    if value in (None, '', '-', 'null', 'NA'):
+        return None
+    return _finite(value)
+
+
+def clean_spectrum(record, row):
+    """Spectrum fields for a record with peaks and a precursor m/z, else None."""
+    peaks = record.get('peaks')
+    if not peaks or not record.get('precursor_mz'):
+        return None
+    try:
+        precursor_mz = _finite(record['precursor_mz'])
+    except ValueError as e:
+        raise IngestError(row, str(e))
+    mz, intensity = zip(*peaks)
+    return {
+        'precursor_mz': precursor_mz,
+        'precursor_type': record.get('precursor_type', '')[:30],
+        'ion_mode': record.get('ion_mode', '')[:10],
+        'collision_energy': record.get('collision_energy', '')[:30],
+        'num_peaks': len(mz),
+        'mz': pack(mz),
+        'intensity': pack(intensity),
+    }
+
+
+def clean_record(record, row, defaults=None):
+    """Coerce one raw record into crop, compound and (optional) spectrum field dicts.
+
+    The fourth item lists the COMPOUND_FIELDS the record (or ``defaults``) actually supplied; the
+    rest are filled with insert defaults and must not overwrite stored values on re-import.
+    """
+    record = {**(defaults or {}), **{k: v for k, v in record.items() if v not in (None, '')}}
+    missing = [f for f in ('name',) + CROP_KEY if f != 'year' and not record.get(f)]
+    if missing:
+        raise IngestError(row, f"missing {', '.join(missing)}")
+    try:
+        crop = {
+            'name_ko': record['name_ko'],
+            'name_en': record.get('name_en', ''),
+            'name_scientific': record.get('name_scientific', ''),
+            'plant_part': record['plant_part'],
+            'origin': record['origin'],
+            'year': int(record.get('year', 2025)),
+        }
+        compound = {
+            'name': record['name'][:200],
+            'annotation_level': record.get('annotation_level', 'L3'),
+            'source': record.get('source', 'IN-HOUSE'),
+            'score': round(_finite(record.get('score', 0))),
+            'similarity': _float(record.get('similarity')) or 0.0,
+            'qc_status': record.get('qc_status', 'REVIEW'),
+            'compound_class': record.get('compound_class', ''),
+            'synonyms': record.get('synonyms', ''),
+            'molecular_weight': _float(record.get('molecular_weight')),
+            'retention_time': _float(record.get('retention_time')),
+        }
+    except ValueError as e:
+        raise IngestError(row, str(e))
+    supplied = tuple(f for f in COMPOUND_FIELDS if f in record)
+    return crop, compound, clean_spectrum(record, row), supplied
+
+
+class CropResolver:
+    """In-memory map of crop natural key -> id; unknown crops are bulk-created per batch,
+    linked to the region their origin resolves to.
+
+    ``touched`` collects the ids of every crop resolved, for refreshing derived data afterwards.
+    """
+
+    def __init__(self):
+        self.ids = {key[1:]: key[0] for key in Crop.objects.values_list('id', *CROP_KEY)}
+        self.touched = set()
+        self.regions = RegionResolver()
+
+    @staticmethod
+    def key(crop):
+        return tuple(crop[f] for f in CROP_KEY)
+
+    def resolve(self, crops):
+        new, keys = {}, set()
+        for crop in crops:
+            key = self.key(crop)
+            keys.add(key)
+            if key not in self.ids and key not in new:
+                new[key] = Crop(**crop, region_id=self.regions.resolve(crop['origin']))
+        if new:
+            Crop.objects.bulk_create(new.values(), update_conflicts=True,
+                                     unique_fields=list(CROP_KEY), update_fields=['name_en'])
+            self.ids.update((key, crop.pk) for key, crop in new.items() if crop.pk)
+            if any(crop.pk is None for crop in new.values()):
+                lookup = Crop.objects.filter(name_ko__in={key[0] for key in new})
+                self.ids.update({key[1:]: key[0] for key in lookup.values_list('id', *CROP_KEY)})
+        self.touched.update(self.ids[key] for key in keys)
+        return self.ids
+
+
+def write_batch(batch, resolver):
+    """Upsert one batch of (crop, compound, spectrum, supplied) records in a single transaction.
+
+    Existing rows only get the fields their record supplied, so importing an MSP after a CSV
+    keeps the CSV's scores and classes.
+    """
+    with transaction.atomic():
+        ids = resolver.resolve(crop for crop, _, _, _ in batch)
+        # Later rows win (for the fields they supply) when a batch repeats a (crop, name) key.
+        rows, spectra = {}, {}
+        for crop, compound, spectrum, supplied in batch:
+            key = (ids[resolver.key(crop)], compound['name'])
+            if key in rows:
+                previous, fields = rows[key]
+                compound = {**previous, **{f: compound[f] for f in supplied}}
+                supplied = tuple(f for f in COMPOUND_FIELDS if f in fields or f in supplied)
+            rows[key] = compound, supplied
+            if spectrum:
+                spectra[key + tuple(spectrum[f] for f in SPECTRUM_KEY[1:])] = (key, spectrum)
+        objs, groups = {}, {}
+        for key, (compound, supplied) in rows.items():
+            objs[key] = Compound(crop_id=key[0], **compound)
+            groups.setdefault(supplied, []).append(objs[key])
+        # Django sets pks on upserted rows (SQLite/PostgreSQL), so spectra can point at them.
+        # A record supplying no updatable field rewrites its own name, which leaves the row as is.
+        for supplied, group in groups.items():
+            Compound.objects.bulk_create(group, update_conflicts=True, unique_fields=['crop', 'name'],
+                                         update_fields=list(supplied) or ['name'])
+        if spectra:
+            Spectrum.objects.bulk_create(
+                [Spectrum(compound=objs[key], **spectrum) for key, spectrum in spectra.values()],
+                update_conflicts=True, unique_fields=SPECTRUM_KEY,
+                update_fields=['precursor_mz', 'num_peaks', 'mz', 'intensity'])
+    return len(objs)
@@ -0,0 +1,139 @@
+"""DB-backed queue for batch AI interpretation jobs.
+
+A job holds one AIJobItem per compound. ``run_ai_worker`` claims due items,
+interprets them and records a result (or schedules a retry) per item, so
+clients poll the job status instead of holding a connection per compound.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import AIJob, AIJobItem
+
+# A running item whose worker has not reported back within this window is requeued.
+LEASE = timedelta(minutes=10)
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+
+
+def enqueue(compound_ids, filters=None):
+    now = timezone.now()
+    with transaction.atomic():
+        job = AIJob.objects.create(filters=filters or {})
+        AIJobItem.objects.bulk_create(
+            AIJobItem(job=job, compound_id=pk, next_attempt_at=now) for pk in compound_ids)
+    return job
+
+
+def release_stale():
+    """Requeue items left running by a worker that died."""
+    return (AIJobItem.objects
+            .filter(status=AIJobItem.RUNNING, locked_at__lt=timezone.now() - LEASE)
+            .update(status=AIJobItem.PENDING, locked_at=None))
+
+
+def has_pending():
+    return AIJobItem.objects.filter(status=AIJobItem.PENDING).exists()
+
+
+def claim(limit):
+    """Mark up to ``limit`` due items running; returns them with compound and crop loaded.
+
+    Each row is taken with a conditional UPDATE, so two workers never claim the same item.
+    """
+    now = timezone.now()
+    due = (AIJobItem.objects
+           .filter(status=AIJobItem.PENDING, next_attempt_at__lte=now)
+           .order_by('next_attempt_at', 'id')
+           .values_list('id', flat=True)[:limit])
+    claimed = [pk for pk in due
+               if AIJobItem.objects.filter(pk=pk, status=AIJobItem.PENDING)
+                                   .update(status=AIJobItem.RUNNING, locked_at=now, updated_at=now)]
+    if not claimed:
+        return []
+    items = list(AIJobItem.objects.filter(pk__in=claimed).select_related('compound__crop'))
+    AIJob.objects.filter(pk__in={item.job_id for item in items}, status=AIJob.QUEUED).update(
+        status=AIJob.RUNNING, started_at=now)
+    return items
+
+
+def backoff(attempts):
+    """Exponential backoff with jitter, in seconds, before retry number ``attempts``."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def complete(item, result):
+    AIJobItem.objects.filter(pk=item.pk).update(
+        status=AIJobItem.DONE, result=result, error='', locked_at=None, updated_at=timezone.now())
+    _finish_job(item.job_id)
+
+
+def fail(item, error, attempts=None):
+    AIJobItem.objects.filter(pk=item.pk).update(
+        status=AIJobItem.FAILED, error=error, locked_at=None, updated_at=timezone.now(),
+        attempts=item.attempts if attempts is None else attempts)
+    _finish_job(item.job_id)
+
+
+def retry(item, error, delay=None, count_attempt=True):
+    """Requeue ``item`` after ``delay`` seconds (backoff by default); fail it after AI_JOB_MAX_ATTEMPTS.
+
+    Rate-limited calls pass ``count_attempt=False``: being throttled says nothing about the item,
+    so it is counted as a deferral instead, delayed by at least the backoff for that many
+    deferrals, and failed after AI_JOB_MAX_DEFERRALS.
+    """
+    attempts, deferrals = item.attempts, item.deferrals
+    if count_attempt:
+        attempts += 1
+        limit_reached = attempts >= settings.AI_JOB_MAX_ATTEMPTS
+        wait = backoff(attempts) if delay is None else delay
+    else:
+        deferrals += 1
+        limit_reached = deferrals >= settings.AI_JOB_MAX_DEFERRALS
+        wait = max(delay or 0.0, backoff(deferrals))
+    if limit_reached:
+        AIJobItem.objects.filter(pk=item.pk).update(deferrals=deferrals)
+        fail(item, error, attempts)
+        return False
+    now = timezone.now()
+    AIJobItem.objects.filter(pk=item.pk).update(
+        status=AIJobItem.PENDING, attempts=attempts, deferrals=deferrals, error=error, locked_at=None,
+        updated_at=now, next_attempt_at=now + timedelta(seconds=wait))
+    return True
+
+
+def _finish_job(job_id):
+    open_items = AIJobItem.objects.filter(job_id=job_id, status__in=[AIJobItem.PENDING, AIJobItem.RUNNING])
+    if not open_items.exists():
+        AIJob.objects.filter(pk=job_id).exclude(status=AIJob.DONE).update(
+            status=AIJob.DONE, finished_at=timezone.now())
+
+
+def job_status(job, include_items=True):
+    counts = dict(job.items.order_by().values_list('status').annotate(n=Count('id')))
+    status = {
+        'id': job.pk,
+        'status': job.status,
+        'filters': job.filters,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at and job.started_at.isoformat(),
+        'finished_at': job.finished_at and job.finished_at.isoformat(),
+        'total': sum(counts.values()),
+        'counts': {s: counts.get(s, 0) for s, _ in AIJobItem.STATUS_CHOICES},
+    }
+    if include_items:
+        status['items'] = [{
+            'compound_id': item.compound_id,
+            'name': item.compound.name,
+            'crop': item.compound.crop.name_ko,
+            'status': item.status,
+            'attempts': item.attempts,
+            'result': item.result,
+            'error': item.error,
+        } for item in job.items.select_related('compound__crop')]
+    return status
@@ -0,0 +1,148 @@
+"""Non-blocking, structured logging.
+
+``configure`` is Django's LOGGING_CONFIG. It applies the LOGGING dict as usual and
+then moves each configured logger's handlers behind a QueueHandler. Request
+threads only enqueue records; a QueueListener thread formats them and does the
+disk writes, including rotation.
+
+Records are written as JSON lines. Besides the message, a record carries the
+view and client IP of the request it was logged in (RequestContextFilter, set up
+by core.middleware.RequestLogMiddleware) and any ``extra`` fields: filters, status,
+elapsed_ms. Page requests can be sampled with LOG_PAGE_SAMPLE_RATE. A request is
+kept or dropped as a whole, and kept records carry the rate so counts can be
+scaled back up.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+from datetime import datetime
+
+# Per-request logging context: {'view', 'ip', 'sampled', 'sample_rate'}
+request_context = contextvars.ContextVar('core_request_log', default=None)
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and the record's extra fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RESERVED)
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Logger filter: tags records with the current request's view and IP, and drops sampled-out ones.
+
+    Logger filters run in the thread that logs, where the request's context variable is set.
+    Warnings and errors are never sampled out.
+    """
+
+    def filter(self, record):
+        context = request_context.get()
+        if context is None:
+            return True
+        if not context['sampled'] and record.levelno < logging.WARNING:
+            return False
+        for key in ('view', 'ip'):
+            if context[key] is not None and not hasattr(record, key):
+                setattr(record, key, context[key])
+        if context['sample_rate'] < 1:
+            record.sample_rate = context['sample_rate']
+        return True
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues the record itself, with its message merged and traceback rendered.
+
+    The stock ``prepare`` formats and copies every record on the logging thread; the
+    copy only matters when other handlers share the record, which they do not here.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _Pipeline:
+    """A QueueHandler whose records a QueueListener thread passes to ``handlers``."""
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self.handler = QueueHandler(queue.SimpleQueue())
+        self.start()
+
+    def start(self):
+        self.listener = logging.handlers.QueueListener(self.handler.queue, *self.handlers,
+                                                       respect_handler_level=True)
+        self.listener.start()
+
+    def restart(self):
+        self.handler.queue = queue.SimpleQueue()
+        self.start()
+
+    def stop(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+
+_pipelines = []
+
+
+def queue_handlers(handlers):
+    """QueueHandler feeding ``handlers`` from a listener thread; stopped (and flushed) at exit."""
+    pipeline = _Pipeline(list(handlers))
+    _pipelines.append(pipeline)
+    return pipeline
+
+
+def stop():
+    """Drain every queue and stop the listener threads."""
+    for pipeline in _pipelines:
+        pipeline.stop()
+
+
+def _restart_after_fork():
+    # A forked worker (e.g. gunicorn --preload) inherits queues but not listener threads.
+    for pipeline in _pipelines:
+        pipeline.restart()
+
+
+atexit.register(stop)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def configure(config):
+    """LOGGING_CONFIG: dictConfig, then queue the handlers of every logger named in ``config``."""
+    stop()
+    _pipelines.clear()
+    logging.config.dictConfig(config)
+    shared = {}
+    for name in config.get('loggers', {}):
+        logger = logging.getLogger(name)
+        if not logger.handlers:
+            continue
+        key = tuple(logger.handlers)
+        if key not in shared:
+            shared[key] = queue_handlers(key).handler
+        logger.handlers = [shared[key]]
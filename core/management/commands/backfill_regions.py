@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+
+from core.models import Crop, EnvironmentData
+from core.regions import REGIONS, RegionResolver, ensure_regions, read_regions_csv
+from core.summaries import refresh_all
+from core.versioning import bump_data_version
+
+
+class Command(BaseCommand):
+    help = '작물 원산지·환경데이터 지역명을 행정구역(Region)에 연결 (1회성 백필)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--regions-csv', help='전국 행정구역 CSV (code, province, name 컬럼). 기본: 내장 목록')
+        parser.add_argument('--relink', action='store_true', help='이미 연결된 행도 다시 해석')
+
+    def handle(self, *args, **options):
+        rows = read_regions_csv(options['regions_csv']) if options['regions_csv'] else REGIONS
+        created = ensure_regions(rows)
+        resolver = RegionResolver()
+
+        crops = Crop.objects.all() if options['relink'] else Crop.objects.filter(region__isnull=True)
+        environment = (EnvironmentData.objects.all() if options['relink']
+                       else EnvironmentData.objects.filter(region__isnull=True))
+
+        unresolved = {}
+        linked_crops = 0
+        for origin in crops.values_list('origin', flat=True).distinct().order_by('origin'):
+            region_id = resolver.resolve(origin)
+            if region_id is None:
+                unresolved[f'작물 원산지 "{origin}"'] = crops.filter(origin=origin).count()
+                continue
+            linked_crops += crops.filter(origin=origin).update(region_id=region_id)
+
+        linked_env = 0
+        for name in environment.values_list('region_name', flat=True).distinct().order_by('region_name'):
+            region_id = resolver.resolve(name)
+            if region_id is None:
+                unresolved[f'환경데이터 지역 "{name}"'] = environment.filter(region_name=name).count()
+                continue
+            try:
+                with transaction.atomic():
+                    linked_env += environment.filter(region_name=name).update(region_id=region_id)
+            except IntegrityError:
+                # Two source names for one region with the same period.
+                unresolved[f'환경데이터 지역 "{name}" (같은 지역·기간 중복)'] = (
+                    environment.filter(region_name=name).count())
+
+        # .update() sends no signals: re-link summaries and invalidate caches here.
+        refresh_all()
+        bump_data_version()
+
+        for label, count in unresolved.items():
+            self.stdout.write(self.style.WARNING(f'미해결 {label}: {count}건'))
+        self.stdout.write(self.style.SUCCESS(
+            f'행정구역 {created}건 추가, 작물 {linked_crops}건·환경데이터 {linked_env}건 연결, '
+            f'미해결 {len(unresolved)}종'
+        ))
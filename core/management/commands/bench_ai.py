@@ -0,0 +1,62 @@
+import asyncio
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+
+from core import ai_service
+from core.fake_llm import FakeLLMServer
+
+
+class Command(BaseCommand):
+    help = 'AI API 동시성 벤치마크 (로컬 가짜 LLM 서버, 단일 프로세스 ASGI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--latency', type=float, default=1.0, help='가짜 LLM 응답 지연 (초)')
+        parser.add_argument('--max-concurrency', type=int, help='AI_MAX_CONCURRENCY 대체값')
+
+    def handle(self, *args, **options):
+        n, latency = options['requests'], options['latency']
+        if options['max_concurrency']:
+            settings.AI_MAX_CONCURRENCY = options['max_concurrency']
+        # Every request comes from one client: measure the AI path, not the admission limits.
+        settings.AI_RATE_LIMIT_PER_MINUTE = 0
+        settings.AI_ADMISSION_CONCURRENCY = n
+
+        with FakeLLMServer(latency=latency) as server:
+            ai_service.configure(api_key='bench', base_url=server.base_url)
+            try:
+                wall, timings, failures = asyncio.run(self._run(n))
+            finally:
+                ai_service.configure()
+
+        timings.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f'{n}건 / {wall:.2f}s = {n / wall:,.1f} req/s '
+            f'(순차 처리 시 {n * latency:.0f}s, 실패 {failures}건)'
+        ))
+        self.stdout.write(
+            f'지연 p50={statistics.median(timings):.2f}s '
+            f'p95={timings[int(len(timings) * 0.95) - 1]:.2f}s max={timings[-1]:.2f}s | '
+            f'업스트림 최대 동시 {server.peak_in_flight}건 (상한 {settings.AI_MAX_CONCURRENCY})'
+        )
+
+    async def _run(self, n):
+        client = AsyncClient()
+
+        async def one(i):
+            body = json.dumps({'messages': [{'role': 'user', 'content': f'벤치마크 질문 {i}'}]})
+            t0 = time.perf_counter()
+            response = await client.post('/api/chat/', body, content_type='application/json')
+            ok = response.status_code == 200 and 'error' not in response.json()
+            return time.perf_counter() - t0, ok
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(n)))
+        wall = time.perf_counter() - t0
+        await ai_service.aclose()
+        return wall, [t for t, _ in results], sum(1 for _, ok in results if not ok)
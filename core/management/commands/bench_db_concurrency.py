@@ -0,0 +1,154 @@
+import itertools
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.models import Count
+
+from core import synthetic
+from core.db.base import close_pooled
+from core.models import Compound, Crop
+
+
+def _profiles():
+    """label -> (writer OPTIONS, reader OPTIONS, ENGINE, journal mode)."""
+    pool = {'pool_size': settings.DB_POOL_SIZE}
+    return {
+        'default': ({}, {}, 'django.db.backends.sqlite3', 'DELETE'),
+        'production': (
+            {'pragmas': {'journal_mode': 'WAL', **settings.SQLITE_PRAGMAS}, 'transaction_mode': 'IMMEDIATE', **pool},
+            {'pragmas': {**settings.SQLITE_PRAGMAS, 'query_only': 'ON'}, **pool},
+            'core.db', 'WAL',
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = ('대량 적재 중 카탈로그 읽기 지연 측정 (기본 SQLite 설정 vs DB_PROFILE=production; '
+            '현재 DB의 임시 사본에서 실행)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200_000, help='적재할 성분 수')
+        parser.add_argument('--batch-size', type=int, default=20_000, help='트랜잭션당 성분 수')
+        parser.add_argument('--readers', type=int, default=4, help='동시 읽기 스레드 수')
+        parser.add_argument('--profile', action='append', choices=sorted(_profiles()),
+                            help='측정할 프로필 (반복 가능, 기본: 전체)')
+        parser.add_argument('--interval', type=float, default=0.02,
+                            help='읽기 스레드의 요청 간격(초); 0이면 쉬지 않고 읽어 적재와 GIL을 다툼')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != 'sqlite' or source.is_in_memory_db():
+            raise CommandError('파일 기반 SQLite 데이터베이스에서만 실행할 수 있습니다.')
+        crop_ids = list(Crop.objects.using(DEFAULT_DB_ALIAS).values_list('id', flat=True))
+        if not crop_ids:
+            raise CommandError('작목 데이터가 없습니다. seed_data 또는 generate_synthetic을 먼저 실행하세요.')
+
+        self.stdout.write(f"{'profile':<12}{'import':>12}{'reads':>8}{'idle p50':>10}{'p50':>9}"
+                          f"{'p95':>9}{'max':>9}{'locked':>8}")
+        for label in options['profile'] or sorted(_profiles()):
+            with tempfile.TemporaryDirectory() as tmp:
+                result = self._run(label, Path(tmp) / 'bench.sqlite3', crop_ids, options)
+            self.stdout.write(
+                f"{label:<12}{result['rows_per_s']:>8,.0f} r/s{result['reads']:>8,}"
+                f"{result['idle_p50']:>8.1f}ms{result['p50']:>7.1f}ms{result['p95']:>7.1f}ms"
+                f"{result['max']:>7.0f}ms{result['locked']:>8,}")
+
+    def _run(self, label, path, crop_ids, options):
+        writer_options, reader_options, engine, journal_mode = _profiles()[label]
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('VACUUM INTO %s', [str(path)])
+        base = {**connections[DEFAULT_DB_ALIAS].settings_dict, 'ENGINE': engine, 'NAME': str(path)}
+        writer, reader = f'bench_{label}_writer', f'bench_{label}_reader'
+        connections.settings[writer] = {**base, 'OPTIONS': writer_options}
+        connections.settings[reader] = {**base, 'OPTIONS': reader_options}
+        try:
+            with connections[writer].cursor() as cursor:
+                cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+            connections[writer].close()
+            idle = self._read(reader, crop_ids, lambda n: n >= 200, options)
+            importing = threading.Event()
+            importing.set()
+            timings = {}
+
+            def load():
+                try:
+                    timings['import'] = self._import(writer, crop_ids, options)
+                finally:
+                    importing.clear()
+                    connections[writer].close()
+
+            loader = threading.Thread(target=load)
+            loader.start()
+            busy = self._read(reader, crop_ids, lambda n: not importing.is_set(), options)
+            loader.join()
+        finally:
+            close_pooled()
+            del connections.settings[writer], connections.settings[reader]
+
+        latencies = sorted(busy['latencies']) or [0]
+        return {
+            'rows_per_s': options['rows'] / timings['import'] if 'import' in timings else 0,
+            'reads': len(busy['latencies']),
+            'idle_p50': statistics.median(idle['latencies'] or [0]) * 1000,
+            'p50': statistics.median(latencies) * 1000,
+            'p95': latencies[int(len(latencies) * 0.95)] * 1000,
+            'max': latencies[-1] * 1000,
+            'locked': busy['locked'],
+        }
+
+    def _import(self, alias, crop_ids, options):
+        """Write ``rows`` synthetic compounds in batches, one transaction each; returns seconds."""
+        np_rng = np.random.default_rng(options['seed'])
+        # Continue each crop's synthetic numbering past its existing compounds, keeping (crop, name) unique.
+        crops = list(Crop.objects.using(alias).filter(id__in=crop_ids[:20]).annotate(n=Count('compounds')))
+        t0 = time.perf_counter()
+        written = 0
+        for i in itertools.count():
+            if written >= options['rows']:
+                break
+            crop = crops[i % len(crops)]
+            n = min(options['batch_size'], options['rows'] - written)
+            written += synthetic.write_compounds(synthetic.compound_rows(crop, crop.n, crop.n + n, np_rng), using=alias)
+            crop.n += n
+        return time.perf_counter() - t0
+
+    def _read(self, alias, crop_ids, done, options):
+        """Catalog reads (a compound page and two dashboard summaries) from each reader thread until ``done(reads)``."""
+        result = {'latencies': [], 'locked': 0}
+        lock = threading.Lock()
+
+        def reader(seed):
+            rng = random.Random(seed)
+            try:
+                while not done(len(result['latencies'])):
+                    t0 = time.perf_counter()
+                    try:
+                        list(Compound.objects.using(alias).filter(crop_id=rng.choice(crop_ids))
+                             .order_by('-score', 'id')[:50])
+                        list(Crop.objects.using(alias).select_related('summary')
+                             .filter(id__in=rng.sample(crop_ids, min(2, len(crop_ids)))))
+                    except OperationalError:
+                        with lock:
+                            result['locked'] += 1
+                        continue
+                    with lock:
+                        result['latencies'].append(time.perf_counter() - t0)
+                    time.sleep(options['interval'])
+            finally:
+                connections[alias].close()
+
+        workers = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return result
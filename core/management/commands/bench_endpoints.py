@@ -0,0 +1,276 @@
+import asyncio
+import itertools
+import json
+import math
+import platform
+import statistics
+import threading
+import time
+import warnings
+from collections import Counter
+
+import django
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, override_settings
+
+from core import ai_service, jobs, spectra, urls
+from core.fake_llm import FakeLLMServer
+from core.models import AIJob, Compound, Crop, Spectrum
+
+
+def _levels(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def _percentile(sorted_values, p):
+    return sorted_values[max(0, math.ceil(p * len(sorted_values)) - 1)]
+
+
+def _scenarios():
+    """{label: [(method, path, GET params or JSON body), ...]} for every URL in core/urls.py.
+
+    Labels are URL names, with ':variant' for a second request shape of the same URL.
+    Requests are built from the current data, cycling over a few crops and compounds.
+    """
+    crops = list(Crop.objects.order_by('id').values_list('name_ko', 'plant_part', 'origin', 'year').distinct()[:8])
+    crop_ids = list(Crop.objects.order_by('id').values_list('id', flat=True)[:8])
+    if not crops:
+        raise CommandError('카탈로그가 비어 있습니다. generate_synthetic 또는 seed_data 를 먼저 실행하세요.')
+    names = list(dict.fromkeys(name for name, _, _, _ in crops))
+    compounds = list(Compound.objects.select_related('crop').order_by('-score', 'id')[:20])
+    ids = [c.pk for c in compounds]
+    masses = [c.molecular_weight for c in compounds if c.molecular_weight] or [300.0]
+    words = list(dict.fromkeys(c.name.split()[0].lower() for c in compounds)) or ['ginsenoside']
+    spectrum = Spectrum.objects.order_by('id').first()
+    if spectrum:
+        query = {'precursor_mz': spectrum.precursor_mz,
+                 'peaks': list(zip(spectra.unpack(spectrum.mz).tolist(), spectra.unpack(spectrum.intensity).tolist()))}
+    else:
+        query = {'precursor_mz': 301.1, 'peaks': [[121.03, 1.0], [151.0, 0.6], [273.08, 0.3]]}
+    profile = {c.name: c.score for c in compounds}
+    pairs = list(itertools.permutations(names, 2)) or [(names[0], names[0])]
+    id_pairs = list(itertools.permutations(crop_ids, 2)) or [(crop_ids[0], crop_ids[0])]
+
+    def get(path, **params):
+        return 'GET', path, params
+
+    def post(path, body):
+        return 'POST', path, body
+
+    return {
+        'landing': [get('/')],
+        'research_index': [get('/research/')],
+        'research_catalog': [get('/research/catalog/', crop=crop, part=part, origin=origin, year=year)
+                             for crop, part, origin, year in crops] + [get('/research/catalog/')],
+        'public_index': [get('/public/')],
+        'public_dashboard': [get('/public/dashboard/', crop_a=a, crop_b=b) for a, b in pairs[:8]],
+        'api_compounds': [get('/api/compounds/', crop=crop, limit=50) for crop in names],
+        'api_compounds:columns': [get('/api/compounds/', crop=crop, format='columns') for crop in names],
+        'api_search': [get('/api/search/', q=word) for word in words],
+        'api_search:autocomplete': [get('/api/search/', q=word[:4], autocomplete=1) for word in words],
+        'api_export': [get('/api/export/', crop=crop, format='csv') for crop in names[:2]],
+        'api_spectra_search': [post('/api/spectra/search/', query)],
+        'api_mass_lookup': [get('/api/mass/lookup/', mz=mz + 1.007276, adducts='[M+H]+') for mz in masses],
+        'api_mass_lookup:batch': [post('/api/mass/lookup/', {'queries': [{'mz': mz} for mz in masses * 5]})],
+        'api_origin_predict': [post('/api/origin/predict/', {'crop': names[0], 'samples': [{'id': 1, 'profile': profile}]})],
+        'api_chat': [post('/api/chat/', {'messages': [{'role': 'user', 'content': f'{name}의 주요 성분은?'}]})
+                     for name in names],
+        'api_chat:stream': [post('/api/chat/', {'messages': [{'role': 'user', 'content': f'{name} 효능'}], 'stream': True})
+                            for name in names],
+        'api_interpret_compound': [post('/api/interpret/compound/', {'compound_id': pk}) for pk in ids],
+        'api_interpret_dashboard': [post('/api/interpret/dashboard/', {'crop_a_id': a, 'crop_b_id': b})
+                                    for a, b in id_pairs[:8]],
+        'api_ai_jobs': [post('/api/jobs/', {'compound_ids': ids[:10]})],
+        'api_ai_job': [get(f'/api/jobs/{jobs.enqueue(ids[:10]).pk}/')],
+        'metrics': [get('/metrics')],
+    }
+
+
+class Command(BaseCommand):
+    help = ('엔드포인트 성능 벤치마크: core/urls.py 의 모든 URL 을 동시성 단계별로 요청 (가짜 LLM 서버), '
+            'p50/p95/p99·요청당 쿼리 수·처리량을 JSON 으로 기록하고 기준 결과와 비교')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=_levels, default=[1, 4, 16], help='동시성 단계, 예: 1,4,16')
+        parser.add_argument('--requests', type=int, default=50, help='URL·동시성 단계별 요청 수')
+        parser.add_argument('--only', default='', help='이 라벨만 실행 (쉼표 구분, 예: api_search,landing)')
+        parser.add_argument('--latency', type=float, default=0.05, help='가짜 LLM 응답 지연 (초)')
+        parser.add_argument('--output', help='결과 JSON 경로')
+        parser.add_argument('--baseline', help='비교할 이전 결과 JSON')
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help='p95 또는 처리량이 이 배수 이상 나빠지면 회귀로 보고 실패 처리')
+
+    def handle(self, *args, **options):
+        # Export streams are synchronous iterators; reading them through the async client is intended.
+        warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume')
+        first_job = (AIJob.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        with FakeLLMServer(latency=options['latency']) as server:
+            ai_service.configure(api_key='bench', base_url=server.base_url)
+            try:
+                scenarios = self._select(_scenarios(), options['only'])
+                # All requests share one client IP; the per-client AI rate limit would turn them into 429s.
+                with override_settings(AI_RATE_LIMIT_PER_MINUTE=0):
+                    results = self._run(scenarios, options['concurrency'], options['requests'])
+            finally:
+                ai_service.configure()
+                # Jobs created by the benchmark (api_ai_jobs, api_ai_job)
+                AIJob.objects.filter(id__gte=first_job).delete()
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'crops': Crop.objects.count(),
+                'compounds': Compound.objects.count(),
+                'requests': options['requests'],
+                'llm_latency': options['latency'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=2)
+            self.stdout.write(f"결과 저장: {options['output']}")
+        if options['baseline']:
+            self._compare(results, options['baseline'], options['threshold'])
+
+    def _select(self, scenarios, only):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        missing = names - {label.split(':')[0] for label in scenarios}
+        if missing:
+            raise CommandError(f'시나리오가 없는 URL: {", ".join(sorted(missing))}')
+        if not only:
+            return scenarios
+        labels = only.split(',')
+        unknown = set(labels) - set(scenarios)
+        if unknown:
+            raise CommandError(f'알 수 없는 라벨: {", ".join(sorted(unknown))}')
+        return {label: scenarios[label] for label in labels}
+
+    def _run(self, scenarios, levels, n):
+        results = []
+        self.stdout.write(f"{'label':<26}{'동시':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'쿼리':>7}{'req/s':>9}  상태")
+        for label, requests in scenarios.items():
+            # Warm caches and lazily built indexes.
+            self._level(requests, 1, len(requests))
+            for level in levels:
+                result = self._level(requests, level, n)
+                result = {'label': label, 'method': requests[0][0], 'path': requests[0][1], **result}
+                results.append(result)
+                statuses = ' '.join(f'{code}×{count}' for code, count in sorted(result['statuses'].items()))
+                self.stdout.write(
+                    f"{label:<26}{level:>5}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                    f"{result['p99_ms']:>9.1f}{result['queries_mean']:>7.1f}{result['throughput']:>9.1f}  {statuses}")
+        return results
+
+    @staticmethod
+    def _begin():
+        # Runs in the request's sync thread: count its queries there.
+        calls = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            calls[0] += 1
+            return execute(sql, params, many, context)
+
+        # Every alias: with DB_PROFILE=production catalog reads go to the replica.
+        for conn in connections.all():
+            conn.execute_wrappers.append(count_queries)
+        return calls, count_queries
+
+    @staticmethod
+    def _end(count_queries):
+        for conn in connections.all():
+            conn.execute_wrappers.remove(count_queries)
+            conn.close()
+
+    async def _send(self, client, request):
+        """One request handled as under ASGI: its sync code (views, ORM) runs in one thread of its own."""
+        method, path, data = request
+        async with ThreadSensitiveContext():
+            calls, wrapper = await sync_to_async(self._begin)()
+            try:
+                t0 = time.perf_counter()
+                if method == 'GET':
+                    response = await client.get(path, data)
+                else:
+                    response = await client.post(path, json.dumps(data, ensure_ascii=False),
+                                                 content_type='application/json')
+                if response.streaming and response.is_async:
+                    [chunk async for chunk in response.streaming_content]
+                elif response.streaming:
+                    await sync_to_async(b''.join)(response.streaming_content)
+                elapsed = time.perf_counter() - t0
+            finally:
+                await sync_to_async(self._end)(wrapper)
+        return response.status_code, elapsed, calls[0]
+
+    def _level(self, requests, level, n):
+        """``n`` requests from ``level`` threads, each running an event loop with its own AsyncClient."""
+        plan = itertools.cycle(requests)
+        counter = itertools.count()
+        lock = threading.Lock()
+        timings, queries, statuses = [], [], Counter()
+
+        async def worker():
+            client = AsyncClient()
+            try:
+                while next(counter) < n:
+                    with lock:
+                        request = next(plan)
+                    status, elapsed, calls = await self._send(client, request)
+                    with lock:
+                        timings.append(elapsed)
+                        queries.append(calls)
+                        statuses[status] += 1
+            finally:
+                await ai_service.aclose()
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=asyncio.run, args=(worker(),)) for _ in range(level)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - t0
+        timings.sort()
+        return {
+            'concurrency': level,
+            'requests': len(timings),
+            'statuses': {str(code): count for code, count in statuses.items()},
+            'errors': sum(count for code, count in statuses.items() if code >= 500),
+            'p50_ms': round(_percentile(timings, .50) * 1000, 2),
+            'p95_ms': round(_percentile(timings, .95) * 1000, 2),
+            'p99_ms': round(_percentile(timings, .99) * 1000, 2),
+            'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+            'queries_mean': round(statistics.fmean(queries), 2),
+            'queries_max': max(queries),
+            'throughput': round(len(timings) / wall, 1),
+        }
+
+    def _compare(self, results, path, threshold):
+        with open(path, encoding='utf-8') as fh:
+            baseline = {(r['label'], r['concurrency']): r for r in json.load(fh)['results']}
+        self.stdout.write(f'기준 대비 ({path}): p95 배율, 처리량 배율, 쿼리 수 변화')
+        regressions, compared = [], 0
+        for result in results:
+            before = baseline.get((result['label'], result['concurrency']))
+            if before is None:
+                continue
+            compared += 1
+            p95 = result['p95_ms'] / max(before['p95_ms'], 1e-3)
+            throughput = before['throughput'] / max(result['throughput'], 1e-3)
+            queries = result['queries_mean'] - before['queries_mean']
+            worse = p95 >= threshold or throughput >= threshold or queries >= 1
+            if worse:
+                regressions.append(f"{result['label']}@{result['concurrency']}")
+            self.stdout.write(f"  {result['label']:<26}{result['concurrency']:>4}  p95 ×{p95:.2f}  "
+                              f"처리량 ×{1 / throughput:.2f}  쿼리 {queries:+.1f}{'  ← 회귀' if worse else ''}")
+        if not compared:
+            raise CommandError('기준 결과에 같은 라벨·동시성 단계가 없습니다.')
+        if regressions:
+            raise CommandError(f'성능 회귀 {len(regressions)}건: {", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('회귀 없음'))
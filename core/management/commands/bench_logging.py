@@ -0,0 +1,93 @@
+import logging
+import logging.handlers
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from core import logs
+
+
+class _SlowFileHandler(logging.handlers.RotatingFileHandler):
+    latency = 0.0
+
+    def emit(self, record):
+        if self.latency:
+            time.sleep(self.latency)
+        super().emit(record)
+
+
+class Command(BaseCommand):
+    help = '로깅 오버헤드 벤치마크: 동기 파일 기록 vs 큐(백그라운드 스레드) 기록, 레코드·요청당 비용'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--path', default='/api/compounds/?limit=1', help='요청 벤치마크 URL')
+        parser.add_argument('--disk-latency', type=float, default=0.0,
+                            help='기록 1건당 추가 지연 (ms), 느린 디스크·네트워크 파일시스템 모사')
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger('core')
+        saved = logger.handlers
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                latency = options['disk_latency'] / 1000
+                modes = self._modes(Path(tmp), latency)
+                self.stdout.write(f"레코드 {options['records']:,}건 (호출 스레드 기준 µs/건)")
+                for name, handlers, finish in modes:
+                    logger.handlers = handlers
+                    per_record, drain = self._records(logger, options['records'], finish)
+                    self.stdout.write(f'  {name:<14} {per_record:7.1f}µs  (기록 완료까지 +{drain * 1000:.0f}ms)')
+
+                self.stdout.write(f"요청 {options['requests']:,}건 {options['path']} (µs/요청, 중앙값)")
+                baseline = None
+                for name, handlers, finish in [('off', [], None)] + self._modes(Path(tmp), latency):
+                    logger.handlers = handlers
+                    median = self._requests(options['path'], options['requests'])
+                    if finish:
+                        finish()
+                    baseline = median if baseline is None else baseline
+                    self.stdout.write(f'  {name:<14} {median:7.0f}µs  (로깅 +{median - baseline:.0f}µs)')
+            finally:
+                logger.handlers = saved
+
+    def _modes(self, tmp, latency):
+        def file_handler(name, formatter):
+            handler = _SlowFileHandler(tmp / name, maxBytes=50 * 1024 * 1024, backupCount=1, encoding='utf-8')
+            handler.latency = latency
+            handler.setFormatter(formatter)
+            return handler
+
+        text = logging.Formatter('[{asctime}] {levelname} {name} | {message}', style='{')
+        sync_text = file_handler('text.log', text)
+        sync_json = file_handler('sync.jsonl', logs.JSONFormatter())
+        pipeline = logs.queue_handlers([file_handler('queued.jsonl', logs.JSONFormatter())])
+        return [
+            ('sync text', [sync_text], None),
+            ('sync json', [sync_json], None),
+            ('queued json', [pipeline.handler], pipeline.stop),
+        ]
+
+    def _records(self, logger, n, finish):
+        filters = {'crop': '인삼', 'part': '뿌리', 'origin': '금산', 'year': '', 'qc': 'PASS'}
+        t0 = time.perf_counter()
+        for i in range(n):
+            logger.info("API   compounds | ip=%s rows=%d", '127.0.0.1', i, extra={'filters': filters})
+        emitted = time.perf_counter()
+        if finish:
+            finish()
+        return (emitted - t0) / n * 1e6, time.perf_counter() - emitted
+
+    def _requests(self, path, n):
+        client = Client()
+        client.get(path)
+        timings = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            client.get(path)
+            timings.append(time.perf_counter() - t0)
+        return statistics.median(timings) * 1e6
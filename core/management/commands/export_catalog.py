@@ -0,0 +1,40 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import export
+from core.catalog import catalog_filters, filter_compounds
+
+
+class Command(BaseCommand):
+    help = '카탈로그 표준 데이터 패키지 내보내기 (CSV/JSONL/Parquet + datapackage.json, zip 스트리밍)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=export.FORMATS, default='csv')
+        parser.add_argument('-o', '--output', help='출력 zip 경로 (기본: metabolome_<형식>_<날짜>.zip)')
+        parser.add_argument('--crop', default='')
+        parser.add_argument('--part', default='')
+        parser.add_argument('--origin', default='')
+        parser.add_argument('--year', default='')
+        parser.add_argument('--qc', default='PASS', help="QC 상태 (빈 문자열이면 전체, 기본: PASS)")
+        parser.add_argument('--chunk-size', type=int, help='한 번에 읽는 행 수 (기본: EXPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        filters = catalog_filters(options)
+        try:
+            export.check_format(fmt)
+            compounds = filter_compounds(filters)
+        except ValueError as e:
+            raise CommandError(str(e))
+        output = Path(options['output'] or f"metabolome_{fmt}_{time.strftime('%Y%m%d')}.zip")
+
+        t0 = time.perf_counter()
+        size = 0
+        with open(output, 'wb') as f:
+            for piece in export.stream(compounds, fmt, filters, options['chunk_size']):
+                f.write(piece)
+                size += len(piece)
+        self.stdout.write(self.style.SUCCESS(
+            f'{output} 저장 ({size / 1e6:.1f} MB, {time.perf_counter() - t0:.1f}초)'))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import synthetic
+
+
+def _years(value):
+    first, _, last = value.partition('-')
+    return int(first), int(last or first)
+
+
+class Command(BaseCommand):
+    help = '규모 테스트용 합성 데이터 생성 (작목·산지·연도·성분·질량·RT·환경; 기존 카탈로그 데이터 삭제)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crops', type=int, default=200, help='작목(시료) 수')
+        parser.add_argument('--compounds', type=int, default=100_000, help='성분 수 (최대 1천만 건 규모까지)')
+        parser.add_argument('--years', type=_years, default=(2019, 2025), help='연도 범위, 예: 2019-2025')
+        parser.add_argument('--spectra', type=int, default=1000, help='합성 MS/MS 스펙트럼 수')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=20_000)
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='삭제 확인 없이 진행')
+
+    def handle(self, *args, **options):
+        if options['interactive']:
+            answer = input('기존 작목·성분·스펙트럼·환경 데이터와 AI 작업이 모두 삭제됩니다. 계속할까요? [y/N] ')
+            if answer.strip().lower() not in ('y', 'yes'):
+                raise CommandError('취소되었습니다.')
+
+        t0 = time.perf_counter()
+
+        def progress(written):
+            elapsed = time.perf_counter() - t0
+            self.stdout.write(f'성분 {written:,}건 ({written / elapsed:,.0f} rows/s)')
+
+        try:
+            counts = synthetic.generate(
+                crop_count=options['crops'], compound_count=options['compounds'], years=options['years'],
+                spectrum_count=options['spectra'], seed=options['seed'], batch_size=options['batch_size'],
+                progress=progress)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"생성 완료: 작목 {counts['crops']:,}, 성분 {counts['compounds']:,}, 스펙트럼 {counts['spectra']:,}, "
+            f"환경 {counts['environment']:,}건 (검색 색인 {counts['indexed']:,}건) {time.perf_counter() - t0:.1f}s"
+        ))
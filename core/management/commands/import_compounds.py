@@ -0,0 +1,86 @@
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingest import CropResolver, IngestError, clean_record, guess_format, open_text, read_records, write_batch
+from core.summaries import refresh as refresh_summaries
+from core.versioning import bump_data_version
+
+
+class Command(BaseCommand):
+    help = '기기 분석 결과 대량 적재 (CSV/TSV/MSP/mzTab-M, 스트리밍 upsert)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'tsv', 'msp', 'mztab'],
+                            help='파일 형식 (기본: 확장자로 판단)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--resume', action='store_true',
+                            help='체크포인트 이후 행부터 이어서 적재')
+        # Crop metadata for formats that carry none (MSP, mzTab-M); columns in the file win.
+        parser.add_argument('--crop', dest='name_ko')
+        parser.add_argument('--crop-en', dest='name_en')
+        parser.add_argument('--part', dest='plant_part')
+        parser.add_argument('--origin')
+        parser.add_argument('--year')
+        parser.add_argument('--source')
+        parser.add_argument('--qc', dest='qc_status')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'파일이 없습니다: {path}')
+        fmt = options['format'] or guess_format(path)
+        if not fmt:
+            raise CommandError('--format 을 지정하세요 (csv, tsv, msp, mztab)')
+        defaults = {k: options[k] for k in ('name_ko', 'name_en', 'plant_part', 'origin', 'year', 'source', 'qc_status')
+                    if options[k]}
+        batch_size = options['batch_size']
+
+        # The checkpoint only applies to the file it was written for (same size and mtime).
+        checkpoint = path.with_name(path.name + '.checkpoint')
+        stat = path.stat()
+        source = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        skip = 0
+        if options['resume'] and checkpoint.exists():
+            state = json.loads(checkpoint.read_text())
+            if {k: state.get(k) for k in source} == source:
+                skip = state['rows']
+                self.stdout.write(f'체크포인트에서 재개: {skip}행 건너뜀')
+            else:
+                self.stdout.write(self.style.WARNING('파일이 체크포인트 이후 변경되어 처음부터 적재합니다'))
+
+        resolver = CropResolver()
+        done, written = skip, 0
+        t0 = time.perf_counter()
+        with open_text(path) as fh:
+            records = enumerate(read_records(fh, fmt), start=1)
+            try:
+                for _ in islice(records, skip):
+                    pass
+                while True:
+                    chunk = list(islice(records, batch_size))
+                    if not chunk:
+                        break
+                    batch = [clean_record(record, row, defaults) for row, record in chunk]
+                    written += write_batch(batch, resolver)
+                    done = chunk[-1][0]
+                    checkpoint.write_text(json.dumps({'rows': done, **source}))
+                    elapsed = time.perf_counter() - t0
+                    self.stdout.write(f'{done}행 적재 ({(done - skip) / elapsed:,.0f} rows/s)')
+            except IngestError as e:
+                raise CommandError(f'{e} — 커밋된 {done}행까지 체크포인트 저장됨, --resume 으로 재개하세요')
+            finally:
+                if written:
+                    refresh_summaries(resolver.touched)
+                    bump_data_version()
+
+        checkpoint.unlink(missing_ok=True)
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(
+            f'적재 완료: {done - skip}행 처리, 성분 {written}건 upsert, '
+            f'{elapsed:.1f}s ({(done - skip) / max(elapsed, 1e-9):,.0f} rows/s)'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = '성분 검색 색인(FTS5) 재구성 (트리거 복구 포함)'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.install()
+            count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'검색 색인 {count}건 재구성'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.summaries import refresh, refresh_all
+
+
+class Command(BaseCommand):
+    help = '작목별 대시보드 집계(CropSummary) 재계산'
+
+    def add_arguments(self, parser):
+        parser.add_argument('crop_ids', nargs='*', type=int, help='이 작목 id만 재계산 (기본: 전체)')
+
+    def handle(self, *args, **options):
+        count = refresh(options['crop_ids']) if options['crop_ids'] else refresh_all()
+        self.stdout.write(self.style.SUCCESS(f'작목 요약 {count}건 갱신'))
@@ -0,0 +1,124 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import ai_cache, ai_service, jobs, resilience
+
+# Pause used when a 429 carries no usable Retry-After header.
+DEFAULT_RATE_LIMIT_PAUSE = 10.0
+# How often the poll loop requeues items whose lease expired (another worker died).
+RELEASE_INTERVAL = 60.0
+
+
+def _retry_after(exc):
+    response = getattr(exc, 'response', None)
+    try:
+        return max(float(response.headers.get('retry-after')), 1.0)
+    except (AttributeError, TypeError, ValueError):
+        return DEFAULT_RATE_LIMIT_PAUSE
+
+
+def _is_permanent(exc):
+    """Errors a retry cannot fix: missing key, bad request, auth. Timeouts/5xx/connection errors are retried."""
+    if isinstance(exc, ai_service.AIServiceError):
+        return True
+    status = getattr(exc, 'status_code', None)
+    return status is not None and 400 <= status < 500 and status not in (408, 409, 429)
+
+
+class Command(BaseCommand):
+    help = 'AI 일괄 해석 작업 큐 처리 (동시 처리 수 제한·재시도·요청 한도 대응)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.AI_WORKER_CONCURRENCY,
+                            help='동시 LLM 호출 수')
+        parser.add_argument('--poll', type=float, default=2.0, help='큐가 비었을 때 조회 간격 (초)')
+        parser.add_argument('--once', action='store_true', help='남은 작업을 모두 처리하면 종료')
+
+    def handle(self, *args, **options):
+        if not settings.GROQ_API_KEY:
+            raise CommandError(ai_service.NO_KEY_ERROR)
+        self.ok = self.failed = 0
+        try:
+            asyncio.run(self.run(options['concurrency'], options['poll'], options['once']))
+        except KeyboardInterrupt:
+            self.stderr.write('중단됨: 처리 중이던 항목은 다음 실행 시 다시 대기열에 들어갑니다.')
+        self.stdout.write(self.style.SUCCESS(f'처리 완료: 성공 {self.ok}건, 실패 {self.failed}건'))
+
+    async def run(self, concurrency, poll, once):
+        loop = asyncio.get_running_loop()
+        # Provider-wide pause after a 429; shared by every in-flight call of this worker.
+        self.paused_until = 0.0
+        tasks = set()
+        next_release = 0.0
+        try:
+            while True:
+                if loop.time() >= next_release:
+                    released = await sync_to_async(jobs.release_stale)()
+                    if released:
+                        self.stdout.write(f'중단된 항목 {released}건 재등록')
+                    next_release = loop.time() + RELEASE_INTERVAL
+                pause = self.paused_until - loop.time()
+                items = []
+                if pause <= 0 and len(tasks) < concurrency:
+                    items = await sync_to_async(jobs.claim)(concurrency - len(tasks))
+                for item in items:
+                    tasks.add(asyncio.create_task(self.process(item)))
+                if tasks:
+                    _, tasks = await asyncio.wait(tasks, timeout=poll, return_when=asyncio.FIRST_COMPLETED)
+                elif once and not await sync_to_async(jobs.has_pending)():
+                    break
+                else:
+                    await asyncio.sleep(max(pause, poll))
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await ai_service.aclose()
+
+    async def process(self, item):
+        compound = item.compound
+        label = f'#{item.job_id} {compound.name} ({compound.crop.name_ko})'
+        payload = ai_service.compound_payload(compound)
+        key = ai_service.compound_cache_key(payload)
+        try:
+            result = await sync_to_async(ai_cache.get)(key)
+            if result is None:
+                # In-call retries would hide 429s from the shared pause below; items are retried by the queue.
+                result = await ai_service.ainterpret_compound_uncached(payload, retries=0)
+                await sync_to_async(ai_cache.put)(key, 'compound', result)
+        except Exception as e:
+            await self.handle_error(item, label, e)
+            return
+        await sync_to_async(jobs.complete)(item, result)
+        self.ok += 1
+        self.stdout.write(f'{label}: OK')
+
+    async def handle_error(self, item, label, exc):
+        error = f'{type(exc).__name__}: {exc}'
+        if isinstance(exc, resilience.CircuitOpenError):
+            # Upstream is down: wait out the breaker's cooldown without spending the item's attempts.
+            await self.defer(item, label, error, max(exc.retry_after, 1.0), 'AI 서비스 장애')
+        elif getattr(exc, 'status_code', None) == 429:
+            await self.defer(item, label, error, _retry_after(exc), '요청 한도 초과')
+        elif _is_permanent(exc):
+            await sync_to_async(jobs.fail)(item, error)
+            self.failed += 1
+            self.stderr.write(f'{label}: 실패 ({error})')
+        elif await sync_to_async(jobs.retry)(item, error):
+            self.stderr.write(f'{label}: 재시도 예정 ({error})')
+        else:
+            self.failed += 1
+            self.stderr.write(f'{label}: {item.attempts + 1}회 시도 후 실패 ({error})')
+
+    async def defer(self, item, label, error, wait, reason):
+        """Requeue ``item`` without spending an attempt and pause claiming for ``wait`` seconds."""
+        loop = asyncio.get_running_loop()
+        self.paused_until = max(self.paused_until, loop.time() + wait)
+        if await sync_to_async(jobs.retry)(item, error, delay=wait, count_attempt=False):
+            self.stderr.write(f'{label}: {reason}, {wait:.0f}초 대기')
+        else:
+            self.failed += 1
+            self.stderr.write(f'{label}: {item.deferrals + 1}회 연기 후 실패 ({error})')
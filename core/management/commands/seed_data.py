@@ -1,10 +1,15 @@
+from datetime import date
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from core.models import Crop, Compound, EnvironmentData
+from core.regions import RegionResolver, ensure_regions
 
 
 class Command(BaseCommand):
     help = '샘플 데이터 시딩 (계획서 기반 작물·성분만 사용)'
 
+    @transaction.atomic
     def handle(self, *args, **options):
         # 기존 데이터 삭제
         Crop.objects.all().delete()
@@ -23,45 +28,48 @@ class Command(BaseCommand):
             {'name_ko': '동충하초', 'name_en': 'Cordyceps', 'name_scientific': 'Cordyceps militaris', 'plant_part': '자실체', 'origin': '횡성', 'year': 2025},
         ]
 
+        ensure_regions()
+        regions = RegionResolver()
+
         crops = {}
         for cd in crops_data:
-            c = Crop.objects.create(**cd)
+            c = Crop.objects.create(**cd, region_id=regions.resolve(cd['origin']))
             key = f"{cd['name_ko']}_{cd['origin']}"
             crops[key] = c
 
         # ── 성분 데이터 (계획서·레퍼런스 이미지 언급 성분) ──
         compounds_data = [
             # 인삼 (금산)
-            {'crop_key': '인삼_금산', 'name': 'Ginsenoside Rg1', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 96, 'similarity': 0.94, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 801.01, 'retention_time': 12.3},
-            {'crop_key': '인삼_금산', 'name': 'Ginsenoside Rb1', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 93, 'similarity': 0.92, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 1109.29, 'retention_time': 15.7},
-            {'crop_key': '인삼_금산', 'name': 'Ginsenoside Re', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 88, 'similarity': 0.89, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 947.15, 'retention_time': 11.2},
-            {'crop_key': '인삼_금산', 'name': 'Ginsenoside Rc', 'annotation_level': 'L2', 'source': 'PUBLIC', 'score': 79, 'similarity': 0.82, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 1079.27, 'retention_time': 14.8},
+            {'crop_key': '인삼_금산', 'name': 'Ginsenoside Rg1', 'synonyms': '진세노사이드 Rg1', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 96, 'similarity': 0.94, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 801.01, 'retention_time': 12.3},
+            {'crop_key': '인삼_금산', 'name': 'Ginsenoside Rb1', 'synonyms': '진세노사이드 Rb1', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 93, 'similarity': 0.92, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 1109.29, 'retention_time': 15.7},
+            {'crop_key': '인삼_금산', 'name': 'Ginsenoside Re', 'synonyms': '진세노사이드 Re', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 88, 'similarity': 0.89, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 947.15, 'retention_time': 11.2},
+            {'crop_key': '인삼_금산', 'name': 'Ginsenoside Rc', 'synonyms': '진세노사이드 Rc', 'annotation_level': 'L2', 'source': 'PUBLIC', 'score': 79, 'similarity': 0.82, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 1079.27, 'retention_time': 14.8},
             # 인삼 (풍기)
-            {'crop_key': '인삼_풍기', 'name': 'Ginsenoside Rg1', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 91, 'similarity': 0.90, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 801.01, 'retention_time': 12.5},
-            {'crop_key': '인삼_풍기', 'name': 'Ginsenoside Rb1', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 89, 'similarity': 0.88, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 1109.29, 'retention_time': 15.9},
+            {'crop_key': '인삼_풍기', 'name': 'Ginsenoside Rg1', 'synonyms': '진세노사이드 Rg1', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 91, 'similarity': 0.90, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 801.01, 'retention_time': 12.5},
+            {'crop_key': '인삼_풍기', 'name': 'Ginsenoside Rb1', 'synonyms': '진세노사이드 Rb1', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 89, 'similarity': 0.88, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 1109.29, 'retention_time': 15.9},
             # 당귀
-            {'crop_key': '당귀_평창', 'name': 'Decursin', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 89, 'similarity': 0.91, 'qc_status': 'PASS', 'compound_class': 'Coumarin', 'molecular_weight': 328.36, 'retention_time': 18.4},
-            {'crop_key': '당귀_평창', 'name': 'Decursinol angelate', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 85, 'similarity': 0.87, 'qc_status': 'PASS', 'compound_class': 'Coumarin', 'molecular_weight': 328.36, 'retention_time': 17.1},
-            {'crop_key': '당귀_평창', 'name': 'Nodakenin', 'annotation_level': 'L2', 'source': 'PUBLIC', 'score': 76, 'similarity': 0.80, 'qc_status': 'PASS', 'compound_class': 'Coumarin', 'molecular_weight': 408.40, 'retention_time': 9.6},
+            {'crop_key': '당귀_평창', 'name': 'Decursin', 'synonyms': '데커신', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 89, 'similarity': 0.91, 'qc_status': 'PASS', 'compound_class': 'Coumarin', 'molecular_weight': 328.36, 'retention_time': 18.4},
+            {'crop_key': '당귀_평창', 'name': 'Decursinol angelate', 'synonyms': '데커시놀 안젤레이트', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 85, 'similarity': 0.87, 'qc_status': 'PASS', 'compound_class': 'Coumarin', 'molecular_weight': 328.36, 'retention_time': 17.1},
+            {'crop_key': '당귀_평창', 'name': 'Nodakenin', 'synonyms': '노다케닌', 'annotation_level': 'L2', 'source': 'PUBLIC', 'score': 76, 'similarity': 0.80, 'qc_status': 'PASS', 'compound_class': 'Coumarin', 'molecular_weight': 408.40, 'retention_time': 9.6},
             # 황기
-            {'crop_key': '황기_정선', 'name': 'Astragaloside IV', 'annotation_level': 'L2', 'source': 'IN-HOUSE', 'score': 84, 'similarity': 0.88, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 784.97, 'retention_time': 20.1},
-            {'crop_key': '황기_정선', 'name': 'Calycosin', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 82, 'similarity': 0.85, 'qc_status': 'PASS', 'compound_class': 'Flavonoid', 'molecular_weight': 284.26, 'retention_time': 13.8},
+            {'crop_key': '황기_정선', 'name': 'Astragaloside IV', 'synonyms': '아스트라갈로사이드 IV', 'annotation_level': 'L2', 'source': 'IN-HOUSE', 'score': 84, 'similarity': 0.88, 'qc_status': 'PASS', 'compound_class': 'Saponin', 'molecular_weight': 784.97, 'retention_time': 20.1},
+            {'crop_key': '황기_정선', 'name': 'Calycosin', 'synonyms': '칼리코신', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 82, 'similarity': 0.85, 'qc_status': 'PASS', 'compound_class': 'Flavonoid', 'molecular_weight': 284.26, 'retention_time': 13.8},
             # 결명자
-            {'crop_key': '결명자_진도', 'name': 'Chrysophanol', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 87, 'similarity': 0.90, 'qc_status': 'PASS', 'compound_class': 'Anthraquinone', 'molecular_weight': 254.24, 'retention_time': 22.3},
+            {'crop_key': '결명자_진도', 'name': 'Chrysophanol', 'synonyms': '크리소파놀', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 87, 'similarity': 0.90, 'qc_status': 'PASS', 'compound_class': 'Anthraquinone', 'molecular_weight': 254.24, 'retention_time': 22.3},
             # 단삼
-            {'crop_key': '단삼_영주', 'name': 'Tanshinone IIA', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 90, 'similarity': 0.91, 'qc_status': 'PASS', 'compound_class': 'Diterpene', 'molecular_weight': 294.34, 'retention_time': 25.6},
-            {'crop_key': '단삼_영주', 'name': 'Salvianolic acid B', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 86, 'similarity': 0.88, 'qc_status': 'PASS', 'compound_class': 'Phenolic acid', 'molecular_weight': 718.61, 'retention_time': 16.2},
+            {'crop_key': '단삼_영주', 'name': 'Tanshinone IIA', 'synonyms': '탄시논 IIA', 'annotation_level': 'L1', 'source': 'IN-HOUSE', 'score': 90, 'similarity': 0.91, 'qc_status': 'PASS', 'compound_class': 'Diterpene', 'molecular_weight': 294.34, 'retention_time': 25.6},
+            {'crop_key': '단삼_영주', 'name': 'Salvianolic acid B', 'synonyms': '살비아놀산 B', 'annotation_level': 'L1', 'source': 'PUBLIC', 'score': 86, 'similarity': 0.88, 'qc_status': 'PASS', 'compound_class': 'Phenolic acid', 'molecular_weight': 718.61, 'retention_time': 16.2},
             # 상황버섯
-            {'crop_key': '상황버섯_영월', 'name': 'Beta-glucan', 'annotation_level': 'L3', 'source': 'PUBLIC', 'score': 68, 'similarity': 0.76, 'qc_status': 'REVIEW', 'compound_class': 'Polysaccharide', 'molecular_weight': None, 'retention_time': None},
+            {'crop_key': '상황버섯_영월', 'name': 'Beta-glucan', 'synonyms': '베타글루칸; β-glucan', 'annotation_level': 'L3', 'source': 'PUBLIC', 'score': 68, 'similarity': 0.76, 'qc_status': 'REVIEW', 'compound_class': 'Polysaccharide', 'molecular_weight': None, 'retention_time': None},
             # 동충하초
-            {'crop_key': '동충하초_횡성', 'name': 'Cordycepin', 'annotation_level': 'L2', 'source': 'IN-HOUSE', 'score': 79, 'similarity': 0.82, 'qc_status': 'PASS', 'compound_class': 'Nucleoside', 'molecular_weight': 251.24, 'retention_time': 5.8},
+            {'crop_key': '동충하초_횡성', 'name': 'Cordycepin', 'synonyms': "코디세핀; 3'-deoxyadenosine", 'annotation_level': 'L2', 'source': 'IN-HOUSE', 'score': 79, 'similarity': 0.82, 'qc_status': 'PASS', 'compound_class': 'Nucleoside', 'molecular_weight': 251.24, 'retention_time': 5.8},
         ]
 
         for cpd in compounds_data:
             crop = crops[cpd.pop('crop_key')]
             Compound.objects.create(crop=crop, **cpd)
 
-        # ── 환경 데이터 ──
+        # ── 환경 데이터 (2025년 연간 지표) ──
         env_data = [
             {'region': '강원도 평창군', 'avg_temperature': 13.2, 'avg_rainfall': 1240, 'soil_grade': 'B'},
             {'region': '충남 금산군', 'avg_temperature': 12.8, 'avg_rainfall': 1150, 'soil_grade': 'A'},
@@ -73,7 +81,9 @@ class Command(BaseCommand):
         ]
 
         for ed in env_data:
-            EnvironmentData.objects.create(**ed)
+            region_name = ed.pop('region')
+            EnvironmentData.objects.create(region_id=regions.resolve(region_name), region_name=region_name,
+                                           period=date(2025, 1, 1), **ed)
 
         self.stdout.write(self.style.SUCCESS(
             f'시딩 완료: 작물 {Crop.objects.count()}건, '
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core import origin
+from core.facets import catalog_facets
+
+
+class Command(BaseCommand):
+    help = '원산지 판별 모델 학습 (작목별 성분 프로파일 → PCA + kNN)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crop', action='append', default=[], help='이 작목만 학습 (반복 가능)')
+        parser.add_argument('--components', type=int, default=5, help='PCA 주성분 수')
+        parser.add_argument('--neighbors', type=int, default=3, help='kNN 이웃 수')
+
+    def handle(self, *args, **options):
+        crops = options['crop'] or [name for name, _ in catalog_facets()['crops']]
+        trained = 0
+        for crop in crops:
+            meta = origin.train(crop, options['components'], options['neighbors'])
+            if meta is None:
+                self.stdout.write(f'{crop}: 원산지가 2곳 미만이라 건너뜀')
+                continue
+            trained += 1
+            loo = meta['loo_accuracy']
+            self.stdout.write(
+                f"{crop}: 시료 {meta['n_samples']}개, 성분 {len(meta['features'])}종, "
+                f"원산지 {', '.join(meta['classes'])}, 주성분 {meta['n_components']}개, "
+                f"LOO 정확도 {'-' if loo is None else f'{loo:.1%}'}")
+        self.stdout.write(self.style.SUCCESS(f'학습 완료: {trained}개 작목'))
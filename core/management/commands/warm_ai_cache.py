@@ -0,0 +1,54 @@
+from itertools import permutations
+
+from django.core.management.base import BaseCommand
+
+from core import ai_service
+from core.dashboard import load_dashboard
+from core.facets import catalog_facets
+from core.models import Compound
+
+
+class Command(BaseCommand):
+    help = 'AI 해석 캐시 사전 생성 (성분 해석·대시보드 비교)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crop', help='이 작목의 성분만 생성')
+        parser.add_argument('--limit', type=int, help='성분 최대 개수 (점수 높은 순)')
+        parser.add_argument('--skip-compounds', action='store_true')
+        parser.add_argument('--skip-dashboards', action='store_true')
+        parser.add_argument('--pair', action='append', default=[],
+                            help='대시보드 비교쌍 "인삼,황기" (기본: 모든 작목 순서쌍)')
+
+    def handle(self, *args, **options):
+        ok = failed = 0
+
+        if not options['skip_compounds']:
+            compounds = Compound.objects.select_related('crop').order_by('-score', 'id')
+            if options['crop']:
+                compounds = compounds.filter(crop__name_ko=options['crop'])
+            if options['limit']:
+                compounds = compounds[:options['limit']]
+            for compound in compounds.iterator(chunk_size=500):
+                result = ai_service.interpret_compound(ai_service.compound_payload(compound))
+                ok, failed = self._report(result, f'성분 {compound.name} ({compound.crop.name_ko})', ok, failed)
+
+        if not options['skip_dashboards']:
+            if options['pair']:
+                pairs = [tuple(p.split(',', 1)) for p in options['pair']]
+            else:
+                pairs = permutations([name for name, _ in catalog_facets()['crops']], 2)
+            for crop_a, crop_b in pairs:
+                data = load_dashboard(crop_a, crop_b)
+                payload = ai_service.dashboard_payload(
+                    crop_a, data['compounds_a'], crop_b, data['compounds_b'], data['env_data'])
+                result = ai_service.interpret_dashboard(payload)
+                ok, failed = self._report(result, f'대시보드 {crop_a} vs {crop_b}', ok, failed)
+
+        self.stdout.write(self.style.SUCCESS(f'캐시 생성 완료: 성공 {ok}건, 실패 {failed}건'))
+
+    def _report(self, result, label, ok, failed):
+        if 'error' in result:
+            self.stderr.write(f'{label}: {result["error"]}')
+            return ok, failed + 1
+        self.stdout.write(f'{label}: OK')
+        return ok + 1, failed
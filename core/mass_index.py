@@ -0,0 +1,109 @@
+"""In-memory mass / retention-time index for ppm- or Da-tolerance lookups.
+
+Compounds with a molecular weight are held as arrays sorted by neutral mass,
+rebuilt when the data version changes. A query m/z is converted to a neutral
+mass for each requested adduct and its tolerance window is found with a
+binary search. A batch of queries is answered with one ``searchsorted`` per
+adduct over the whole batch, and the matching ranges are expanded to
+(query, compound) pairs without a Python loop.
+"""
+import numpy as np
+
+from .models import Compound
+from .versioning import VersionedValue
+
+# m/z = M + shift for singly charged ions ('M' is the neutral mass itself).
+ADDUCTS = {
+    'M': 0.0,
+    '[M+H]+': 1.007276,
+    '[M+Na]+': 22.989218,
+    '[M+K]+': 38.963158,
+    '[M+NH4]+': 18.033823,
+    '[M-H]-': -1.007276,
+}
+DEFAULT_ADDUCTS = ('M',)
+UNITS = ('ppm', 'da')
+
+
+class MassIndex:
+    def __init__(self, ids, mass, rt, names, crops):
+        self.ids = ids
+        self.mass = mass
+        self.rt = rt
+        self.names = names
+        self.crops = crops
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_db(cls):
+        rows = list(Compound.objects.filter(molecular_weight__isnull=False)
+                    .order_by('molecular_weight', 'id')
+                    .values_list('id', 'molecular_weight', 'retention_time', 'name', 'crop__name_ko'))
+        ids, mass, rt, names, crops = zip(*rows) if rows else ((),) * 5
+        return cls(np.array(ids, dtype=np.int64),
+                   np.array(mass, dtype=np.float64),
+                   np.array([np.nan if t is None else t for t in rt], dtype=np.float64),
+                   names, crops)
+
+    def lookup(self, mz, tolerance=5.0, unit='ppm', adducts=DEFAULT_ADDUCTS,
+               rt=None, rt_tolerance=None, rt_min=None, rt_max=None, limit=None):
+        """Vectorized window search for an array of query m/z values.
+
+        ``rt`` (per query, NaN for none) with ``rt_tolerance`` and/or a global ``rt_min``/``rt_max``
+        restrict retention time; a query without an RT skips the ``rt_tolerance`` filter, and
+        compounds without an RT never pass an RT filter.
+        With ``limit``, each window is clipped to the ``limit`` compounds on either side of the
+        query mass before expanding (RT filters apply to those), and at most ``limit`` matches
+        are returned per query.
+        Returns parallel arrays (query index, adduct index, library index, ppm error)
+        ordered by query, then absolute ppm error.
+        """
+        if unit not in UNITS:
+            raise ValueError(f"unit must be one of {', '.join(UNITS)}")
+        unknown = [a for a in adducts if a not in ADDUCTS]
+        if unknown:
+            raise ValueError(f"unknown adducts: {', '.join(unknown)} (known: {', '.join(ADDUCTS)})")
+        adducts = adducts or DEFAULT_ADDUCTS
+        mz = np.asarray(mz, dtype=np.float64)
+        window = mz * tolerance * 1e-6 if unit == 'ppm' else np.full_like(mz, tolerance)
+
+        parts = []
+        for a, adduct in enumerate(adducts):
+            neutral = mz - ADDUCTS[adduct]
+            lo = np.searchsorted(self.mass, neutral - window, side='left')
+            hi = np.searchsorted(self.mass, neutral + window, side='right')
+            if limit is not None:
+                # The ``limit`` closest masses in [lo, hi) lie within ``limit`` places of the query mass.
+                center = np.searchsorted(self.mass, neutral)
+                lo, hi = np.maximum(lo, center - limit), np.minimum(hi, center + limit)
+            counts = hi - lo
+            query = np.repeat(np.arange(len(mz)), counts)
+            # Position within each [lo, hi) run, offset by that run's lo.
+            starts = np.cumsum(counts) - counts
+            index = np.arange(counts.sum()) - np.repeat(starts, counts) + np.repeat(lo, counts)
+            parts.append((query, np.full(len(query), a), index))
+        query, adduct, index = (np.concatenate(p) for p in zip(*parts))
+
+        keep = np.ones(len(index), dtype=bool)
+        if rt is not None and rt_tolerance is not None:
+            query_rt = np.asarray(rt, dtype=np.float64)[query]
+            keep &= np.isnan(query_rt) | (np.abs(self.rt[index] - query_rt) <= rt_tolerance)
+        if rt_min is not None:
+            keep &= self.rt[index] >= rt_min
+        if rt_max is not None:
+            keep &= self.rt[index] <= rt_max
+        query, adduct, index = query[keep], adduct[keep], index[keep]
+
+        shifts = np.array([ADDUCTS[a] for a in adducts])
+        ppm = (self.mass[index] + shifts[adduct] - mz[query]) / mz[query] * 1e6
+        order = np.lexsort((np.abs(ppm), query))
+        if limit is not None:
+            # Rank of each match within its query's run
+            ranked = query[order]
+            order = order[np.arange(len(ranked)) - np.searchsorted(ranked, ranked) < limit]
+        return query[order], adduct[order], index[order], ppm[order]
+
+
+index = VersionedValue(MassIndex.from_db)
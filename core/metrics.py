@@ -0,0 +1,219 @@
+"""In-process request and LLM metrics, exposed in Prometheus text format at /metrics.
+
+Counters and histograms live in a per-process registry. Every process also
+writes a snapshot of its registry to METRICS_DIR, at most once per
+METRICS_FLUSH_INTERVAL and at exit. ``render`` sums the live registry and
+the other processes' snapshots, so any worker can answer a scrape for all of
+them. A snapshot not rewritten for METRICS_SNAPSHOT_MAX_AGE seconds (an
+exited worker, a one-off management command) is deleted at the next scrape,
+which Prometheus reads as a counter reset. Live workers rewrite theirs on
+every flush, and a scrape is itself a request, so theirs stay fresh.
+
+Request metrics come from core.middleware.MetricsMiddleware. ORM queries are
+counted by an execute wrapper installed on every database connection.
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+LLM_BUCKETS = (.1, .25, .5, 1, 2, 4, 8, 15, 30, 60)
+SIZE_BUCKETS = (512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+# name: (type, help, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by route, method and status.', None),
+    'http_request_duration_seconds': ('histogram', 'Time to the response object, by route.', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Response body size (non-streaming responses).', SIZE_BUCKETS),
+    'http_request_db_queries': ('histogram', 'ORM queries per request.', QUERY_BUCKETS),
+    'db_queries_total': ('counter', 'ORM queries, by route.', None),
+    'db_query_seconds_total': ('counter', 'Time spent in ORM queries, by route.', None),
+    'llm_request_duration_seconds': ('histogram', 'Upstream LLM call time, by operation.', LLM_BUCKETS),
+    'llm_tokens_total': ('counter', 'LLM tokens used, by operation and type (prompt, completion).', None),
+    'llm_errors_total': ('counter', 'Failed upstream LLM calls, by operation and error class.', None),
+    'llm_retries_total': ('counter', 'Retried upstream LLM attempts, by operation.', None),
+    'llm_circuit_opened_total': ('counter', 'Times the upstream circuit breaker opened.', None),
+    'ai_cache_requests_total': ('counter', 'AI cache lookups, by kind and result (hit, miss, coalesced, stale).',
+                                None),
+    'ai_admission_total': ('counter', 'AI endpoint requests, by endpoint and result (admitted, rate_limited, '
+                           'overloaded).', None),
+}
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_values = {}       # (name, labels) -> float, or [bucket counts..., sum, count] for histograms
+_flushed = 0.0
+
+# [query count, query seconds] of the current request, for the connection wrapper
+request_queries = contextvars.ContextVar('core_metrics_queries', default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+    _maybe_flush()
+
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        histogram = _values.get(key)
+        if histogram is None:
+            histogram = _values[key] = [0] * (len(buckets) + 3)
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+    _maybe_flush()
+
+
+def count_queries(execute, sql, params, many, context):
+    """Connection execute wrapper adding each query to the current request's totals."""
+    totals = request_queries.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals[0] += 1
+        totals[1] += time.perf_counter() - start
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver."""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+# ---- multi-process snapshots ----
+
+_started = f'{os.getpid()}-{time.time_ns()}'
+
+
+def _snapshot_dir():
+    return Path(settings.METRICS_DIR) if settings.METRICS_DIR else None
+
+
+def _snapshot_path(base):
+    return base / f'{_started}.json'
+
+
+def _maybe_flush():
+    if time.monotonic() - _flushed >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def flush():
+    """Write this process's registry to METRICS_DIR (atomically)."""
+    global _flushed
+    with _flush_lock:
+        _flushed = time.monotonic()
+        base = _snapshot_dir()
+        if base is None:
+            return
+        with _lock:
+            rows = [[name, labels, value] for (name, labels), value in _values.items()]
+        base.mkdir(parents=True, exist_ok=True)
+        path = _snapshot_path(base)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(rows))
+        os.replace(tmp, path)
+
+
+def _reset_after_fork():
+    # A forked worker starts its own series instead of re-reporting the parent's.
+    global _started, _flushed, _lock, _flush_lock
+    _started = f'{os.getpid()}-{time.time_ns()}'
+    _flushed = 0.0
+    _lock, _flush_lock = threading.Lock(), threading.Lock()
+    _values.clear()
+
+
+atexit.register(lambda: flush() if _values else None)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _merge(total, name, labels, value):
+    key = (name, tuple(tuple(pair) for pair in labels))
+    if isinstance(value, list):
+        current = total.setdefault(key, [0] * len(value))
+        for i, v in enumerate(value):
+            current[i] += v
+    else:
+        total[key] = total.get(key, 0) + value
+
+
+def collect():
+    """This process's values plus every other process's last snapshot."""
+    total = {}
+    base = _snapshot_dir()
+    if base is not None and base.exists():
+        own = _snapshot_path(base)
+        cutoff = time.time() - settings.METRICS_SNAPSHOT_MAX_AGE
+        for path in base.iterdir():
+            if path == own:
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()  # also clears .tmp files left by a crash mid-write
+                    continue
+                if path.suffix != '.json':
+                    continue
+                rows = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in rows:
+                if name in METRICS:
+                    _merge(total, name, labels, value)
+    with _lock:
+        for (name, labels), value in _values.items():
+            _merge(total, name, labels, list(value) if isinstance(value, list) else value)
+    return total
+
+
+# ---- Prometheus text format ----
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render():
+    total = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (n, labels), value in total.items() if n == name)
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for labels, value in series:
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {_number(cumulative)}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {_number(value[-1])}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,116 @@
+"""Request middleware: logging context and metrics."""
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+from .http import client_ip
+from .logs import request_context
+
+logger = logging.getLogger('core')
+
+
+class _RequestMiddleware:
+    """Sync and async middleware calling ``begin`` before and ``end``/``finish`` after the view.
+
+    ``begin`` returns per-request state; ``end`` sees the response, ``finish`` always runs.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        state = self.begin(request)
+        try:
+            response = self.get_response(request)
+            self.end(request, response, state)
+            return response
+        finally:
+            self.finish(state)
+
+    async def _acall(self, request):
+        state = self.begin(request)
+        try:
+            response = await self.get_response(request)
+            self.end(request, response, state)
+            return response
+        finally:
+            self.finish(state)
+
+    def begin(self, request):
+        return None
+
+    def end(self, request, response, state):
+        pass
+
+    def finish(self, state):
+        pass
+
+
+class RequestLogMiddleware(_RequestMiddleware):
+    """Sets the logging context of each request and logs one REQ record with its status and time.
+
+    Page views (``versioned_page``) are sampled at LOG_PAGE_SAMPLE_RATE: the view's PAGE
+    line and the REQ line are kept or dropped together. The time is measured to the
+    response object, so a streamed body is not included.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        context = request_context.get()
+        context['view'] = view_func.__name__
+        rate = settings.LOG_PAGE_SAMPLE_RATE
+        if getattr(view_func, 'versioned_page', False) and rate < 1:
+            context['sampled'] = random.random() < rate
+            context['sample_rate'] = rate
+
+    def begin(self, request):
+        context = {'view': None, 'ip': client_ip(request), 'sampled': True, 'sample_rate': 1}
+        return request_context.set(context), time.perf_counter()
+
+    def end(self, request, response, state):
+        elapsed_ms = (time.perf_counter() - state[1]) * 1000
+        logger.info("REQ   %s %s | status=%d %.1fms", request.method, request.path, response.status_code,
+                    elapsed_ms, extra={'method': request.method, 'path': request.path,
+                                       'status': response.status_code, 'elapsed_ms': round(elapsed_ms, 2)})
+
+    def finish(self, state):
+        request_context.reset(state[0])
+
+
+class MetricsMiddleware(_RequestMiddleware):
+    """Per-route latency, response size, status and ORM query count/time (core.metrics).
+
+    Routes are URL patterns ('/api/jobs/<int:job_id>/'), so label values stay bounded.
+    """
+
+    def begin(self, request):
+        totals = [0, 0.0]
+        return metrics.request_queries.set(totals), totals, time.perf_counter()
+
+    def end(self, request, response, state):
+        _, (queries, query_seconds), start = state
+        match = request.resolver_match
+        route = '/' + match.route if match else 'unmatched'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - start, route=route)
+        metrics.inc('http_requests_total', route=route, method=request.method, status=response.status_code)
+        metrics.observe('http_request_db_queries', queries, route=route)
+        if queries:
+            metrics.inc('db_queries_total', queries, route=route)
+            metrics.inc('db_query_seconds_total', query_seconds, route=route)
+        if not response.streaming:
+            metrics.observe('http_response_size_bytes', len(response.content), route=route)
+        elif response.has_header('Content-Length'):
+            metrics.observe('http_response_size_bytes', int(response['Content-Length']), route=route)
+
+    def finish(self, state):
+        metrics.request_queries.reset(state[0])
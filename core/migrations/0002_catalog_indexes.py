@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compound',
+            index=models.Index(fields=['-score', 'id'], name='compound_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compound',
+            index=models.Index(fields=['qc_status', '-score', 'id'], name='compound_qc_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compound',
+            index=models.Index(fields=['crop', '-score'], name='compound_crop_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crop',
+            index=models.Index(fields=['name_ko', 'origin', 'year', 'plant_part'], name='crop_facet_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crop',
+            index=models.Index(fields=['plant_part'], name='crop_part_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crop',
+            index=models.Index(fields=['origin'], name='crop_origin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crop',
+            index=models.Index(fields=['year'], name='crop_year_idx'),
+        ),
+    ]
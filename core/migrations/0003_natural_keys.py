@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:14
+
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+logger = logging.getLogger('core')
+
+CROP_FIELDS = ['name_en', 'name_scientific']
+COMPOUND_FIELDS = ['annotation_level', 'source', 'qc_status', 'compound_class', 'molecular_weight', 'retention_time']
+
+
+def merge(Model, db, keep, duplicates, fields):
+    """Fill the kept row's blank ``fields`` from its duplicates (oldest first), delete them and log it."""
+    rows = {row['id']: row for row in Model.objects.using(db).filter(pk__in=[keep, *duplicates]).values('id', *fields)}
+    filled = {}
+    for pk in duplicates:
+        for field in fields:
+            if rows[keep][field] in ('', None) and field not in filled and rows[pk][field] not in ('', None):
+                filled[field] = rows[pk][field]
+    if filled:
+        Model.objects.using(db).filter(pk=keep).update(**filled)
+    Model.objects.using(db).filter(pk__in=duplicates).delete()
+    logger.warning("0003_natural_keys: merged %s %s into %s (filled: %s)",
+                   Model.__name__, duplicates, keep, ', '.join(filled) or '-')
+
+
+def remove_duplicates(apps, schema_editor):
+    """Merge crops sharing a natural key and repeated (crop, name) compounds into the oldest row.
+
+    Blank fields of the kept row are filled from the merged ones; every merge is logged.
+    """
+    Crop = apps.get_model('core', 'Crop')
+    Compound = apps.get_model('core', 'Compound')
+    db = schema_editor.connection.alias
+    groups = {}
+    for pk, *key in (Crop.objects.using(db).order_by('id')
+                     .values_list('id', 'name_ko', 'origin', 'year', 'plant_part')):
+        groups.setdefault(tuple(key), []).append(pk)
+    for keep, *duplicates in groups.values():
+        if duplicates:
+            Compound.objects.using(db).filter(crop_id__in=duplicates).update(crop_id=keep)
+            merge(Crop, db, keep, duplicates, CROP_FIELDS)
+    repeated = (Compound.objects.using(db).order_by().values('crop_id', 'name')
+                .annotate(first=Min('id'), n=Count('id')).filter(n__gt=1))
+    for row in repeated:
+        duplicates = list(Compound.objects.using(db).filter(crop_id=row['crop_id'], name=row['name'])
+                          .exclude(pk=row['first']).order_by('id').values_list('id', flat=True))
+        merge(Compound, db, row['first'], duplicates, COMPOUND_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='crop',
+            name='crop_facet_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='compound',
+            constraint=models.UniqueConstraint(fields=('crop', 'name'), name='compound_natural_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='crop',
+            constraint=models.UniqueConstraint(fields=('name_ko', 'origin', 'year', 'plant_part'), name='crop_natural_key'),
+        ),
+    ]
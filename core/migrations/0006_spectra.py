@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_ai_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Spectrum',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precursor_mz', models.FloatField()),
+                ('precursor_type', models.CharField(blank=True, max_length=30)),
+                ('ion_mode', models.CharField(blank=True, max_length=10)),
+                ('collision_energy', models.CharField(blank=True, max_length=30)),
+                ('num_peaks', models.IntegerField()),
+                ('mz', models.BinaryField()),
+                ('intensity', models.BinaryField()),
+                ('compound', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spectra', to='core.compound')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['precursor_mz'], name='spectrum_precursor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('compound', 'precursor_type', 'ion_mode', 'collision_energy'), name='spectrum_natural_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:35
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """Summaries for the crops that already exist; saves keep them current from here on."""
+    Crop = apps.get_model('core', 'Crop')
+    Compound = apps.get_model('core', 'Compound')
+    CropSummary = apps.get_model('core', 'CropSummary')
+    EnvironmentData = apps.get_model('core', 'EnvironmentData')
+    db = schema_editor.connection.alias
+    rows = defaultdict(list)
+    for crop_id, *row in (Compound.objects.using(db).order_by('crop_id', '-score', 'id')
+                          .values_list('crop_id', 'name', 'score', 'compound_class', 'annotation_level',
+                                       'qc_status')):
+        rows[crop_id].append(row)
+    # The environment row whose region name contains the crop's origin, else the first one.
+    environments = list(EnvironmentData.objects.using(db).order_by('id').values_list('id', 'region'))
+    fallback = environments[0][0] if environments else None
+    summaries = []
+    for crop_id, origin in Crop.objects.using(db).values_list('id', 'origin'):
+        crop_rows = rows[crop_id]
+        scores = [score for _, score, _, _, _ in crop_rows]
+        levels = Counter(level for _, _, _, level, _ in crop_rows)
+        summaries.append(CropSummary(
+            crop_id=crop_id,
+            environment_id=next((pk for pk, region in environments if origin in region), fallback),
+            compound_count=len(crop_rows),
+            score_avg=sum(scores) / len(scores) if scores else None,
+            score_min=min(scores, default=None),
+            score_max=max(scores, default=None),
+            l1_count=levels['L1'], l2_count=levels['L2'], l3_count=levels['L3'],
+            class_counts=dict(Counter(cls for _, _, cls, _, _ in crop_rows if cls)),
+            qc_counts=dict(Counter(qc for _, _, _, _, qc in crop_rows)),
+            compounds=[{'name': name, 'score': score, 'compound_class': cls}
+                       for name, score, cls, _, _ in crop_rows],
+        ))
+    CropSummary.objects.using(db).bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_spectra'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CropSummary',
+            fields=[
+                ('crop', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='core.crop')),
+                ('compound_count', models.IntegerField(default=0)),
+                ('score_avg', models.FloatField(blank=True, null=True)),
+                ('score_min', models.IntegerField(blank=True, null=True)),
+                ('score_max', models.IntegerField(blank=True, null=True)),
+                ('l1_count', models.IntegerField(default=0)),
+                ('l2_count', models.IntegerField(default=0)),
+                ('l3_count', models.IntegerField(default=0)),
+                ('class_counts', models.JSONField(default=dict)),
+                ('qc_counts', models.JSONField(default=dict)),
+                ('compounds', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('environment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.environmentdata')),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,161 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+import datetime
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copies of core.regions as of this migration, so later edits there do not change what it does.
+REGIONS = [
+    ('41480', '경기도', '파주시'),
+    ('41650', '경기도', '포천시'),
+    ('43150', '충청북도', '제천시'),
+    ('43760', '충청북도', '괴산군'),
+    ('43770', '충청북도', '음성군'),
+    ('44710', '충청남도', '금산군'),
+    ('46900', '전라남도', '진도군'),
+    ('47170', '경상북도', '안동시'),
+    ('47210', '경상북도', '영주시'),
+    ('47920', '경상북도', '봉화군'),
+    ('51720', '강원특별자치도', '홍천군'),
+    ('51730', '강원특별자치도', '횡성군'),
+    ('51750', '강원특별자치도', '영월군'),
+    ('51760', '강원특별자치도', '평창군'),
+    ('51770', '강원특별자치도', '정선군'),
+    ('51810', '강원특별자치도', '인제군'),
+    ('52720', '전북특별자치도', '진안군'),
+]
+PROVINCES = {
+    '서울': '서울특별시', '서울시': '서울특별시',
+    '부산': '부산광역시', '부산시': '부산광역시',
+    '대구': '대구광역시', '대구시': '대구광역시',
+    '인천': '인천광역시', '인천시': '인천광역시',
+    '광주': '광주광역시', '광주시': '광주광역시',
+    '대전': '대전광역시', '대전시': '대전광역시',
+    '울산': '울산광역시', '울산시': '울산광역시',
+    '세종': '세종특별자치시', '세종시': '세종특별자치시',
+    '경기': '경기도',
+    '강원': '강원특별자치도', '강원도': '강원특별자치도',
+    '충북': '충청북도',
+    '충남': '충청남도',
+    '전북': '전북특별자치도', '전라북도': '전북특별자치도',
+    '전남': '전라남도',
+    '경북': '경상북도',
+    '경남': '경상남도',
+    '제주': '제주특별자치도', '제주도': '제주특별자치도',
+}
+ALIASES = {'풍기': '47210'}
+SUFFIX = re.compile(r'(?<=..)[시군구]$')
+
+
+def link_regions(apps, schema_editor):
+    """Create the bundled regions and link existing crops, environment rows and summaries to them.
+
+    Names matching no region or several stay unlinked for ``backfill_regions``, as does an
+    environment row whose region and period an earlier row already took.
+    """
+    Region = apps.get_model('core', 'Region')
+    Crop = apps.get_model('core', 'Crop')
+    EnvironmentData = apps.get_model('core', 'EnvironmentData')
+    CropSummary = apps.get_model('core', 'CropSummary')
+    db = schema_editor.connection.alias
+    if not (Crop.objects.using(db).exists() or EnvironmentData.objects.using(db).exists()):
+        return  # a new database: seed_data or backfill_regions creates the regions
+    Region.objects.using(db).bulk_create(
+        [Region(code=code, province=province, name=name, short_name=SUFFIX.sub('', name))
+         for code, province, name in REGIONS], ignore_conflicts=True)
+    by_code, by_name = {}, defaultdict(set)
+    for pk, code, province, name, short in Region.objects.using(db).values_list(
+            'id', 'code', 'province', 'name', 'short_name'):
+        by_code[code] = pk
+        for key in {name, short}:
+            by_name[key].add((province, pk))
+
+    def resolve(text):
+        parts = (text or '').split()
+        if not parts:
+            return None
+        province = None
+        if len(parts) > 1:
+            province = PROVINCES.get(parts[0], parts[0])
+            parts = parts[1:]
+        if parts[0] in ALIASES:
+            return by_code.get(ALIASES[parts[0]])
+        ids = {pk for p, pk in by_name.get(parts[0], ()) if province in (None, p)}
+        return ids.pop() if len(ids) == 1 else None
+
+    for origin in Crop.objects.using(db).order_by().values_list('origin', flat=True).distinct():
+        region_id = resolve(origin)
+        if region_id is not None:
+            Crop.objects.using(db).filter(origin=origin).update(region_id=region_id)
+    taken = set()
+    for pk, name, period in EnvironmentData.objects.using(db).order_by('id').values_list('id', 'region_name', 'period'):
+        region_id = resolve(name)
+        if region_id is not None and (region_id, period) not in taken:
+            taken.add((region_id, period))
+            EnvironmentData.objects.using(db).filter(pk=pk).update(region_id=region_id)
+
+    # Summaries link the latest environment period of the crop's region.
+    latest = {}
+    for pk, region_id in (EnvironmentData.objects.using(db).filter(region__isnull=False)
+                          .order_by('region_id', '-period').values_list('id', 'region_id')):
+        latest.setdefault(region_id, pk)
+    crops = defaultdict(list)
+    for pk, region_id in Crop.objects.using(db).values_list('id', 'region_id'):
+        crops[latest.get(region_id)].append(pk)
+    for environment_id, crop_ids in crops.items():
+        CropSummary.objects.using(db).filter(crop_id__in=crop_ids).update(environment_id=environment_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_crop_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Region',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('province', models.CharField(max_length=20)),
+                ('name', models.CharField(max_length=50)),
+                ('short_name', models.CharField(db_index=True, max_length=50)),
+            ],
+        ),
+        migrations.RenameField(
+            model_name='environmentdata',
+            old_name='region',
+            new_name='region_name',
+        ),
+        migrations.AlterField(
+            model_name='environmentdata',
+            name='region_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='environmentdata',
+            name='region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='environment', to='core.region'),
+        ),
+        # Existing rows are the single annual (2025) figures per region.
+        migrations.AddField(
+            model_name='environmentdata',
+            name='period',
+            field=models.DateField(default=datetime.date(2025, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='crop',
+            name='region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='crops', to='core.region'),
+        ),
+        migrations.RunPython(link_regions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='environmentdata',
+            constraint=models.UniqueConstraint(fields=('region', 'period'), name='environment_region_period'),
+        ),
+    ]
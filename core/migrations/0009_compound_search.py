@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:41
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# The schema as of this migration, inlined so later changes to core.search do not rewrite history.
+# core.search.install() re-creates it (idempotently) after every migrate.
+SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_compound_fts "
+    "USING fts5(name, synonyms, compound_class, crop, tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS core_compound_fts_insert AFTER INSERT ON core_compound BEGIN
+        INSERT INTO core_compound_fts(rowid, name, synonyms, compound_class, crop)
+        SELECT new.id, new.name, new.synonyms, new.compound_class,
+               core_crop.name_ko || ' ' || core_crop.name_en || ' ' || core_crop.name_scientific
+        FROM core_crop WHERE id = new.crop_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS core_compound_fts_delete AFTER DELETE ON core_compound BEGIN
+        DELETE FROM core_compound_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS core_compound_fts_update
+    AFTER UPDATE OF name, synonyms, compound_class, crop_id ON core_compound BEGIN
+        DELETE FROM core_compound_fts WHERE rowid = old.id;
+        INSERT INTO core_compound_fts(rowid, name, synonyms, compound_class, crop)
+        SELECT new.id, new.name, new.synonyms, new.compound_class,
+               core_crop.name_ko || ' ' || core_crop.name_en || ' ' || core_crop.name_scientific
+        FROM core_crop WHERE id = new.crop_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS core_crop_fts_update
+    AFTER UPDATE OF name_ko, name_en, name_scientific ON core_crop BEGIN
+        UPDATE core_compound_fts SET crop = new.name_ko || ' ' || new.name_en || ' ' || new.name_scientific
+        WHERE rowid IN (SELECT id FROM core_compound WHERE crop_id = new.id);
+    END""",
+]
+POPULATE = """INSERT INTO core_compound_fts(rowid, name, synonyms, compound_class, crop)
+    SELECT c.id, c.name, c.synonyms, c.compound_class, cr.name_ko || ' ' || cr.name_en || ' ' || cr.name_scientific
+    FROM core_compound c JOIN core_crop cr ON cr.id = c.crop_id"""
+DROP = [
+    'DROP TRIGGER IF EXISTS core_crop_fts_update',
+    'DROP TRIGGER IF EXISTS core_compound_fts_update',
+    'DROP TRIGGER IF EXISTS core_compound_fts_delete',
+    'DROP TRIGGER IF EXISTS core_compound_fts_insert',
+    'DROP TABLE IF EXISTS core_compound_fts',
+]
+
+
+def install(apps, schema_editor):
+    """Trigram FTS5 index over compound and crop names, populated from existing rows."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SCHEMA + [POPULATE]:
+        schema_editor.execute(sql)
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_regions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compound',
+            name='synonyms',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='compound',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='compound_name_lower_idx'),
+        ),
+        migrations.RunPython(install, uninstall),
+    ]
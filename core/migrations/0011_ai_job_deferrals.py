@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_chat_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aijobitem',
+            name='deferrals',
+            field=models.IntegerField(default=0),
+        ),
+    ]
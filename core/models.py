@@ -1,4 +1,19 @@
+import uuid
+
 from django.db import models
+from django.db.models.functions import Lower
+
+
+class Region(models.Model):
+    """행정구역 (시·군·구, 행정표준코드 기준)"""
+    code = models.CharField(max_length=10, unique=True)
+    province = models.CharField(max_length=20)
+    name = models.CharField(max_length=50)
+    # name without the 시/군/구 suffix, as crop origins are usually written ("금산")
+    short_name = models.CharField(max_length=50, db_index=True)
+
+    def __str__(self):
+        return f"{self.province} {self.name}"
 
 
 class Crop(models.Model):
@@ -8,6 +23,7 @@ class Crop(models.Model):
     name_scientific = models.CharField(max_length=200, blank=True)
     plant_part = models.CharField(max_length=50)
     origin = models.CharField(max_length=100)
+    region = models.ForeignKey(Region, on_delete=models.SET_NULL, null=True, blank=True, related_name='crops')
     year = models.IntegerField(default=2025)
 
     def __str__(self):
@@ -15,6 +31,14 @@ class Crop(models.Model):
 
     class Meta:
         ordering = ['name_ko']
+        constraints = [
+            models.UniqueConstraint(fields=['name_ko', 'origin', 'year', 'plant_part'], name='crop_natural_key'),
+        ]
+        indexes = [
+            models.Index(fields=['plant_part'], name='crop_part_idx'),
+            models.Index(fields=['origin'], name='crop_origin_idx'),
+            models.Index(fields=['year'], name='crop_year_idx'),
+        ]
 
 
 class Compound(models.Model):
@@ -27,6 +51,8 @@ class Compound(models.Model):
     similarity = models.FloatField(default=0.0)
     qc_status = models.CharField(max_length=20)
     compound_class = models.CharField(max_length=100, blank=True)
+    # Other names ("; "-separated), indexed for search alongside name
+    synonyms = models.TextField(blank=True)
     molecular_weight = models.FloatField(null=True, blank=True)
     retention_time = models.FloatField(null=True, blank=True)
 
@@ -35,14 +61,168 @@ class Compound(models.Model):
 
     class Meta:
         ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['crop', 'name'], name='compound_natural_key'),
+        ]
+        indexes = [
+            models.Index(fields=['-score', 'id'], name='compound_score_idx'),
+            models.Index(fields=['qc_status', '-score', 'id'], name='compound_qc_score_idx'),
+            models.Index(fields=['crop', '-score'], name='compound_crop_score_idx'),
+            # Name-prefix search (core.search)
+            models.Index(Lower('name'), name='compound_name_lower_idx'),
+        ]
+
+
+class Spectrum(models.Model):
+    """MS/MS 스펙트럼 (피크는 float32 배열로 압축 저장)"""
+    compound = models.ForeignKey(Compound, on_delete=models.CASCADE, related_name='spectra')
+    precursor_mz = models.FloatField()
+    precursor_type = models.CharField(max_length=30, blank=True)
+    ion_mode = models.CharField(max_length=10, blank=True)
+    collision_energy = models.CharField(max_length=30, blank=True)
+    num_peaks = models.IntegerField()
+    # Little-endian float32 arrays of equal length (see core.spectra.pack)
+    mz = models.BinaryField()
+    intensity = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.compound_id} {self.precursor_type} {self.precursor_mz:.4f}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['compound', 'precursor_type', 'ion_mode', 'collision_energy'],
+                                    name='spectrum_natural_key'),
+        ]
+        indexes = [
+            models.Index(fields=['precursor_mz'], name='spectrum_precursor_idx'),
+        ]
 
 
 class EnvironmentData(models.Model):
-    """지역·환경 지표 (공공API 연계 예시용)"""
-    region = models.CharField(max_length=100)
+    """지역별 환경 지표 시계열 (공공API 연계 예시용)"""
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='environment')
+    # Region as written by the data source; kept for backfill_regions and auditing.
+    region_name = models.CharField(max_length=100, blank=True)
+    # First day of the period the figures cover (month or year).
+    period = models.DateField()
     avg_temperature = models.FloatField()
     avg_rainfall = models.FloatField()
     soil_grade = models.CharField(max_length=10)
 
     def __str__(self):
-        return self.region
+        return f"{self.region or self.region_name} {self.period:%Y-%m}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['region', 'period'], name='environment_region_period'),
+        ]
+
+
+class CropSummary(models.Model):
+    """작목(시료)별 대시보드 집계 (성분 변경 시 해당 작목만 갱신)"""
+    crop = models.OneToOneField(Crop, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    environment = models.ForeignKey(EnvironmentData, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='+')
+    compound_count = models.IntegerField(default=0)
+    score_avg = models.FloatField(null=True, blank=True)
+    score_min = models.IntegerField(null=True, blank=True)
+    score_max = models.IntegerField(null=True, blank=True)
+    l1_count = models.IntegerField(default=0)
+    l2_count = models.IntegerField(default=0)
+    l3_count = models.IntegerField(default=0)
+    class_counts = models.JSONField(default=dict)
+    qc_counts = models.JSONField(default=dict)
+    # Dashboard compound list: [{name, score, compound_class}] by score desc
+    compounds = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.crop} 요약"
+
+
+class AICacheEntry(models.Model):
+    """AI 해석 결과 캐시 (프롬프트·모델·입력 해시 기준)"""
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=20)
+    response = models.JSONField()
+    created_at = models.DateTimeField()
+    accessed_at = models.DateTimeField(db_index=True)
+    hits = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.kind}:{self.key[:12]}"
+
+
+class AIJob(models.Model):
+    """AI 일괄 해석 작업 (run_ai_worker가 처리)"""
+    QUEUED, RUNNING, DONE = 'queued', 'running', 'done'
+    STATUS_CHOICES = [(QUEUED, '대기'), (RUNNING, '처리 중'), (DONE, '완료')]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    filters = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"AIJob #{self.pk} ({self.status})"
+
+
+class AIJobItem(models.Model):
+    """작업 내 성분별 해석 결과"""
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, '대기'), (RUNNING, '처리 중'), (DONE, '완료'), (FAILED, '실패')]
+
+    job = models.ForeignKey(AIJob, on_delete=models.CASCADE, related_name='items')
+    compound = models.ForeignKey(Compound, on_delete=models.CASCADE, related_name='ai_job_items')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    # Requeues without an attempt (provider rate limit or circuit open), capped separately
+    deferrals = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.job_id}:{self.compound_id} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'compound'], name='aijobitem_job_compound'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='aijobitem_queue_idx'),
+        ]
+
+
+class ChatSession(models.Model):
+    """챗봇 대화 세션 (오래된 대화는 누적 요약으로 압축)"""
+    key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    # Rolling summary of the turns with id <= summarized_until; later turns are sent verbatim
+    summary = models.TextField(blank=True)
+    summarized_until = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"ChatSession {self.key}"
+
+
+class ChatTurn(models.Model):
+    """세션 내 대화 한 턴 (사용자 질문 또는 AI 답변)"""
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='turns')
+    role = models.CharField(max_length=10)
+    content = models.TextField()
+    # Estimated prompt tokens (core.chat.estimate_tokens), so the window is sized without re-counting
+    tokens = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.session_id}:{self.role}"
+
+    class Meta:
+        ordering = ['id']
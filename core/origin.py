@@ -0,0 +1,247 @@
+"""Origin discrimination from per-sample compound profiles.
+
+Each Crop row is one sample (crop, origin, year, part) and its compounds'
+scores are that sample's profile. For every crop with at least two origins,
+``train`` pivots the profiles into a dense (samples, compounds) matrix,
+autoscales it, fits PCA by SVD and keeps the projected training samples for
+a distance-weighted kNN vote.
+
+Models are written as .npy files under ORIGIN_MODEL_DIR and opened with
+``mmap_mode='r'``, so every worker process shares the same pages. A small
+JSON pointer per crop names the current version and is replaced atomically
+after the arrays are written, so retraining never exposes a half-written
+model.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import Compound
+
+ARRAYS = ('mean', 'scale', 'components', 'train_scores', 'train_labels')
+# Keeps 1/d finite when a query coincides with a training sample.
+EPS = 1e-9
+# Profile values beyond this (or NaN) do not fit the float32 feature matrix.
+MAX_VALUE = float(np.finfo(np.float32).max)
+
+
+def _model_dir():
+    return Path(settings.ORIGIN_MODEL_DIR)
+
+
+def _key(crop_name):
+    return hashlib.sha1(crop_name.encode()).hexdigest()[:12]
+
+
+def feature_matrix(crop_name):
+    """Pivot compound scores per sample: (sample crop ids, origin labels, feature names, X)."""
+    rows = (Compound.objects.filter(crop__name_ko=crop_name).order_by()
+            .values_list('crop_id', 'crop__origin', 'name', 'score'))
+    origins, cells = {}, []
+    for crop_id, origin, name, score in rows:
+        origins[crop_id] = origin
+        cells.append((crop_id, name, score))
+    sample_ids = sorted(origins)
+    features = sorted({name for _, name, _ in cells})
+    row_of = {pk: i for i, pk in enumerate(sample_ids)}
+    col_of = {name: j for j, name in enumerate(features)}
+    X = np.zeros((len(sample_ids), len(features)), dtype=np.float32)
+    for crop_id, name, score in cells:
+        X[row_of[crop_id], col_of[name]] = score
+    return sample_ids, [origins[pk] for pk in sample_ids], features, X
+
+
+def fit(X, labels, n_components=5):
+    """Autoscale + PCA. Returns (arrays dict, classes)."""
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = (X - mean) / scale
+    _, S, Vt = np.linalg.svd(Z, full_matrices=False)
+    # Drop directions with no variance (there are at most n_samples - 1).
+    rank = int((S > 1e-6 * S[0]).sum()) if S.size and S[0] > 0 else 0
+    components = Vt[:max(1, min(n_components, rank))]
+    classes, y = np.unique(labels, return_inverse=True)
+    arrays = {
+        'mean': mean.astype(np.float32),
+        'scale': scale.astype(np.float32),
+        'components': components.astype(np.float32),
+        'train_scores': (Z @ components.T).astype(np.float32),
+        'train_labels': y.astype(np.int32),
+    }
+    return arrays, [str(c) for c in classes]
+
+
+def save(crop_name, arrays, meta):
+    base = _model_dir()
+    key = _key(crop_name)
+    version = f'{key}-{time.time_ns()}'
+    target = base / version
+    target.mkdir(parents=True)
+    for name in ARRAYS:
+        np.save(target / f'{name}.npy', arrays[name])
+    pointer = base / f'{key}.json'
+    tmp = pointer.with_suffix(f'.json.{os.getpid()}')
+    tmp.write_text(json.dumps({**meta, 'crop': crop_name, 'version': version}, ensure_ascii=False))
+    os.replace(tmp, pointer)
+    # Mapped files of old versions stay readable in processes that still hold them. The previous
+    # version is kept for readers that read the old pointer but have not opened its arrays yet.
+    older = sorted((path for path in base.glob(f'{key}-*') if path.name != version),
+                   key=lambda path: int(path.name.rpartition('-')[2]))
+    for old in older[:-1]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def train(crop_name, n_components=5, n_neighbors=3):
+    """Fit and save the origin model for one crop. Returns its meta, or None with < 2 origins."""
+    sample_ids, labels, features, X = feature_matrix(crop_name)
+    if len(set(labels)) < 2:
+        return None
+    arrays, classes = fit(X, labels, n_components)
+    meta = {
+        'features': features,
+        'classes': classes,
+        'n_samples': len(sample_ids),
+        'n_components': int(arrays['components'].shape[0]),
+        'n_neighbors': n_neighbors,
+        'loo_accuracy': _loo_accuracy(X, arrays['train_labels'], n_components, n_neighbors),
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    save(crop_name, arrays, meta)
+    return meta
+
+
+def _vote(distances, neighbor_labels, n_classes):
+    """Distance-weighted class votes, normalized per row to probabilities."""
+    weights = 1.0 / (distances + EPS)
+    votes = np.zeros((len(distances), n_classes), dtype=np.float64)
+    np.add.at(votes, (np.arange(len(distances))[:, None], neighbor_labels), weights)
+    return votes / votes.sum(axis=1, keepdims=True)
+
+
+def _distances(a, b):
+    d2 = np.square(a).sum(1)[:, None] - 2 * a @ b.T + np.square(b).sum(1)[None, :]
+    return np.sqrt(np.maximum(d2, 0))
+
+
+def _nearest(d, k):
+    """Distances and column indices of the k smallest entries per row."""
+    k = min(k, d.shape[1])
+    nearest = np.argpartition(d, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(d, nearest, axis=1), nearest
+
+
+def _predict(arrays, X, k, n_classes):
+    """Class probabilities for each row of X under fitted ``arrays``."""
+    T = ((X - arrays['mean']) / arrays['scale']) @ arrays['components'].T
+    d, nearest = _nearest(_distances(T, arrays['train_scores']), k)
+    return _vote(d, arrays['train_labels'][nearest], n_classes)
+
+
+def _loo_accuracy(X, labels, n_components, k):
+    """Leave-one-out accuracy: each sample is predicted by scaling, PCA and kNN refitted without it.
+
+    None with one sample per class. One SVD per sample, which is cheap at the number of
+    samples (crop rows) a crop has.
+    """
+    counts = np.bincount(labels)
+    if counts.min() < 2:
+        return None
+    correct = 0
+    for i in range(len(X)):
+        rest = np.arange(len(X)) != i
+        # Every class keeps a sample, so the fold's label codes match the full model's.
+        arrays, _ = fit(X[rest], labels[rest], n_components)
+        probs = _predict(arrays, X[i:i + 1], min(k, len(X) - 1), len(counts))
+        correct += int(probs[0].argmax() == labels[i])
+    return correct / len(X)
+
+
+class OriginModel:
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.features = {name: j for j, name in enumerate(meta['features'])}
+        self.classes = meta['classes']
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def load(cls, meta):
+        path = _model_dir() / meta['version']
+        return cls(meta, {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in ARRAYS})
+
+    def vectorize(self, profiles):
+        """Profiles ({compound name: value}) -> (matrix, matched feature count per profile)."""
+        X = np.zeros((len(profiles), len(self.features)), dtype=np.float32)
+        matched = []
+        for i, profile in enumerate(profiles):
+            n = 0
+            for name, value in profile.items():
+                j = self.features.get(name)
+                if j is not None:
+                    value = float(value)
+                    if not abs(value) <= MAX_VALUE:
+                        raise ValueError('profile values must be finite')
+                    X[i, j] = value
+                    n += 1
+            matched.append(n)
+        return X, matched
+
+    def vectorize_columns(self, features, values):
+        """Columnar input: ``values`` rows aligned to ``features``; columns are mapped once."""
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(features))
+        if not (np.abs(values) <= MAX_VALUE).all():
+            raise ValueError('profile values must be finite')
+        values = values.astype(np.float32)
+        pairs = [(i, self.features[name]) for i, name in enumerate(features) if name in self.features]
+        X = np.zeros((len(values), len(self.features)), dtype=np.float32)
+        if pairs:
+            src, dst = map(list, zip(*pairs))
+            X[:, dst] = values[:, src]
+        return X, [len(pairs)] * len(values)
+
+    def predict(self, X):
+        """Class probabilities for each row of X (samples x features)."""
+        arrays = {name: getattr(self, name) for name in ARRAYS}
+        return _predict(arrays, X, self.meta['n_neighbors'], len(self.classes))
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(crop_name):
+    """Current model for a crop, reloaded when its pointer file changes; None if untrained."""
+    pointer = _model_dir() / f'{_key(crop_name)}.json'
+    try:
+        mtime = pointer.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _models.get(crop_name)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _models_lock:
+        try:
+            model = OriginModel.load(json.loads(pointer.read_text()))
+        except OSError:
+            # Retrained twice since the pointer was read, so its version is gone: read it once more.
+            mtime = pointer.stat().st_mtime_ns
+            model = OriginModel.load(json.loads(pointer.read_text()))
+        _models[crop_name] = (mtime, model)
+    return model
+
+
+def preload():
+    """Map every trained model into this process (called once at startup)."""
+    for pointer in _model_dir().glob('*.json'):
+        try:
+            get_model(json.loads(pointer.read_text())['crop'])
+        except (OSError, ValueError, KeyError):
+            continue
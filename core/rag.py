@@ -0,0 +1,212 @@
+"""Retrieval of catalog records to ground chat answers.
+
+Every Compound and Crop is a document, and so is the latest EnvironmentData
+period of each region. Each document is a bag of terms: its words, plus the
+character n-grams of each word (bigrams for Hangul, trigrams otherwise). The
+n-grams let "인삼의" match "인삼" and "ginsenosid" match "Ginsenoside"
+without a morphological analyser. Term weights are sublinear TF-IDF,
+L2-normalized per document.
+
+The weights are held as NumPy arrays grouped by term (a CSC matrix without
+scipy), rebuilt when the data version changes. A query reads only the
+postings of its own terms and scores all documents with one ``bincount``.
+The best matches are then loaded from the database, so the prompt always
+shows current figures, and rendered one line each until RAG_TOKEN_BUDGET
+estimated tokens are used.
+"""
+import logging
+import re
+from collections import defaultdict
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+
+from .chat import estimate_tokens
+from .models import Compound, Crop, EnvironmentData
+from .versioning import VersionedValue
+
+logger = logging.getLogger(__name__)
+
+COMPOUND, CROP, ENVIRONMENT = 0, 1, 2
+CONTEXT_HEADER = '플랫폼 데이터 (질문과 관련된 DB 기록):\n'
+# Cosine similarity below which a document is not considered relevant.
+MIN_SCORE = 0.05
+# Words a question about growing conditions uses, shared by every environment document.
+ENVIRONMENT_TERMS = '환경 기후 날씨 기온 온도 강수량 강우 토양'
+
+WORD = re.compile(r'\w+')
+
+
+def terms(text):
+    """Words of ``text`` (lowercased) and their character n-grams."""
+    out = []
+    for word in WORD.findall(text.lower()):
+        out.append(word)
+        if word.isdigit():
+            continue
+        n = 3 if word.isascii() else 2
+        if len(word) > n:
+            out.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return out
+
+
+class RetrievalIndex:
+    def __init__(self, kinds, pks, indptr, docs, weights, vocabulary, idf):
+        self.kinds = kinds
+        self.pks = pks
+        # Postings of term t: docs[indptr[t]:indptr[t + 1]] with their weights.
+        self.indptr = indptr
+        self.docs = docs
+        self.weights = weights
+        self.vocabulary = vocabulary
+        self.idf = idf
+
+    def __len__(self):
+        return len(self.pks)
+
+    @staticmethod
+    def documents():
+        """(kind, pk, texts) for every document."""
+        crops = {}
+        for pk, *fields in Crop.objects.values_list('id', 'name_ko', 'name_en', 'name_scientific',
+                                                    'plant_part', 'origin', 'year'):
+            crops[pk] = ' '.join(map(str, fields))
+            yield CROP, pk, (crops[pk],)
+        for pk, crop_id, name, synonyms, compound_class in Compound.objects.values_list(
+                'id', 'crop_id', 'name', 'synonyms', 'compound_class').iterator(chunk_size=10_000):
+            yield COMPOUND, pk, (f'{name} {synonyms}', compound_class, crops.get(crop_id, ''))
+        regions = set()
+        for pk, region_id, *names in (EnvironmentData.objects.order_by('region_id', '-period')
+                                      .values_list('id', 'region_id', 'region_name', 'region__province',
+                                                   'region__name', 'region__short_name')):
+            if (region_id or names[0]) not in regions:
+                regions.add(region_id or names[0])
+                yield ENVIRONMENT, pk, (' '.join(filter(None, names)), ENVIRONMENT_TERMS)
+
+    @classmethod
+    def from_db(cls):
+        vocabulary = {}
+        kinds, pks, term_ids, lengths = [], [], [], []
+        # Compounds share their crop's text and often a class, so each distinct text is tokenized once.
+        tokenized = {}
+        for kind, pk, texts in cls.documents():
+            length = 0
+            for text in texts:
+                ids = tokenized.get(text)
+                if ids is None:
+                    ids = tokenized[text] = [vocabulary.setdefault(term, len(vocabulary)) for term in terms(text)]
+                term_ids.extend(ids)
+                length += len(ids)
+            kinds.append(kind)
+            pks.append(pk)
+            lengths.append(length)
+        n_docs, n_terms = len(pks), max(len(vocabulary), 1)
+
+        # (doc, term) pairs with their counts, ordered by doc.
+        pairs = np.repeat(np.arange(n_docs, dtype=np.int64), lengths) * n_terms + np.array(term_ids, dtype=np.int64)
+        pairs, counts = np.unique(pairs, return_counts=True)
+        doc, term = np.divmod(pairs, n_terms)
+        df = np.bincount(term, minlength=len(vocabulary))
+        idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+        weights = ((1 + np.log(counts)) * idf[term]).astype(np.float32)
+        norms = np.sqrt(np.bincount(doc, weights=weights ** 2, minlength=n_docs)).astype(np.float32)
+        weights /= norms[doc]
+
+        order = np.argsort(term, kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(df)])
+        return cls(np.array(kinds, dtype=np.int8), np.array(pks, dtype=np.int64), indptr,
+                   doc[order].astype(np.int32), weights[order], vocabulary, idf)
+
+    def search(self, query, k):
+        """The ``k`` best (kind, pk, score) for ``query`` by cosine similarity, best first."""
+        counts = defaultdict(int)
+        for term in terms(query):
+            if term in self.vocabulary:
+                counts[self.vocabulary[term]] += 1
+        if not counts or not len(self):
+            return []
+        ids = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        query_weights = (1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))) * self.idf[ids]
+        query_weights /= np.linalg.norm(query_weights)
+        starts, stops = self.indptr[ids], self.indptr[ids + 1]
+        postings = np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+        scale = np.repeat(query_weights, stops - starts)
+        scores = np.bincount(self.docs[postings], weights=self.weights[postings] * scale, minlength=len(self))
+        k = min(k, len(self))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(self.kinds[i]), int(self.pks[i]), float(scores[i])) for i in best if scores[i] >= MIN_SCORE]
+
+
+index = VersionedValue(RetrievalIndex.from_db)
+
+
+def _compound_line(c):
+    crop = c.crop
+    details = [f'class {c.compound_class}' if c.compound_class else '', f'score {c.score}', c.annotation_level,
+               f'QC {c.qc_status}', f'MW {c.molecular_weight:.2f}' if c.molecular_weight is not None else '',
+               f'RT {c.retention_time:.2f}분' if c.retention_time is not None else '']
+    return (f'- 성분 {c.name}: {crop.name_ko}({crop.name_en}) {crop.plant_part}, {crop.origin} {crop.year} · '
+            + ', '.join(filter(None, details)))
+
+
+def _crop_line(crop):
+    line = f'- 작목 {crop.name_ko}({crop.name_en}'
+    line += f', {crop.name_scientific})' if crop.name_scientific else ')'
+    line += f' {crop.plant_part}, {crop.origin} {crop.year}'
+    summary = getattr(crop, 'summary', None)
+    if summary and summary.compound_count:
+        top = ', '.join(c['name'] for c in summary.compounds[:5])
+        line += f' · 성분 {summary.compound_count}종, 평균 score {summary.score_avg:.1f}, 주요 성분: {top}'
+    return line
+
+
+def _environment_line(env):
+    return (f'- 환경 {env.region or env.region_name} {env.period:%Y-%m}: 평균기온 {env.avg_temperature}℃, '
+            f'강수량 {env.avg_rainfall}mm, 토양 등급 {env.soil_grade}')
+
+
+LOADERS = {
+    COMPOUND: (lambda pks: Compound.objects.select_related('crop').in_bulk(pks), _compound_line),
+    CROP: (lambda pks: Crop.objects.select_related('summary').in_bulk(pks), _crop_line),
+    ENVIRONMENT: (lambda pks: EnvironmentData.objects.select_related('region').in_bulk(pks), _environment_line),
+}
+
+
+def retrieve(query, k=None):
+    """Prompt lines for the records most relevant to ``query``, best first; one query per record kind."""
+    hits = index.get().search(query, settings.RAG_TOP_K if k is None else k)
+    by_kind = defaultdict(list)
+    for kind, pk, _ in hits:
+        by_kind[kind].append(pk)
+    records = {kind: LOADERS[kind][0](pks) for kind, pks in by_kind.items()}
+    # Records deleted since the index was built are skipped.
+    return [LOADERS[kind][1](records[kind][pk]) for kind, pk, _ in hits if pk in records[kind]]
+
+
+def context(query):
+    """A system message body with the records relevant to ``query``, or '' when none are.
+
+    At most RAG_TOKEN_BUDGET estimated tokens, and never more than a quarter of CHAT_TOKEN_BUDGET.
+    """
+    if not settings.RAG_TOP_K:
+        return ''
+    budget = min(settings.RAG_TOKEN_BUDGET, settings.CHAT_TOKEN_BUDGET // 4) - estimate_tokens(CONTEXT_HEADER)
+    lines = []
+    for line in retrieve(query):
+        tokens = estimate_tokens(line)
+        if tokens <= budget:
+            lines.append(line)
+            budget -= tokens
+    return CONTEXT_HEADER + '\n'.join(lines) if lines else ''
+
+
+async def acontext(query):
+    """``context`` off the event loop; a database error leaves the answer ungrounded rather than failing it."""
+    try:
+        return await sync_to_async(context)(query)
+    except DatabaseError as e:
+        logger.warning("Chat retrieval failed | %s", e)
+        return ''
@@ -0,0 +1,125 @@
+"""Administrative regions (시·군·구) and resolution of free-text place names.
+
+Crop origins are written as short municipality names ("금산") or local
+place names ("풍기"), and environment sources as "province municipality"
+with abbreviated or pre-reform province names ("충남 금산군", "강원도 평창군").
+``RegionResolver`` maps both onto Region rows keyed by the 5-digit
+administrative standard code. A name that matches more than one region is
+left unresolved rather than guessed.
+"""
+import csv
+import re
+
+from .models import Region
+
+# Abbreviated and former province names -> current official name.
+PROVINCES = {
+    '서울': '서울특별시', '서울시': '서울특별시',
+    '부산': '부산광역시', '부산시': '부산광역시',
+    '대구': '대구광역시', '대구시': '대구광역시',
+    '인천': '인천광역시', '인천시': '인천광역시',
+    '광주': '광주광역시', '광주시': '광주광역시',
+    '대전': '대전광역시', '대전시': '대전광역시',
+    '울산': '울산광역시', '울산시': '울산광역시',
+    '세종': '세종특별자치시', '세종시': '세종특별자치시',
+    '경기': '경기도',
+    '강원': '강원특별자치도', '강원도': '강원특별자치도',
+    '충북': '충청북도',
+    '충남': '충청남도',
+    '전북': '전북특별자치도', '전라북도': '전북특별자치도',
+    '전남': '전라남도',
+    '경북': '경상북도',
+    '경남': '경상남도',
+    '제주': '제주특별자치도', '제주도': '제주특별자치도',
+}
+
+# Bundled subset (code, province, municipality) covering the producing areas
+# in the catalog; load the full national table with ``backfill_regions --regions-csv``.
+REGIONS = [
+    ('41480', '경기도', '파주시'),
+    ('41650', '경기도', '포천시'),
+    ('43150', '충청북도', '제천시'),
+    ('43760', '충청북도', '괴산군'),
+    ('43770', '충청북도', '음성군'),
+    ('44710', '충청남도', '금산군'),
+    ('46900', '전라남도', '진도군'),
+    ('47170', '경상북도', '안동시'),
+    ('47210', '경상북도', '영주시'),
+    ('47920', '경상북도', '봉화군'),
+    ('51720', '강원특별자치도', '홍천군'),
+    ('51730', '강원특별자치도', '횡성군'),
+    ('51750', '강원특별자치도', '영월군'),
+    ('51760', '강원특별자치도', '평창군'),
+    ('51770', '강원특별자치도', '정선군'),
+    ('51810', '강원특별자치도', '인제군'),
+    ('52720', '전북특별자치도', '진안군'),
+]
+
+# Place names below the municipality level that are used as origins.
+ALIASES = {
+    '풍기': '47210',  # 영주시 풍기읍
+}
+
+_SUFFIX = re.compile(r'(?<=..)[시군구]$')
+
+
+def short_name(name):
+    """'금산군' -> '금산'; two-letter names such as '중구' are kept whole."""
+    return _SUFFIX.sub('', name)
+
+
+def ensure_regions(rows=REGIONS):
+    """Create missing regions from (code, province, name) rows; returns the number created."""
+    existing = set(Region.objects.values_list('code', flat=True))
+    new = [Region(code=code, province=PROVINCES.get(province, province), name=name, short_name=short_name(name))
+           for code, province, name in rows if code not in existing]
+    Region.objects.bulk_create(new, ignore_conflicts=True)
+    return len(new)
+
+
+def read_regions_csv(path):
+    """(code, province, name) rows from a CSV with those column headers."""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            yield row['code'].strip(), row['province'].strip(), row['name'].strip()
+
+
+class RegionResolver:
+    """Free-text place name -> Region id (None when unknown or ambiguous); results are memoized."""
+
+    def __init__(self):
+        self.by_code = {}
+        self.by_name = {}
+        for pk, code, province, name, short in Region.objects.values_list(
+                'id', 'code', 'province', 'name', 'short_name'):
+            self.by_code[code] = pk
+            for key in {name, short}:
+                self.by_name.setdefault(key, {}).setdefault(province, set()).add(pk)
+        self.cache = {}
+
+    def _lookup(self, name, province=None):
+        candidates = self.by_name.get(name, {})
+        if province:
+            ids = candidates.get(province, set())
+        else:
+            ids = set().union(*candidates.values())
+        return next(iter(ids)) if len(ids) == 1 else None
+
+    def _resolve(self, text):
+        parts = text.split()
+        if not parts:
+            return None
+        province = None
+        if len(parts) > 1:
+            province = PROVINCES.get(parts[0], parts[0])
+            parts = parts[1:]
+        if parts[0] in ALIASES:
+            return self.by_code.get(ALIASES[parts[0]])
+        # "영주시 풍기읍" and the like: the municipality comes first.
+        return self._lookup(parts[0], province)
+
+    def resolve(self, text):
+        text = ' '.join((text or '').split())
+        if text not in self.cache:
+            self.cache[text] = self._resolve(text)
+        return self.cache[text]
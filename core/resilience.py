@@ -0,0 +1,195 @@
+"""Deadlines, retries and a circuit breaker for upstream LLM calls.
+
+``call`` / ``acall`` run one logical provider call as a series of attempts.
+Each attempt gets AI_ATTEMPT_TIMEOUT seconds, or less if that is all that
+remains before AI_DEADLINE. Timeouts, connection errors, 429 and 5xx
+responses are retried up to AI_RETRIES times, after a full-jitter
+exponential backoff (or the provider's Retry-After, if longer). A retry
+that would start after the deadline is not attempted. Other errors (bad
+request, auth) fail at once.
+
+One circuit breaker per process counts consecutive failed calls. At
+AI_BREAKER_THRESHOLD it opens, and calls raise CircuitOpenError without
+touching the network for AI_BREAKER_COOLDOWN seconds. Then a single trial
+call goes through: success closes the breaker, failure opens it again.
+"""
+import asyncio
+import itertools
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """The upstream is failing; the call was not attempted."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f'AI 서비스가 일시적으로 응답하지 않습니다. {retry_after:.0f}초 후 다시 시도하세요.')
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def retry_after(self):
+        return max(0.0, self.opened_at + settings.AI_BREAKER_COOLDOWN - self.clock())
+
+    def allow(self):
+        """Whether a call may go out; after the cooldown, only one trial call at a time."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.retry_after() <= 0:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                logger.info("AI circuit closed")
+            self.reset()
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= settings.AI_BREAKER_THRESHOLD:
+                if self.state != self.OPEN:
+                    logger.warning("AI circuit open | %d consecutive failures, cooldown %ss",
+                                   self.failures, settings.AI_BREAKER_COOLDOWN)
+                    metrics.inc('llm_circuit_opened_total')
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+    def abandon(self):
+        """The trial call ended without a verdict (cancelled, interrupted): let the next call try.
+
+        A no-op once the call has reported success or failure.
+        """
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = self.clock() - settings.AI_BREAKER_COOLDOWN
+
+
+breaker = CircuitBreaker()
+
+
+def _retry_after_header(exc):
+    response = getattr(exc, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+def retryable(exc):
+    """Timeouts, connection errors, 429 and 5xx: worth another attempt."""
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    try:
+        from groq import APIConnectionError, APIStatusError
+    except ImportError:
+        return False
+    if isinstance(exc, APIConnectionError):  # includes APITimeoutError
+        return True
+    return isinstance(exc, APIStatusError) and (exc.status_code in (408, 429) or exc.status_code >= 500)
+
+
+def backoff(attempt, exc=None):
+    """Full jitter: uniform in [0, AI_RETRY_BASE * 2**attempt], capped; never below a Retry-After."""
+    delay = random.uniform(0, min(settings.AI_RETRY_MAX, settings.AI_RETRY_BASE * 2 ** attempt))
+    return max(delay, _retry_after_header(exc))
+
+
+class _Attempts:
+    """Deadline bookkeeping shared by ``call`` and ``acall``."""
+
+    def __init__(self, operation, retries):
+        if not breaker.allow():
+            metrics.inc('llm_errors_total', operation=operation, error='CircuitOpenError')
+            raise CircuitOpenError(breaker.retry_after())
+        self.operation = operation
+        self.retries = settings.AI_RETRIES if retries is None else retries
+        self.deadline = time.monotonic() + settings.AI_DEADLINE
+
+    def timeout(self):
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f'{self.operation}: deadline of {settings.AI_DEADLINE}s exceeded')
+        return min(settings.AI_ATTEMPT_TIMEOUT, remaining)
+
+    def delay(self, attempt, exc):
+        """Seconds to wait before the next attempt, or None to give up."""
+        if not retryable(exc):
+            # The upstream answered; the request itself is at fault.
+            breaker.success()
+            return None
+        delay = backoff(attempt, exc)
+        if attempt >= self.retries or time.monotonic() + delay >= self.deadline:
+            breaker.failure()
+            return None
+        metrics.inc('llm_retries_total', operation=self.operation)
+        logger.warning("AI retry | %s attempt %d failed (%s: %s), next in %.2fs",
+                       self.operation, attempt + 1, type(exc).__name__, exc, delay)
+        return delay
+
+
+def call(operation, attempt, retries=None):
+    """``attempt(timeout)`` with retries under the deadline and the breaker; returns its result."""
+    attempts = _Attempts(operation, retries)
+    try:
+        for n in itertools.count():
+            try:
+                result = attempt(attempts.timeout())
+            except Exception as e:
+                delay = attempts.delay(n, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+            else:
+                breaker.success()
+                return result
+    except BaseException:
+        # KeyboardInterrupt, SystemExit: a half-open trial must not hold the breaker shut.
+        breaker.abandon()
+        raise
+
+
+async def acall(operation, attempt, retries=None):
+    """Async ``call``: ``attempt(timeout)`` is a coroutine function, also cut off at ``timeout``."""
+    attempts = _Attempts(operation, retries)
+    try:
+        for n in itertools.count():
+            try:
+                timeout = attempts.timeout()
+                result = await asyncio.wait_for(attempt(timeout), timeout)
+            except Exception as e:
+                delay = attempts.delay(n, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            else:
+                breaker.success()
+                return result
+    except BaseException:
+        # Cancellation above all: a half-open trial must not hold the breaker shut.
+        breaker.abandon()
+        raise
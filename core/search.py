@@ -0,0 +1,233 @@
+"""Compound search over a trigram FTS5 index (SQLite).
+
+``core_compound_fts`` holds one row per compound (rowid = compound id): its
+name, synonyms and class plus the crop's Korean, English and scientific
+names. Triggers on core_compound and core_crop keep it in sync, so
+bulk_create, ``update()`` and raw SQL writes are covered as well as saves.
+The trigram tokenizer matches any substring of three or more characters.
+Partial words ("ginsenosid"), Hangul ("데커신") and names written with or
+without spaces therefore match without language-specific stemming.
+
+Two-character terms ("rg", "인삼") are shorter than a trigram. They are
+looked up with a space attached (" rg" or "rg "), which matches them at a
+word boundary.
+
+Ranking avoids bm25(), whose IDF counts every match and takes hundreds of ms
+for broad queries on a million rows. A bounded candidate set is fetched
+instead and scored here: name-prefix matches come from the lower(name)
+B-tree index, then other matches in index order, for which FTS5 stops
+early under LIMIT. When nothing matches, long terms are retried by their
+halves, so a single typo still finds the word.
+"""
+from django.db import connection, connections
+from django.db.models.functions import Lower
+
+from .db import read_alias
+from .models import Compound, Crop
+
+TABLE = 'core_compound_fts'
+FIELDS = ('name', 'synonyms', 'compound_class', 'crop')
+CROP_TEXT = "{0}.name_ko || ' ' || {0}.name_en || ' ' || {0}.name_scientific"
+
+# Idempotent, so post_migrate can restore triggers that SQLite drops when a
+# later migration rebuilds core_compound or core_crop.
+SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5({', '.join(FIELDS)}, tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS core_compound_fts_insert AFTER INSERT ON core_compound BEGIN
+        INSERT INTO {TABLE}(rowid, name, synonyms, compound_class, crop)
+        SELECT new.id, new.name, new.synonyms, new.compound_class, {CROP_TEXT.format('core_crop')}
+        FROM core_crop WHERE id = new.crop_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS core_compound_fts_delete AFTER DELETE ON core_compound BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS core_compound_fts_update
+    AFTER UPDATE OF name, synonyms, compound_class, crop_id ON core_compound BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.id;
+        INSERT INTO {TABLE}(rowid, name, synonyms, compound_class, crop)
+        SELECT new.id, new.name, new.synonyms, new.compound_class, {CROP_TEXT.format('core_crop')}
+        FROM core_crop WHERE id = new.crop_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS core_crop_fts_update
+    AFTER UPDATE OF name_ko, name_en, name_scientific ON core_crop BEGIN
+        UPDATE {TABLE} SET crop = {CROP_TEXT.format('new')}
+        WHERE rowid IN (SELECT id FROM core_compound WHERE crop_id = new.id);
+    END""",
+]
+DROP = [
+    'DROP TRIGGER IF EXISTS core_crop_fts_update',
+    'DROP TRIGGER IF EXISTS core_compound_fts_update',
+    'DROP TRIGGER IF EXISTS core_compound_fts_delete',
+    'DROP TRIGGER IF EXISTS core_compound_fts_insert',
+    f'DROP TABLE IF EXISTS {TABLE}',
+]
+POPULATE = f"""INSERT INTO {TABLE}(rowid, name, synonyms, compound_class, crop)
+    SELECT c.id, c.name, c.synonyms, c.compound_class, {CROP_TEXT.format('cr')}
+    FROM core_compound c JOIN core_crop cr ON cr.id = c.crop_id"""
+
+MIN_TERM = 3          # shortest term a trigram index can look up
+CANDIDATES = 300      # rows scored per query
+MAX_TERMS = 8
+WEIGHTS = {'name': 8, 'synonyms': 4, 'compound_class': 2, 'crop': 1}
+FUZZY_MIN_TERM = 6    # both halves must still be indexable
+FUZZY_MIN_SIMILARITY = 0.5
+
+
+def install(conn=connection):
+    """Create the index and its triggers if missing (SQLite only)."""
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for sql in SCHEMA:
+            cursor.execute(sql)
+
+
+def rebuild():
+    """Repopulate the index from the tables; returns the number of rows indexed."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(POPULATE)
+        count = cursor.rowcount
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _match(terms):
+    """FTS5 query requiring every term; one-character terms are left to ``_contains``."""
+    parts = []
+    for term in terms:
+        if len(term) >= MIN_TERM:
+            parts.append(_phrase(term))
+        elif len(term) == MIN_TERM - 1:
+            parts.append(f'({_phrase(" " + term)} OR {_phrase(term + " ")})')
+    return ' AND '.join(parts)
+
+
+def _fetch(match, limit=CANDIDATES):
+    with connections[read_alias()].cursor() as cursor:
+        cursor.execute(f'SELECT rowid, {", ".join(FIELDS)} FROM {TABLE} WHERE {TABLE} MATCH %s LIMIT %s',
+                       [match, limit])
+        return cursor.fetchall()
+
+
+def _fetch_ids(ids):
+    if not ids:
+        return []
+    with connections[read_alias()].cursor() as cursor:
+        cursor.execute(f'SELECT rowid, {", ".join(FIELDS)} FROM {TABLE} WHERE rowid IN ({", ".join(["%s"] * len(ids))})',
+                       ids)
+        return cursor.fetchall()
+
+
+def _prefix_ids(q, limit=CANDIDATES):
+    """Compounds whose name starts with ``q``, by the lower(name) index."""
+    return list(Compound.objects.annotate(name_lower=Lower('name'))
+                .filter(name_lower__gte=q, name_lower__lt=q + '\uffff')
+                .order_by('name_lower').values_list('id', flat=True)[:limit])
+
+
+def _fields(row):
+    return dict(zip(FIELDS, (value.lower() for value in row[1:])))
+
+
+def _contains(row, terms):
+    fields = _fields(row).values()
+    return all(any(term in text for text in fields) for term in terms)
+
+
+def _similarity(row, terms):
+    """Mean over terms of the best share of the term's trigrams found in one field."""
+    fields = _fields(row)
+    shares = []
+    for term in terms:
+        grams = _trigrams(term)
+        shares.append(max(len(grams & _trigrams(text)) / len(grams) for text in fields.values()))
+    return sum(shares) / len(shares)
+
+
+def _score(row, q, terms, fuzzy):
+    fields = _fields(row)
+    if fuzzy:
+        score = 10 * _similarity(row, terms)
+    else:
+        score = sum(max((WEIGHTS[f] for f, text in fields.items() if term in text), default=0) for term in terms)
+    if fields['name'] == q:
+        score += 20
+    elif fields['name'].startswith(q):
+        score += 10
+    return score
+
+
+def _query(q):
+    q = ' '.join(q.lower().split())
+    return q, q.split()[:MAX_TERMS]
+
+
+def _candidates(q, terms):
+    rows = {row[0]: row for row in _fetch_ids(_prefix_ids(q))}
+    match = _match(terms)
+    if match and len(rows) < CANDIDATES:
+        for row in _fetch(match):
+            rows.setdefault(row[0], row)
+    return [row for row in rows.values() if _contains(row, terms)]
+
+
+def _fuzzy_candidates(terms):
+    long_terms = [t for t in terms if len(t) >= MIN_TERM]
+    halves = [h for t in long_terms if len(t) >= FUZZY_MIN_TERM for h in (t[:len(t) // 2], t[len(t) // 2:])]
+    if not halves:
+        return [], long_terms
+    rows = _fetch(' OR '.join(map(_phrase, halves)))
+    return [row for row in rows if _similarity(row, long_terms) >= FUZZY_MIN_SIMILARITY], long_terms
+
+
+def search(q, limit=20):
+    """Ranked compounds for a free-text query: (compounds, fuzzy) where fuzzy marks a typo-tolerant fallback."""
+    q, terms = _query(q)
+    if not q:
+        return [], False
+    if all(len(t) < MIN_TERM for t in terms):
+        # Short crop names ("인삼"): that crop's best compounds rather than name-length order.
+        # One (crop, -score) index range per crop row; with IN (...) SQLite sorts every compound instead.
+        compounds = []
+        for crop_id in Crop.objects.filter(name_ko__in=terms).values_list('id', flat=True):
+            compounds += Compound.objects.select_related('crop').filter(crop_id=crop_id).order_by('-score', 'id')[:limit]
+        if compounds:
+            return sorted(compounds, key=lambda c: (-c.score, c.id))[:limit], False
+
+    fuzzy = False
+    rows = _candidates(q, terms)
+    if not rows:
+        fuzzy = True
+        rows, terms = _fuzzy_candidates(terms)
+    scored = sorted(((_score(row, q, terms, fuzzy), row) for row in rows),
+                    key=lambda item: (-item[0], len(item[1][1]), item[1][0]))
+    ids = [row[0] for _, row in scored[:limit]]
+    compounds = Compound.objects.select_related('crop').in_bulk(ids)
+    return [compounds[pk] for pk in ids if pk in compounds], fuzzy
+
+
+def suggest(q, limit=10):
+    """Autocomplete: distinct compound names starting with ``q``, then names or synonyms containing it."""
+    q, terms = _query(q)
+    if not q:
+        return []
+    names = dict.fromkeys(Compound.objects.filter(id__in=_prefix_ids(q, limit * 20))
+                          .values_list('name', flat=True))
+    if len(names) < limit and _match([q]):
+        for row in _fetch(f'{{name synonyms}} : {_match([q])}'):
+            names.setdefault(row[1])
+    if len(q) < MIN_TERM:
+        # Crop names, for the first syllables of a Korean query.
+        names.update(dict.fromkeys(Crop.objects.filter(name_ko__gte=q, name_ko__lt=q + '\uffff')
+                                   .values_list('name_ko', flat=True)))
+    prefix = {name: name.lower().startswith(q) for name in names}
+    return sorted(names, key=lambda name: (not prefix[name], len(name), name))[:limit]
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Crop, Compound, EnvironmentData, Spectrum
+from .summaries import schedule_environment_refresh, schedule_refresh
+from .versioning import bump_data_version_on_commit
+
+
+@receiver([post_save, post_delete], sender=Crop)
+@receiver([post_save, post_delete], sender=Compound)
+@receiver([post_save, post_delete], sender=EnvironmentData)
+@receiver([post_save, post_delete], sender=Spectrum)
+def catalog_data_changed(sender, using=None, **kwargs):
+    bump_data_version_on_commit(using)
+
+
+@receiver([post_save, post_delete], sender=Compound)
+def compound_changed(sender, instance, using=None, **kwargs):
+    schedule_refresh(instance.crop_id, using)
+
+
+@receiver(post_save, sender=Crop)
+def crop_saved(sender, instance, using=None, **kwargs):
+    # region decides the linked environment row
+    schedule_refresh(instance.pk, using)
+
+
+@receiver([post_save, post_delete], sender=EnvironmentData)
+def environment_changed(sender, instance, using=None, **kwargs):
+    schedule_environment_refresh(instance, using)
+
@@ -0,0 +1,155 @@
+"""MS/MS spectral library search.
+
+Peaks are stored on Spectrum as packed float32 arrays. The searchable library
+lives in memory as padded (n_spectra, MAX_PEAKS) matrices sorted by precursor
+m/z, so a query binary-searches its precursor window and scores every
+candidate in one set of NumPy operations.
+
+Intensities are square-root scaled and L2-normalized, making the score a
+cosine. Each library peak is matched to a query peak within the fragment
+tolerance through a dense bin lookup table. Modified cosine also lets a
+library peak match at an offset of the precursor m/z difference (analog
+search). Matching is not forced one-to-one, which only matters for peaks
+closer than the tolerance.
+"""
+import math
+
+import numpy as np
+
+from .models import Spectrum
+from .versioning import VersionedValue
+
+# Most intense peaks kept per spectrum; weaker ones barely move a sqrt-scaled cosine.
+MAX_PEAKS = 64
+METHODS = ('cosine', 'modified_cosine')
+FRAGMENT_TOLERANCE = 0.02
+# Smallest accepted tolerance (Da), and the largest peak lookup table it may size (int32 bins).
+MIN_TOLERANCE = 1e-4
+MAX_TABLE_BINS = 4_000_000
+# Precursor window (Da): exact-match search vs. analog search.
+PRECURSOR_TOLERANCE = {'cosine': 0.05, 'modified_cosine': 100.0}
+
+
+def pack(values):
+    return np.asarray(values, dtype='<f4').tobytes()
+
+
+def unpack(blob):
+    return np.frombuffer(blob, dtype='<f4')
+
+
+def normalize_peaks(mz, intensity, max_peaks=MAX_PEAKS):
+    """Top ``max_peaks`` peaks by intensity, sorted by m/z, with sqrt-scaled unit-norm weights."""
+    mz = np.asarray(mz, dtype=np.float32)
+    intensity = np.asarray(intensity, dtype=np.float32)
+    keep = intensity > 0
+    mz, intensity = mz[keep], intensity[keep]
+    if len(mz) > max_peaks:
+        top = np.argpartition(intensity, -max_peaks)[-max_peaks:]
+        mz, intensity = mz[top], intensity[top]
+    order = np.argsort(mz)
+    weights = np.sqrt(intensity[order])
+    norm = np.linalg.norm(weights)
+    return mz[order], weights / norm if norm else weights
+
+
+def _peak_table(query_mz, tolerance):
+    """Dense lookup: bin of width ``tolerance`` -> index of a query peak within reach of it, or -1.
+
+    Replaces a binary search per library peak with one gather. Query peaks closer than
+    2 x tolerance share bins and the later one wins, so the closer of two may be missed.
+    The last bin is always -1 and catches out-of-range targets.
+    """
+    table = np.full(int(query_mz[-1] / tolerance) + 3, -1, dtype=np.int32)
+    for j, mz in enumerate(query_mz):
+        table[max(int((mz - tolerance) / tolerance), 0):int((mz + tolerance) / tolerance) + 1] = j
+    return table
+
+
+def _match(table, query_mz, query_w, lib_mz, lib_w, tolerance, shift=None):
+    """Per-peak weight products for (C, P) library peaks matched to a query peak within tolerance."""
+    target = lib_mz if shift is None else lib_mz + shift
+    bins = (target * np.float32(1 / tolerance)).astype(np.int32)
+    np.clip(bins, 0, len(table) - 1, out=bins)
+    idx = table[bins]
+    hit = (idx >= 0) & (np.abs(query_mz[idx] - target) <= tolerance)
+    return np.where(hit, lib_w * query_w[idx], np.float32(0))
+
+
+class SpectralLibrary:
+    def __init__(self, ids, compound_ids, precursor_mz, mz, weights):
+        self.ids = ids
+        self.compound_ids = compound_ids
+        self.precursor_mz = precursor_mz
+        self.mz = mz
+        self.weights = weights
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_db(cls):
+        rows = Spectrum.objects.order_by('precursor_mz', 'id')
+        n = rows.count()
+        ids = np.empty(n, dtype=np.int64)
+        compound_ids = np.empty(n, dtype=np.int64)
+        precursor_mz = np.empty(n, dtype=np.float64)
+        mz = np.zeros((n, MAX_PEAKS), dtype=np.float32)
+        weights = np.zeros((n, MAX_PEAKS), dtype=np.float32)
+        values = rows.values_list('id', 'compound_id', 'precursor_mz', 'mz', 'intensity')
+        i = -1
+        for i, (pk, compound_id, precursor, mz_blob, intensity_blob) in enumerate(values.iterator(chunk_size=2000)):
+            if i >= n:
+                break
+            peaks_mz, peaks_w = normalize_peaks(unpack(mz_blob), unpack(intensity_blob))
+            ids[i], compound_ids[i], precursor_mz[i] = pk, compound_id, precursor
+            mz[i, :len(peaks_mz)] = peaks_mz
+            weights[i, :len(peaks_w)] = peaks_w
+        n = i + 1  # rows deleted between count() and the scan
+        return cls(ids[:n], compound_ids[:n], precursor_mz[:n], mz[:n], weights[:n])
+
+    def search(self, precursor_mz, mz, intensity, method='cosine', top_k=10,
+               tolerance=FRAGMENT_TOLERANCE, precursor_tolerance=None, min_matched=1):
+        """Top-k library hits for a query spectrum.
+
+        Returns (hits, n_candidates); each hit is a dict with index into the library,
+        score and matched peak count, best first.
+        """
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {', '.join(METHODS)}")
+        if precursor_tolerance is None:
+            precursor_tolerance = PRECURSOR_TOLERANCE[method]
+        for name, value in (('tolerance', tolerance), ('precursor_tolerance', precursor_tolerance)):
+            if not (math.isfinite(value) and value >= MIN_TOLERANCE):
+                raise ValueError(f'{name} must be a number of at least {MIN_TOLERANCE} Da')
+        query_mz, query_w = normalize_peaks(mz, intensity)
+        if len(query_mz) < 2:
+            raise ValueError('query needs at least two peaks with positive intensity')
+        if query_mz[-1] / tolerance > MAX_TABLE_BINS:
+            raise ValueError(f'tolerance too small for fragments up to m/z {query_mz[-1]:.1f} '
+                             f'(at least {query_mz[-1] / MAX_TABLE_BINS:.2g} Da)')
+
+        lo = np.searchsorted(self.precursor_mz, precursor_mz - precursor_tolerance, side='left')
+        hi = np.searchsorted(self.precursor_mz, precursor_mz + precursor_tolerance, side='right')
+        if lo >= hi:
+            return [], 0
+        lib_mz, lib_w = self.mz[lo:hi], self.weights[lo:hi]
+
+        table = _peak_table(query_mz, tolerance)
+        products = _match(table, query_mz, query_w, lib_mz, lib_w, tolerance)
+        if method == 'modified_cosine':
+            shift = (precursor_mz - self.precursor_mz[lo:hi])[:, None].astype(np.float32)
+            products = np.maximum(products, _match(table, query_mz, query_w, lib_mz, lib_w, tolerance, shift))
+        scores = np.minimum(products.sum(axis=1), 1.0)
+        matched = (products > 0).sum(axis=1)
+        scores[matched < min_matched] = 0.0
+
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        hits = [{'index': int(lo + i), 'score': float(scores[i]), 'matched_peaks': int(matched[i])}
+                for i in best if scores[i] > 0]
+        return hits, int(hi - lo)
+
+
+library = VersionedValue(SpectralLibrary.from_db)
@@ -0,0 +1,133 @@
+"""Materialized per-crop dashboard aggregates (CropSummary).
+
+A crop's summary is recomputed from its compounds with one indexed query
+whenever they change. Signal handlers queue the crop id in a per-thread
+dirty set, flushed with one refresh per crop when the transaction commits
+(at once for autocommit saves), so a loop of saves inside ``atomic`` does not
+recompute the crop once per row. Bulk writers (import_compounds) call
+``refresh`` themselves since bulk_create sends no signals, and a dashboard
+read builds any summary that is still missing.
+
+The linked environment row is the latest period recorded for the crop's
+region, found through the (region, period) unique index.
+"""
+import threading
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Crop, Compound, CropSummary, EnvironmentData
+
+LEVELS = ('L1', 'L2', 'L3')
+SUMMARY_FIELDS = ['environment', 'compound_count', 'score_avg', 'score_min', 'score_max',
+                  'l1_count', 'l2_count', 'l3_count', 'class_counts', 'qc_counts', 'compounds']
+
+_local = threading.local()
+
+
+def latest_environment(region_ids):
+    """{region id: its EnvironmentData row with the latest period}."""
+    rows = (EnvironmentData.objects.filter(region_id__in=set(region_ids) - {None})
+            .order_by('region_id', '-period'))
+    latest = {}
+    for row in rows:
+        latest.setdefault(row.region_id, row)
+    return latest
+
+
+def _summarize(crop, rows, environment):
+    scores = [score for _, score, _, _, _ in rows]
+    levels = Counter(level for _, _, _, level, _ in rows)
+    return CropSummary(
+        crop=crop,
+        environment=environment,
+        compound_count=len(rows),
+        score_avg=sum(scores) / len(scores) if scores else None,
+        score_min=min(scores, default=None),
+        score_max=max(scores, default=None),
+        **{f'{level.lower()}_count': levels[level] for level in LEVELS},
+        class_counts=dict(Counter(cls for _, _, cls, _, _ in rows if cls)),
+        qc_counts=dict(Counter(qc for _, _, _, _, qc in rows)),
+        compounds=[{'name': name, 'score': score, 'compound_class': cls} for name, score, cls, _, _ in rows],
+    )
+
+
+def refresh(crop_ids):
+    """Recompute the summaries of the given crops (ids of deleted crops are ignored)."""
+    crops = Crop.objects.in_bulk(list(crop_ids))
+    if not crops:
+        return 0
+    rows = defaultdict(list)
+    compounds = (Compound.objects.filter(crop_id__in=crops).order_by('crop_id', '-score', 'id')
+                 .values_list('crop_id', 'name', 'score', 'compound_class', 'annotation_level', 'qc_status'))
+    for crop_id, *row in compounds:
+        rows[crop_id].append(row)
+    environments = latest_environment(crop.region_id for crop in crops.values())
+    summaries = [_summarize(crop, rows[pk], environments.get(crop.region_id)) for pk, crop in crops.items()]
+    CropSummary.objects.bulk_create(summaries, update_conflicts=True, unique_fields=['crop'],
+                                    update_fields=SUMMARY_FIELDS + ['updated_at'])
+    return len(summaries)
+
+
+def refresh_all():
+    return refresh(Crop.objects.values_list('id', flat=True))
+
+
+def flush():
+    """Refresh the crops queued in this thread."""
+    crop_ids, _local.crop_ids = getattr(_local, 'crop_ids', set()), set()
+    if crop_ids:
+        refresh(crop_ids)
+
+
+def schedule_refresh(crop_id, using=None):
+    """Queue ``crop_id`` for ``flush``, once per crop however many rows changed.
+
+    Inside a transaction the queue is flushed when it commits; outside one, right away.
+    """
+    if not hasattr(_local, 'crop_ids'):
+        _local.crop_ids = set()
+    _local.crop_ids.add(crop_id)
+    transaction.on_commit(flush, using=using)
+
+
+def schedule_environment_refresh(environment, using=None):
+    """Refresh the crops of ``environment``'s region and any crop still linked to that row."""
+    linked = Q(summary__environment_id=environment.pk)
+    if environment.region_id is not None:
+        linked |= Q(region_id=environment.region_id)
+    for crop_id in Crop.objects.filter(linked).values_list('id', flat=True):
+        schedule_refresh(crop_id, using)
+
+
+def _with_summaries(crops):
+    """Attach summaries still missing (e.g. rows written before this table existed), building them now."""
+    missing = [crop.pk for crop in crops if not hasattr(crop, 'summary')]
+    if missing:
+        refresh(missing)
+        summaries = CropSummary.objects.select_related('environment__region').in_bulk(missing)
+        for crop in crops:
+            if crop.pk in summaries:
+                crop.summary = summaries[crop.pk]
+
+
+def summaries_by_name(names):
+    """{name: Crop with ``summary`` (and its environment) loaded} for the first crop row of each name.
+
+    One query; summaries still missing are built here.
+    """
+    crops = {}
+    rows = (Crop.objects.filter(name_ko__in=names).order_by('name_ko', 'id')
+            .select_related('summary__environment__region'))
+    for crop in rows:
+        crops.setdefault(crop.name_ko, crop)
+    _with_summaries(list(crops.values()))
+    return crops
+
+
+def summaries_by_id(ids):
+    """{id: Crop with ``summary`` (and its environment) loaded}; one query, like summaries_by_name."""
+    crops = Crop.objects.select_related('summary__environment__region').in_bulk(list(ids))
+    _with_summaries(list(crops.values()))
+    return crops
@@ -0,0 +1,294 @@
+"""Synthetic catalog data at production scale (generate_synthetic).
+
+Crops are drawn from species x plant part x origin x year. The origins are
+the bundled regions, so every crop resolves to a Region and gets environment
+rows. Compounds are spread unevenly over the crops. Compound *i* of a
+species has the same name, class, mass and retention time in every crop of
+that species, with small measurement noise. Cross-crop comparison, the mass
+lookup and search therefore behave as they do on real data.
+
+Output is deterministic for a given seed. Compounds are inserted with
+executemany in batches of plain tuples. On SQLite, the compound indexes and
+the FTS index are dropped for the load and rebuilt once at the end. After
+that, crop summaries are refreshed and the data version is bumped.
+"""
+import functools
+import itertools
+import math
+import random
+import string
+from datetime import date
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Count
+
+from . import search, spectra, summaries
+from .models import AIJob, AIJobItem, Compound, Crop, CropSummary, EnvironmentData, Region, Spectrum
+from .regions import ALIASES, REGIONS, RegionResolver, ensure_regions, short_name
+from .versioning import bump_data_version
+
+# name_ko, name_en, scientific name, plant parts, compound classes
+SPECIES = [
+    ('인삼', 'Ginseng', 'Panax ginseng', ('뿌리', '잎'), ('Saponin', 'Polyacetylene', 'Phenolic acid')),
+    ('당귀', 'Angelica', 'Angelica gigas', ('뿌리',), ('Coumarin', 'Phenolic acid')),
+    ('황기', 'Astragalus', 'Astragalus membranaceus', ('뿌리',), ('Saponin', 'Flavonoid')),
+    ('결명자', 'Cassia', 'Senna obtusifolia', ('종자',), ('Anthraquinone', 'Flavonoid')),
+    ('단삼', 'Salvia', 'Salvia miltiorrhiza', ('뿌리',), ('Diterpene', 'Phenolic acid')),
+    ('상황버섯', 'Phellinus', 'Phellinus linteus', ('자실체',), ('Polysaccharide', 'Triterpene')),
+    ('동충하초', 'Cordyceps', 'Cordyceps militaris', ('자실체',), ('Nucleoside', 'Polysaccharide')),
+    ('오미자', 'Schisandra', 'Schisandra chinensis', ('열매',), ('Lignan', 'Phenolic acid')),
+    ('감초', 'Licorice', 'Glycyrrhiza uralensis', ('뿌리',), ('Saponin', 'Flavonoid')),
+    ('도라지', 'Balloon flower', 'Platycodon grandiflorus', ('뿌리',), ('Saponin', 'Flavonoid')),
+    ('작약', 'Peony', 'Paeonia lactiflora', ('뿌리',), ('Monoterpene glycoside', 'Phenolic acid')),
+    ('산수유', 'Cornus', 'Cornus officinalis', ('열매',), ('Iridoid', 'Flavonoid')),
+]
+
+# class: (name stems, molecular weight range or None, retention time range in minutes)
+CLASSES = {
+    'Saponin': (('Ginsenoside', 'Astragaloside', 'Glycyrrhizin', 'Platycodin'), (600, 1300), (10, 30)),
+    'Polyacetylene': (('Panaxynol', 'Panaxydol', 'Panaxytriol'), (240, 280), (24, 32)),
+    'Phenolic acid': (('Salvianolic acid', 'Chlorogenic acid', 'Rosmarinic acid', 'Caffeic acid'), (150, 720), (3, 18)),
+    'Coumarin': (('Decursin', 'Decursinol', 'Nodakenin', 'Marmesin'), (160, 420), (8, 22)),
+    'Flavonoid': (('Calycosin', 'Formononetin', 'Quercetin', 'Kaempferol', 'Liquiritigenin'), (250, 650), (6, 20)),
+    'Anthraquinone': (('Chrysophanol', 'Emodin', 'Obtusifolin'), (240, 420), (15, 28)),
+    'Diterpene': (('Tanshinone', 'Cryptotanshinone', 'Miltirone'), (270, 340), (20, 32)),
+    'Polysaccharide': (('Beta-glucan', 'Arabinogalactan'), None, (1, 3)),
+    'Triterpene': (('Inotodiol', 'Ergosterol', 'Hispolon'), (300, 500), (22, 34)),
+    'Nucleoside': (('Cordycepin', 'Adenosine', 'Guanosine'), (230, 300), (2, 8)),
+    'Lignan': (('Schisandrin', 'Gomisin', 'Schisanhenol'), (380, 540), (18, 30)),
+    'Monoterpene glycoside': (('Paeoniflorin', 'Albiflorin', 'Oxypaeoniflorin'), (460, 500), (6, 14)),
+    'Iridoid': (('Loganin', 'Morroniside', 'Sweroside'), (350, 410), (4, 12)),
+}
+
+QC_STATUSES = (('PASS', .85), ('REVIEW', .10), ('FAIL', .05))
+SOURCES = (('IN-HOUSE', .4), ('PUBLIC', .6))
+SOIL_GRADES = 'ABC'
+PROTON = 1.007276
+GOLDEN = (math.sqrt(5) - 1) / 2
+
+
+@functools.lru_cache(maxsize=100_000)
+def _variant(i):
+    """Name suffix of the i-th compound sharing a stem: Ra1 ... Ra9, Rb1 ..., Rz9, Rba1 ..."""
+    head, digit = divmod(i, 9)
+    letters = ''
+    while True:
+        head, r = divmod(head, 26)
+        letters = string.ascii_lowercase[r] + letters
+        if not head:
+            return f'R{letters}{digit + 1}'
+
+
+def _fraction(values, offset):
+    # Low-discrepancy spread of per-compound constants over [0, 1).
+    return np.modf(values * GOLDEN + offset)[0]
+
+
+def _origins():
+    return sorted({short_name(name) for _, _, name in REGIONS} | set(ALIASES))
+
+
+def _crop_rows(count, years, rng):
+    combos = [(species, part, origin, year)
+              for species in SPECIES for part in species[3]
+              for origin in _origins() for year in range(years[0], years[1] + 1)]
+    if count > len(combos):
+        raise ValueError(f'at most {len(combos)} crops for years {years[0]}-{years[1]}')
+    return rng.sample(combos, count)
+
+
+def clear():
+    """Delete all catalog rows (crops, compounds, spectra, environment, summaries, AI jobs)."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in (AIJobItem, AIJob, Spectrum, CropSummary, Compound, Crop, EnvironmentData):
+            cursor.execute(f'DELETE FROM {model._meta.db_table}')
+
+
+def _drop_indexes():
+    """Drop the compound indexes and the FTS index (SQLite); returns the statements that recreate the indexes.
+
+    Building an index once after the load is much faster than updating it row by row.
+    """
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s "
+                       "AND sql IS NOT NULL", [Compound._meta.db_table])
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+        for sql in search.DROP:
+            cursor.execute(sql)
+    return [sql for _, sql in indexes]
+
+
+def _restore_indexes(indexes):
+    """Recreate the dropped indexes and rebuild the FTS index; returns the number of rows indexed."""
+    if connection.vendor != 'sqlite':
+        return 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for sql in indexes:
+                cursor.execute(sql)
+        search.install()
+        return search.rebuild()
+
+
+def create_crops(count, years, rng):
+    ensure_regions()
+    regions = RegionResolver()
+    crops = [
+        Crop(name_ko=ko, name_en=en, name_scientific=scientific, plant_part=part,
+             origin=origin, year=year, region_id=regions.resolve(origin))
+        for (ko, en, scientific, _, _), part, origin, year in _crop_rows(count, years, rng)
+    ]
+    return Crop.objects.bulk_create(crops)
+
+
+def create_environment(region_ids, years, rng):
+    """Monthly temperature/rainfall rows for every region and year."""
+    rows = []
+    for region in Region.objects.filter(pk__in=set(region_ids)).order_by('code'):
+        mean = rng.uniform(10, 14.5)
+        rain = rng.uniform(1000, 1450)
+        soil = rng.choice(SOIL_GRADES)
+        for year, month in itertools.product(range(years[0], years[1] + 1), range(1, 13)):
+            season = -math.cos((month - 1) / 12 * 2 * math.pi)
+            # Monsoon: most of the year's rain falls in July-August.
+            share = 0.04 + 0.18 * math.exp(-((month - 7.5) ** 2) / 1.5)
+            rows.append(EnvironmentData(
+                region=region, region_name=str(region), period=date(year, month, 1),
+                avg_temperature=round(mean + 13 * season + rng.gauss(0, 1), 1),
+                avg_rainfall=round(rain * share / 1.2 * rng.uniform(0.7, 1.3), 1),
+                soil_grade=soil,
+            ))
+    EnvironmentData.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+COMPOUND_COLUMNS = ('crop_id', 'name', 'compound_class', 'annotation_level', 'source', 'score', 'similarity',
+                    'qc_status', 'synonyms', 'molecular_weight', 'retention_time')
+
+
+def _compound_batch(crop, species, start, stop, np_rng):
+    """Rows (COMPOUND_COLUMNS) for compounds start..stop-1 of ``crop``."""
+    classes = species[4]
+    index = np.arange(start, stop)
+    n = len(index)
+    which = index % len(classes)
+    ranges = [CLASSES[c] for c in classes]
+    mw_lo, mw_hi = (np.array([r[1][k] if r[1] else np.nan for r in ranges])[which] for k in (0, 1))
+    rt_lo, rt_hi = (np.array([r[2][k] for r in ranges])[which] for k in (0, 1))
+    mw = (mw_lo + (mw_hi - mw_lo) * _fraction(index, 0.1) + np_rng.normal(0, 0.002, n)).round(4)
+    rt = np.maximum(0.5, rt_lo + (rt_hi - rt_lo) * _fraction(index, 0.7) + np_rng.normal(0, 0.15, n)).round(2)
+    scores = np.clip(np_rng.normal(76, 12, n), 30, 99).astype(int)
+    similarity = np.clip(scores / 100 + np_rng.normal(0, 0.04, n), 0, 1).round(3)
+    levels = np.where(scores >= 88, 'L1', np.where(scores >= 65, 'L2', 'L3'))
+    qc = np_rng.choice([q for q, _ in QC_STATUSES], n, p=[p for _, p in QC_STATUSES])
+    sources = np_rng.choice([s for s, _ in SOURCES], n, p=[p for _, p in SOURCES])
+
+    names = []
+    for i in index.tolist():
+        stems = CLASSES[classes[i % len(classes)]][0]
+        names.append(f'{stems[i // len(classes) % len(stems)]} {_variant(i // len(classes) // len(stems))}')
+    return list(zip(
+        itertools.repeat(crop.pk), names, [classes[k] for k in which.tolist()], levels.tolist(),
+        sources.tolist(), scores.tolist(), similarity.tolist(), qc.tolist(), itertools.repeat(''),
+        [None if math.isnan(v) else v for v in mw.tolist()], rt.tolist(),
+    ))
+
+
+def create_compounds(crops, total, batch_size, np_rng, progress=None):
+    """``total`` compounds over ``crops``, with lognormal crop sizes."""
+    weights = np_rng.lognormal(0, 0.8, len(crops))
+    counts = np_rng.multinomial(total, weights / weights.sum())
+    species = {s[0]: s for s in SPECIES}
+    written = 0
+    pending = []
+    for crop, count in zip(crops, counts.tolist()):
+        for start in range(0, count, batch_size):
+            pending += _compound_batch(crop, species[crop.name_ko], start, min(count, start + batch_size), np_rng)
+            if len(pending) >= batch_size:
+                written += write_compounds(pending)
+                pending = []
+                if progress:
+                    progress(written)
+    if pending:
+        written += write_compounds(pending)
+        if progress:
+            progress(written)
+    return written
+
+
+def compound_rows(crop, start, stop, np_rng):
+    """Rows (COMPOUND_COLUMNS) for compounds start..stop-1 of any crop, synthetic or not."""
+    species = next((s for s in SPECIES if s[0] == crop.name_ko), SPECIES[crop.pk % len(SPECIES)])
+    return _compound_batch(crop, species, start, stop, np_rng)
+
+
+def write_compounds(rows, using=DEFAULT_DB_ALIAS):
+    """Insert ``rows`` (COMPOUND_COLUMNS) in one transaction; returns the row count."""
+    # executemany on plain tuples: at 10M rows, building model instances costs more than the insert.
+    conn = connections[using]
+    columns = ', '.join(conn.ops.quote_name(column) for column in COMPOUND_COLUMNS)
+    sql = (f'INSERT INTO {conn.ops.quote_name(Compound._meta.db_table)} ({columns}) '
+           f'VALUES ({", ".join(["%s"] * len(COMPOUND_COLUMNS))})')
+    with transaction.atomic(using=using), conn.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    return len(rows)
+
+
+def create_spectra(count, np_rng):
+    """One synthetic [M+H]+ MS/MS spectrum for each of the first ``count`` compounds with a mass."""
+    compounds = (Compound.objects.exclude(molecular_weight=None).order_by('id')
+                 .values_list('id', 'molecular_weight')[:count])
+    rows = []
+    for pk, mw in compounds:
+        precursor = mw + PROTON
+        n = int(np_rng.integers(8, 40))
+        mz = np.sort(np_rng.uniform(50, precursor, n)).round(4)
+        intensity = np_rng.pareto(1.5, n) + 1
+        rows.append(Spectrum(
+            compound_id=pk, precursor_mz=round(precursor, 4), precursor_type='[M+H]+', ion_mode='POSITIVE',
+            collision_energy='30', num_peaks=n, mz=spectra.pack(mz), intensity=spectra.pack(intensity / intensity.max()),
+        ))
+    Spectrum.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def refresh_summaries(crops, chunk_rows=200_000):
+    """Crop summaries, a few crops at a time so each refresh loads about ``chunk_rows`` compounds."""
+    sizes = dict(Compound.objects.order_by().values_list('crop_id').annotate(n=Count('id')))
+    chunk, rows = [], 0
+    for crop in crops:
+        chunk.append(crop.pk)
+        rows += sizes.get(crop.pk, 0)
+        if rows >= chunk_rows:
+            summaries.refresh(chunk)
+            chunk, rows = [], 0
+    if chunk:
+        summaries.refresh(chunk)
+
+
+def generate(crop_count=200, compound_count=100_000, years=(2019, 2025), spectrum_count=1000, seed=0,
+             batch_size=20_000, progress=None):
+    """Replace the catalog with synthetic data; returns the row counts written.
+
+    ``progress(compounds written)`` is called after every batch.
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    indexes = _drop_indexes()
+    try:
+        clear()
+        crops = create_crops(crop_count, years, rng)
+        environment = create_environment([crop.region_id for crop in crops], years, rng)
+        compounds = create_compounds(crops, compound_count, batch_size, np_rng, progress)
+        spectrum_rows = create_spectra(spectrum_count, np_rng) if spectrum_count else 0
+    finally:
+        indexed = _restore_indexes(indexes)
+    refresh_summaries(crops)
+    bump_data_version()
+    return {'crops': len(crops), 'environment': environment, 'compounds': compounds,
+            'spectra': spectrum_rows, 'indexed': indexed}
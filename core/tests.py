@@ -1,3 +1,1210 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import logging.handlers
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import aclosing
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.http import FileResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (ai_cache, ai_service, chat, export, http, jobs, logs, mass_index, metrics, origin, rag, resilience,
+               spectra, summaries, synthetic, throttle, views)
+from .db.base import DatabaseWrapper, close_pooled
+from .fake_llm import FakeLLMServer
+from .management.commands import run_ai_worker
+from .models import AICacheEntry, AIJobItem, ChatSession, Crop, CropSummary, Compound, EnvironmentData, Region, Spectrum
+from .versioning import bump_data_version
+
+# A plan line such as "SCAN core_compound" (no "USING ... INDEX") is a full table scan.
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(core_\w+)$')
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN every query a read-only view issues and fail on full table scans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        geumsan = Region.objects.create(code='44710', province='충청남도', name='금산군', short_name='금산')
+        ginseng = Crop.objects.create(name_ko='인삼', name_en='Ginseng', plant_part='뿌리',
+                                      origin='금산', region=geumsan, year=2025)
+        astragalus = Crop.objects.create(name_ko='황기', name_en='Astragalus', plant_part='뿌리',
+                                         origin='정선', year=2024)
+        for i, crop in enumerate([ginseng, astragalus]):
+            for j in range(3):
+                Compound.objects.create(crop=crop, name=f'Compound {i}-{j}', annotation_level='L1',
+                                        source='IN-HOUSE', score=90 - j, qc_status='PASS',
+                                        compound_class='Saponin')
+        for year, temperature in [(2024, 12.5), (2025, 12.8)]:
+            EnvironmentData.objects.create(region=geumsan, region_name='충남 금산군', period=date(year, 1, 1),
+                                           avg_temperature=temperature, avg_rainfall=1150, soil_grade='A')
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            details = [row[-1] for row in cursor.fetchall()]
+        return [m.group(1) for m in map(FULL_SCAN.match, details) if m]
+
+    def assertNoFullScans(self, url, params=None):
+        # Plan the cold path: facets, counts and pages are otherwise served from cache.
+        cache.clear()
+        http.pages.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(ctx.captured_queries)
+        for query in ctx.captured_queries:
+            scans = self.full_scans(query['sql'])
+            self.assertFalse(scans, f"full scan of {scans} in {url} {params}: {query['sql']}")
+
+    def test_index_pages(self):
+        for name in ['landing', 'research_index', 'public_index']:
+            with self.subTest(view=name):
+                self.assertNoFullScans(reverse(name))
+
+    def test_catalog_filters(self):
+        cases = [
+            {},
+            {'qc': ''},
+            {'qc': '', 'crop': '인삼'},
+            {'qc': '', 'part': '뿌리'},
+            {'qc': '', 'origin': '금산'},
+            {'qc': '', 'year': '2025'},
+            {'qc': 'PASS', 'crop': '인삼', 'part': '뿌리', 'origin': '금산', 'year': '2025'},
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                self.assertNoFullScans(reverse('research_catalog'), params)
+                self.assertNoFullScans(reverse('api_compounds'), params)
+                self.assertNoFullScans(reverse('api_compounds'), {**params, 'format': 'columns'})
+
+    def test_catalog_cursor_page(self):
+        first = self.client.get(reverse('api_compounds'), {'qc': '', 'limit': 2}).json()
+        self.assertNoFullScans(reverse('api_compounds'), {'qc': '', 'limit': 2, 'cursor': first['next_cursor']})
+
+    def test_search(self):
+        for params in [{'q': 'compound 0'}, {'q': 'compund'}, {'q': '인삼'},
+                       {'q': 'comp', 'autocomplete': '1'}, {'q': '인', 'autocomplete': '1'}]:
+            with self.subTest(params=params):
+                self.assertNoFullScans(reverse('api_search'), params)
+
+    def test_dashboard(self):
+        self.assertNoFullScans(reverse('public_dashboard'), {'crop_a': '인삼', 'crop_b': '황기'})
+
+
+class PageCacheTests(TestCase):
+    """Read-only pages revalidate by ETag and are rendered once per data version."""
+
+    @classmethod
+    def setUpTestData(cls):
+        crop = Crop.objects.create(name_ko='인삼', name_en='Ginseng', plant_part='뿌리', origin='금산')
+        Compound.objects.create(crop=crop, name='Ginsenoside Rb1', annotation_level='L1',
+                                source='IN-HOUSE', qc_status='PASS')
+
+    def setUp(self):
+        http.pages.clear()
+
+    def test_conditional_get(self):
+        url = reverse('research_catalog')
+        first = self.client.get(url, {'crop': '인삼'})
+        etag = first['ETag']
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {'crop': '인삼'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            cached = self.client.get(url, {'crop': '인삼', 'cursor': 'ignored'})
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached['ETag'], etag)
+
+        self.assertNotEqual(self.client.get(url, {'crop': ''})['ETag'], etag)
+        bump_data_version()
+        response = self.client.get(url, {'crop': '인삼'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(METRICS_DIR='', METRICS_TOKEN='')
+class MetricsTests(TestCase):
+    """/metrics reports per-route requests and ORM queries in Prometheus text format."""
+
+    def sample(self, text, series):
+        match = re.search(r'^' + re.escape(series) + r' (\S+)$', text, re.M)
+        return float(match.group(1)) if match else 0.0
+
+    def test_request_metrics(self):
+        Crop.objects.create(name_ko='인삼', name_en='Ginseng', plant_part='뿌리', origin='금산')
+        requests = 'http_requests_total{method="GET",route="/api/compounds/",status="200"}'
+        queries = 'db_queries_total{route="/api/compounds/"}'
+        before = self.client.get('/metrics').content.decode()
+        self.client.get(reverse('api_compounds'), {'limit': 1})
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertEqual(self.sample(text, requests) - self.sample(before, requests), 1)
+        self.assertGreater(self.sample(text, queries), self.sample(before, queries))
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="/api/compounds/",le="+Inf"}', text)
+
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_snapshot_expiry(self):
+        """Other processes' snapshots are summed until they go METRICS_SNAPSHOT_MAX_AGE without a write."""
+        series = 'llm_retries_total{operation="interpret"}'
+        own = self.sample(metrics.render(), series)
+        with tempfile.TemporaryDirectory() as tmp, self.settings(METRICS_DIR=tmp, METRICS_SNAPSHOT_MAX_AGE=3600):
+            for name, age in [('live', 60), ('exited', 7200)]:
+                path = Path(tmp) / f'{name}.json'
+                path.write_text(json.dumps([['llm_retries_total', [['operation', 'interpret']], 5]]))
+                os.utime(path, (time.time() - age,) * 2)
+            self.assertEqual(self.sample(metrics.render(), series), own + 5)
+            self.assertEqual([p.name for p in Path(tmp).iterdir()], ['live.json'])
+
+
+class SearchIndexTests(TestCase):
+    """The FTS index follows compound and crop writes through its triggers."""
+
+    def names(self, q):
+        return [c['name'] for c in self.client.get(reverse('api_search'), {'q': q}).json()['results']]
+
+    def test_triggers_follow_writes(self):
+        crop = Crop.objects.create(name_ko='당귀', name_en='Angelica', plant_part='뿌리', origin='평창')
+        decursin = Compound.objects.create(crop=crop, name='Decursin', synonyms='데커신', annotation_level='L1',
+                                           source='PUBLIC', qc_status='PASS')
+        self.assertEqual(self.names('데커신'), ['Decursin'])
+        self.assertEqual(self.names('decurson'), ['Decursin'])
+
+        Compound.objects.filter(pk=decursin.pk).update(name='Decursinol')
+        self.assertEqual(self.names('decursinol'), ['Decursinol'])
+
+        Crop.objects.filter(pk=crop.pk).update(name_en='Korean angelica')
+        self.assertEqual(self.names('korean angel'), ['Decursinol'])
+
+        decursin.delete()
+        self.assertEqual(self.names('decursinol'), [])
+
+
+class SyntheticDataTests(TestCase):
+    """generate_synthetic: counts, summaries and a working search index after the bulk load."""
+
+    def test_generate(self):
+        counts = synthetic.generate(crop_count=4, compound_count=500, years=(2024, 2025), spectrum_count=10)
+        self.assertEqual(counts['compounds'], 500)
+        self.assertEqual(counts['indexed'], 500)
+        self.assertEqual(Compound.objects.count(), 500)
+        self.assertEqual(Spectrum.objects.count(), 10)
+        self.assertFalse(Crop.objects.filter(region=None).exists())
+        self.assertEqual(EnvironmentData.objects.count(), counts['environment'])
+        self.assertEqual(sum(CropSummary.objects.values_list('compound_count', flat=True)), 500)
+
+        compound = Compound.objects.order_by('id').first()
+        results = self.client.get(reverse('api_search'), {'q': compound.name}).json()['results']
+        self.assertIn(compound.name, [c['name'] for c in results])
+        Compound.objects.create(crop=compound.crop, name='Synthetic probe', annotation_level='L3',
+                                source='PUBLIC', qc_status='PASS')
+        self.assertEqual(self.client.get(reverse('api_search'), {'q': 'probe'}).json()['results'][0]['name'],
+                         'Synthetic probe')
+
+
+class ProductionDatabaseTests(SimpleTestCase):
+    """core.db: PRAGMAs on new connections, pooled reuse, and a read-only reader on the same file."""
+
+    def wrapper(self, path, alias, **options):
+        return DatabaseWrapper({**connection.settings_dict, 'ENGINE': 'core.db', 'NAME': path,
+                                'OPTIONS': {'pool_size': 2, **options}}, alias)
+
+    def test_pragmas_and_pool(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / 'db.sqlite3')
+            writer = self.wrapper(path, 'test_writer', pragmas={'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+                                  transaction_mode='IMMEDIATE')
+            reader = self.wrapper(path, 'test_reader', pragmas={'query_only': 'ON'})
+            try:
+                with writer.cursor() as cursor:
+                    cursor.execute('CREATE TABLE t (x INTEGER)')
+                    cursor.execute('INSERT INTO t VALUES (1)')
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)
+                raw = writer.connection
+                writer.close()
+                writer.connect()
+                self.assertIs(writer.connection, raw)
+
+                with reader.cursor() as cursor:
+                    cursor.execute('SELECT x FROM t')
+                    self.assertEqual(cursor.fetchall(), [(1,)])
+                    with self.assertRaises(OperationalError):
+                        cursor.execute('INSERT INTO t VALUES (2)')
+            finally:
+                writer.close()
+                reader.close()
+                close_pooled()
+
+
+class ChatSessionTests(TestCase):
+    """/api/chat/ sessions: only the new message is posted, and every upstream prompt stays in budget."""
+
+    async def test_rolling_summary(self):
+        budget = chat.estimate_tokens(ai_service.SYSTEM_PROMPT) + 300
+        with FakeLLMServer(latency=0) as server, self.settings(CHAT_TOKEN_BUDGET=budget, CHAT_SUMMARY_MAX_TOKENS=50):
+            ai_service.configure(api_key='test', base_url=server.base_url)
+            try:
+                session = None
+                for i in range(8):
+                    message = f'{i}번째 질문: 인삼 사포닌 함량이 산지별로 어떻게 다른가요?'
+                    response = await self.async_client.post(
+                        reverse('api_chat'), {'session': session, 'message': message}, content_type='application/json')
+                    self.assertEqual(response.status_code, 200)
+                    session = response.json()['session']
+                    sent = server.last_request['messages']
+                    self.assertLessEqual(sum(chat.estimate_tokens(m['content']) for m in sent), budget)
+                    self.assertIn(f'{i}번째 질문', sent[-1]['content'])
+                await ai_service.aclose()
+            finally:
+                ai_service.configure()
+
+        stored = await ChatSession.objects.aget(key=session)
+        self.assertTrue(stored.summary)
+        self.assertGreater(stored.summarized_until, 0)
+        self.assertEqual(await stored.turns.acount(), 16)
+        self.assertEqual(sent[1]['content'], chat.SUMMARY_HEADER + stored.summary)
+
+
+class ThrottleTests(TestCase):
+    """AI endpoint admission: per-client token buckets (429) and the bounded gate (503)."""
+
+    def test_rate_limit(self):
+        url = reverse('api_interpret_compound')
+        with self.settings(AI_RATE_LIMIT_PER_MINUTE=6, AI_RATE_LIMIT_BURST=2):
+            statuses = [self.client.post(url, {}, content_type='application/json',
+                                         HTTP_X_FORWARDED_FOR='203.0.113.7').status_code for _ in range(3)]
+            self.assertEqual(statuses, [400, 400, 429])
+            response = self.client.post(url, {}, content_type='application/json', HTTP_X_FORWARDED_FOR='203.0.113.7')
+            self.assertEqual(response['Retry-After'], '10')
+            # Buckets are per client and per endpoint.
+            self.assertEqual(self.client.post(url, {}, content_type='application/json',
+                                              HTTP_X_FORWARDED_FOR='203.0.113.8').status_code, 400)
+            self.assertEqual(self.client.post(reverse('api_interpret_dashboard'), {}, content_type='application/json',
+                                              HTTP_X_FORWARDED_FOR='203.0.113.7').status_code, 400)
+
+    def test_shared_buckets(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'limits.sqlite3'
+            worker_a, worker_b = throttle.SQLiteBuckets(path), throttle.SQLiteBuckets(path)
+            self.assertEqual(worker_a.take('chat:1.2.3.4', rate=1, burst=2, now=100), 0)
+            self.assertEqual(worker_b.take('chat:1.2.3.4', rate=1, burst=2, now=100), 0)
+            self.assertEqual(worker_a.take('chat:1.2.3.4', rate=1, burst=2, now=100.25), 0.75)
+            self.assertEqual(worker_b.take('chat:1.2.3.4', rate=1, burst=2, now=101), 0)
+
+    async def test_gate(self):
+        gate = throttle.Gate(limit=1, queue=1, wait=0.05)
+        self.assertTrue(await gate.acquire())
+        waiter = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(await gate.acquire())    # queue full: rejected at once
+        self.assertFalse(await waiter)            # waited too long
+        gate.release()
+        self.assertTrue(await gate.acquire())
+
+    def test_gate_across_loops(self):
+        """Under WSGI each request runs on its own event loop; one gate still caps them all."""
+        gate = throttle.Gate(limit=2, queue=10, wait=1)
+        in_flight, peak, results, lock = [0], [0], [], threading.Lock()
+
+        async def request():
+            results.append(await gate.acquire())
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            gate.release()
+
+        threads = [threading.Thread(target=asyncio.run, args=(request(),)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [True] * 6)
+        self.assertEqual(peak[0], 2)
+        self.assertEqual((gate.held, gate.waiting), (0, 0))
+
+
+@override_settings(AI_RETRIES=2, AI_RETRY_BASE=0.01, AI_RETRY_MAX=0.05, AI_ATTEMPT_TIMEOUT=0.3, AI_DEADLINE=2,
+                   AI_BREAKER_THRESHOLD=2, AI_BREAKER_COOLDOWN=60)
+class ResilienceTests(TestCase):
+    """Upstream failures injected by the fake LLM: retries, deadlines, the breaker and stale fallback."""
+
+    payload = {'name': 'Decursin', 'crop': '당귀', 'score': 91}
+
+    def setUp(self):
+        resilience.breaker.reset()
+        self.server = FakeLLMServer(latency=0).start()
+        ai_service.configure(api_key='test', base_url=self.server.base_url)
+
+    def tearDown(self):
+        ai_service.configure()
+        self.server.stop()
+        resilience.breaker.reset()
+
+    async def test_retries(self):
+        self.server.fail(2)
+        result = await ai_service.ainterpret_compound_uncached(self.payload)
+        await ai_service.aclose()
+        self.assertIn('one_line_summary', result)
+        self.assertEqual(self.server.requests, 3)
+
+    async def test_deadline(self):
+        self.server.latency = 5
+        t0 = time.perf_counter()
+        with self.settings(AI_DEADLINE=0.5):
+            result = await ai_service.ainterpret_compound(self.payload)
+        await ai_service.aclose()
+        self.assertIn('error', result)
+        self.assertLess(time.perf_counter() - t0, 1.5)
+
+    async def test_breaker_and_stale_fallback(self):
+        key = ai_service.compound_cache_key(self.payload)
+        await sync_to_async(ai_cache.put)(key, 'compound', {'one_line_summary': '지난 해석'})
+        await AICacheEntry.objects.filter(key=key).aupdate(created_at=timezone.now() - timedelta(days=365))
+        self.server.fail(100)
+
+        for _ in range(3):
+            result = await ai_service.ainterpret_compound(self.payload)
+            self.assertEqual(result, {'one_line_summary': '지난 해석', 'stale': True})
+        # Two failed calls of three attempts each opened the breaker; the third call never went out.
+        self.assertEqual(self.server.requests, 6)
+        self.assertEqual(resilience.breaker.state, resilience.CircuitBreaker.OPEN)
+
+        result = await ai_service.ainterpret_compound({**self.payload, 'name': 'Nodakenin'})
+        await ai_service.aclose()
+        self.assertIn('일시적으로', result['error'])
+        self.assertEqual(self.server.requests, 6)
+
+    @override_settings(AI_BREAKER_THRESHOLD=1, AI_BREAKER_COOLDOWN=30)
+    def test_interrupted_trial(self):
+        """A half-open trial ended by a BaseException leaves the breaker ready for the next trial."""
+
+        class Interrupted(BaseException):
+            pass
+
+        def interrupted(timeout):
+            raise Interrupted
+
+        async def ainterrupted(timeout):
+            raise Interrupted
+
+        now = [0.0]
+        breaker = resilience.CircuitBreaker(clock=lambda: now[0])
+        with mock.patch.object(resilience, 'breaker', breaker):
+            breaker.failure()
+            with self.assertRaises(resilience.CircuitOpenError):
+                resilience.call('interpret', lambda timeout: 'ok')
+            for run in [lambda: resilience.call('interpret', interrupted),
+                        lambda: asyncio.run(resilience.acall('interpret', ainterrupted))]:
+                now[0] += 31
+                with self.assertRaises(Interrupted):
+                    run()
+                self.assertEqual((breaker.state, breaker.retry_after()), (breaker.OPEN, 0))
+            self.assertEqual(resilience.call('interpret', lambda timeout: 'ok'), 'ok')
+            self.assertEqual(breaker.state, breaker.CLOSED)
+
+
+@override_settings(AI_RATE_LIMIT_PER_MINUTE=0)
+class GroundingTests(TestCase):
+    """AI calls built from server-side data: interpretations by id, chat prompts with retrieved records."""
+
+    @classmethod
+    def setUpTestData(cls):
+        geumsan = Region.objects.create(code='44710', province='충청남도', name='금산군', short_name='금산')
+        cls.ginseng = Crop.objects.create(name_ko='인삼', name_en='Ginseng', plant_part='뿌리',
+                                          origin='금산', region=geumsan)
+        cls.angelica = Crop.objects.create(name_ko='당귀', name_en='Angelica', plant_part='뿌리', origin='평창')
+        Compound.objects.create(crop=cls.ginseng, name='Ginsenoside Rb1', annotation_level='L1', source='IN-HOUSE',
+                                score=95, qc_status='PASS', compound_class='Saponin')
+        cls.decursin = Compound.objects.create(crop=cls.angelica, name='Decursin', annotation_level='L1',
+                                               source='IN-HOUSE', score=91, qc_status='PASS',
+                                               compound_class='Coumarin', molecular_weight=328.36)
+        EnvironmentData.objects.create(region=geumsan, region_name='충남 금산군', period=date(2025, 1, 1),
+                                       avg_temperature=12.8, avg_rainfall=1150, soil_grade='A')
+
+    def setUp(self):
+        self.server = FakeLLMServer(latency=0).start()
+        ai_service.configure(api_key='test', base_url=self.server.base_url)
+
+    def tearDown(self):
+        ai_service.configure()
+        self.server.stop()
+
+    async def post(self, name, body):
+        return await self.async_client.post(reverse(name), body, content_type='application/json')
+
+    def prompt(self):
+        return '\n'.join(m['content'] for m in self.server.last_request['messages'])
+
+    async def test_interpret_by_id(self):
+        response = await self.post('api_interpret_compound', {'compound_id': self.decursin.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('"molecular_weight": 328.36', self.prompt())
+        self.assertEqual((await self.post('api_interpret_compound', {'compound_id': 0})).status_code, 404)
+        self.assertEqual((await self.post('api_interpret_compound', {'compound_id': '1'})).status_code, 400)
+
+        response = await self.post('api_interpret_dashboard', {'crop_a_id': self.ginseng.pk,
+                                                               'crop_b_id': self.angelica.pk})
+        await ai_service.aclose()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Ginsenoside Rb1', self.prompt())
+        self.assertIn('Decursin', self.prompt())
+        self.assertIn('1150', self.prompt())
+        # Same payload, and so the same cache entry, as the dashboard page's own data.
+        page = await sync_to_async(self.client.get)(reverse('public_dashboard'), {'crop_a': '인삼', 'crop_b': '당귀'})
+        self.assertIn(f'"crop_a_id": {self.ginseng.pk}', page.content.decode())
+
+    async def test_chat_grounding(self):
+        await self.post('api_chat', {'message': '당귀의 decursin 함량은?'})
+        sent = self.server.last_request['messages']
+        self.assertTrue(sent[-2]['content'].startswith(rag.CONTEXT_HEADER))
+        self.assertIn('성분 Decursin: 당귀(Angelica)', sent[-2]['content'])
+        self.assertNotIn('Ginsenoside', sent[-2]['content'])
+
+        await self.post('api_chat', {'message': '금산 기후는 어떤가요?'})
+        self.assertIn('환경 충청남도 금산군 2025-01', self.prompt())
+
+        # The index is rebuilt for the new data version.
+        await Compound.objects.acreate(crop=self.angelica, name='Nodakenin', annotation_level='L2',
+                                       source='IN-HOUSE', score=80, qc_status='PASS')
+        await self.post('api_chat', {'messages': [{'role': 'user', 'content': 'nodakenin?'}]})
+        self.assertIn('성분 Nodakenin', self.prompt())
+
+        await self.post('api_chat', {'message': '안녕하세요'})
+        await ai_service.aclose()
+        self.assertNotIn(rag.CONTEXT_HEADER, self.prompt())
+
+
+class ImportTests(TestCase):
+    """import_compounds: upserts on the natural keys, so re-imports update rows instead of adding them."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def run_import(self, name, text, *args):
+        path = Path(self.tmp.name) / name
+        path.write_text(text, encoding='utf-8')
+        call_command('import_compounds', str(path), *args, stdout=io.StringIO())
+
+    def test_upsert(self):
+        header = 'crop,crop_en,part,origin,year,compound,score,class\n'
+        self.run_import('a.csv', header + '인삼,Ginseng,뿌리,금산,2025,Ginsenoside Rb1,90,Saponin\n'
+                                          '인삼,Ginseng,뿌리,금산,2025,Ginsenoside Rg1,80,Saponin\n')
+        self.run_import('a.csv', header + '인삼,Ginseng,뿌리,금산,2025,Ginsenoside Rb1,70,Saponin\n'
+                                          '인삼,Ginseng,뿌리,금산,2025,Ginsenoside Rb1,95,Saponin\n'
+                                          '인삼,Ginseng,뿌리,금산,2025,Ginsenoside Re,60,Saponin\n')
+        self.assertEqual(Crop.objects.count(), 1)
+        scores = dict(Compound.objects.values_list('name', 'score'))
+        # The later of two rows for one key wins.
+        self.assertEqual(scores, {'Ginsenoside Rb1': 95, 'Ginsenoside Rg1': 80, 'Ginsenoside Re': 60})
+        self.assertEqual(CropSummary.objects.get().compound_count, 3)
+
+    def test_msp_spectra(self):
+        msp = ('Name: Decursin\nPrecursorMZ: 329.1384\nPrecursor_type: [M+H]+\nNum Peaks: 2\n'
+               '229.0495 100\n147.0441 35\n\n'
+               'Name: Nodakenin\nPrecursorMZ: 409.1493\nPrecursor_type: [M+H]+\nNum Peaks: 1\n247.0965 100\n')
+        for _ in range(2):
+            self.run_import('a.msp', msp, '--crop', '당귀', '--part', '뿌리', '--origin', '평창')
+        self.assertEqual(Compound.objects.count(), 2)
+        self.assertEqual(Spectrum.objects.count(), 2)
+        self.assertEqual(Spectrum.objects.get(compound__name='Decursin').num_peaks, 2)
+
+    def test_partial_reimport(self):
+        self.run_import('a.csv', 'crop,part,origin,year,compound,score,qc,class,level\n'
+                                 '당귀,뿌리,평창,2025,Decursin,91,PASS,Coumarin,L1\n')
+        self.run_import('a.msp', 'Name: Decursin\nPrecursorMZ: 329.1384\nNum Peaks: 1\n229.0495 100\n',
+                        '--crop', '당귀', '--part', '뿌리', '--origin', '평창')
+        compound = Compound.objects.get()
+        # The MSP carries none of these fields, so the CSV's values survive.
+        self.assertEqual((compound.score, compound.qc_status, compound.compound_class, compound.annotation_level),
+                         (91, 'PASS', 'Coumarin', 'L1'))
+        self.assertEqual(compound.spectra.count(), 1)
+
+    def test_stale_checkpoint(self):
+        header = 'crop,part,origin,compound,score\n'
+        with self.assertRaisesRegex(CommandError, 'row 2'):
+            self.run_import('a.csv', header + '인삼,뿌리,금산,A,1\n인삼,뿌리,금산,B,inf\n', '--batch-size', '1')
+        # The file changed since the checkpoint was written, so --resume starts over.
+        self.run_import('a.csv', header + '인삼,뿌리,금산,A,5\n인삼,뿌리,금산,B,6\n', '--resume')
+        self.assertEqual(dict(Compound.objects.values_list('name', 'score')), {'A': 5, 'B': 6})
+
+    def test_malformed_input(self):
+        with self.assertRaisesRegex(CommandError, 'row 2: line 8'):
+            self.run_import('bad.msp', 'Name: A\nPrecursorMZ: 100\nNum Peaks: 1\n50 1\n\n'
+                                       'Name: B\nNum Peaks: 1\n50 x\n', '--crop', '당귀', '--part', '뿌리',
+                            '--origin', '평창')
+        with self.assertRaisesRegex(CommandError, 'row 1: line 2'):
+            self.run_import('bad.msp', 'Name: A\nNum Peaks: many\n', '--crop', '당귀', '--part', '뿌리',
+                            '--origin', '평창')
+        with self.assertRaisesRegex(CommandError, 'row 2: not a finite number'):
+            self.run_import('bad.csv', 'crop,part,origin,compound,score\n인삼,뿌리,금산,A,1\n인삼,뿌리,금산,B,inf\n')
+
+
+class AICacheTests(TestCase):
+    """ai_cache: one upstream call per key however many callers miss at once; TTL and LRU limits."""
+
+    async def test_async_coalescing(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'one_line_summary': '해석'}
+
+        results = await asyncio.gather(*[ai_cache.aget_or_compute('k' * 64, 'compound', compute) for _ in range(5)])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'one_line_summary': '해석'}] * 5)
+        self.assertEqual(await sync_to_async(ai_cache.get)('k' * 64), {'one_line_summary': '해석'})
+
+    def test_thread_coalescing(self):
+        calls, results = [], []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return {'one_line_summary': '해석'}
+
+        # Storage is the database; the single-flight logic is what is under test here.
+        with mock.patch.object(ai_cache, 'get', return_value=None), mock.patch.object(ai_cache, 'put'):
+            threads = [threading.Thread(target=lambda: results.append(ai_cache.get_or_compute('k', 'compound', compute)))
+                       for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            while not calls:
+                time.sleep(0.01)
+            time.sleep(0.05)  # the others reach the in-flight call and wait on it
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'one_line_summary': '해석'}] * 5)
+        self.assertEqual(ai_cache._inflight, {})
+
+    def test_expiry_and_eviction(self):
+        ai_cache.put('a', 'compound', {'v': 1})
+        AICacheEntry.objects.filter(key='a').update(created_at=timezone.now() - timedelta(days=30))
+        with self.settings(AI_CACHE_TTL=3600):
+            self.assertIsNone(ai_cache.get('a'))
+            self.assertEqual(ai_cache.get('a', stale=True), {'v': 1})
+            self.assertEqual(ai_cache.get_or_compute('a', 'compound', lambda: {'v': 2}), {'v': 2})
+            self.assertEqual(ai_cache.get('a'), {'v': 2})
+
+        with self.settings(AI_CACHE_MAX_ENTRIES=2):
+            AICacheEntry.objects.filter(key='a').update(accessed_at=timezone.now() - timedelta(days=1))
+            ai_cache.put('b', 'compound', {'v': 1})
+            ai_cache.put('c', 'compound', {'v': 1})
+        self.assertEqual(sorted(AICacheEntry.objects.values_list('key', flat=True)), ['b', 'c'])
+
+
+class AsyncClientTests(SimpleTestCase):
+    """ai_service: one async client per event loop, keeping its upstream connections alive."""
+
+    def setUp(self):
+        self.server = FakeLLMServer(latency=0.02).start()
+        ai_service.configure(api_key='test', base_url=self.server.base_url)
+
+    def tearDown(self):
+        ai_service.configure()
+        self.server.stop()
+
+    async def test_client_reuse(self):
+        client, _ = ai_service._loop_resources()
+        self.assertIs(ai_service._loop_resources()[0], client)
+        for _ in range(5):
+            self.assertIn('content', await ai_service.achat_completion([{'role': 'user', 'content': 'hi'}]))
+        self.assertEqual(self.server.connections, 1)
+
+        results = await asyncio.gather(*[ai_service.achat_completion([{'role': 'user', 'content': 'hi'}])
+                                         for _ in range(8)])
+        self.assertTrue(all('content' in result for result in results))
+        self.assertGreater(self.server.peak_in_flight, 1)
+        self.assertLessEqual(self.server.connections, 8)
+        await ai_service.aclose()
+
+    def test_cap_across_loops(self):
+        """Under WSGI each request runs on its own loop; AI_MAX_CONCURRENCY still caps upstream calls."""
+        with self.settings(AI_MAX_CONCURRENCY=2):
+            ai_service.configure(api_key='test', base_url=self.server.base_url)
+        results = []
+
+        async def request():
+            try:
+                results.append(await ai_service.achat_completion([{'role': 'user', 'content': 'hi'}]))
+            finally:
+                await ai_service.aclose()
+
+        threads = [threading.Thread(target=asyncio.run, args=(request(),)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all('content' in result for result in results))
+        self.assertEqual(len(results), 6)
+        self.assertLessEqual(self.server.peak_in_flight, 2)
+
+    def test_transport(self):
+        from groq import DefaultAioHttpClient
+
+        async def http_client():
+            client = ai_service._make_async_client()
+            await client.close()
+            return client._client
+
+        self.assertIsInstance(asyncio.run(http_client()), DefaultAioHttpClient)
+        with mock.patch('importlib.util.find_spec', return_value=None):
+            self.assertNotIsInstance(asyncio.run(http_client()), DefaultAioHttpClient)
+        # Separate loops get separate clients.
+        self.assertIsNot(asyncio.run(self._client()), asyncio.run(self._client()))
+
+    async def _client(self):
+        client = ai_service._loop_resources()[0]
+        await ai_service.aclose()
+        return client
+
+
+class ChatStreamTests(SimpleTestCase):
+    """Streaming chat: a client disconnect closes the upstream stream instead of reading it to the end."""
+
+    async def test_disconnect_closes_upstream(self):
+        server = FakeLLMServer(latency=0, reply='토큰' * 200, token_interval=0.02).start()
+        ai_service.configure(api_key='test', base_url=server.base_url)
+        try:
+            received = asyncio.Event()
+
+            async def client():
+                async with aclosing(views._chat_events([{'role': 'user', 'content': '인삼'}])) as events:
+                    async for event in events:
+                        received.set()
+
+            task = asyncio.ensure_future(client())
+            await asyncio.wait_for(received.wait(), 5)
+            self.assertEqual(server.in_flight, 1)
+            task.cancel()  # what the ASGI handler does when the client goes away
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            for _ in range(50):
+                if not server.in_flight:
+                    break
+                await asyncio.sleep(0.02)
+            # The full reply would take about 8 s to stream.
+            self.assertEqual(server.in_flight, 0)
+            await ai_service.aclose()
+        finally:
+            ai_service.configure()
+            server.stop()
+
+
+@mock.patch.object(jobs, 'BACKOFF_BASE', 0.01)
+class JobQueueTests(TestCase):
+    """The batch queue: throttled items are deferred a bounded number of times, expired leases are requeued."""
+
+    @classmethod
+    def setUpTestData(cls):
+        crop = Crop.objects.create(name_ko='당귀', name_en='Angelica', plant_part='뿌리', origin='평창')
+        cls.compounds = [Compound.objects.create(crop=crop, name=name, annotation_level='L1', source='IN-HOUSE',
+                                                 score=90, qc_status='PASS')
+                         for name in ['Decursin', 'Nodakenin', 'Umbelliferone']]
+
+    def setUp(self):
+        resilience.breaker.reset()
+        self.server = FakeLLMServer(latency=0).start()
+        ai_service.configure(api_key='test', base_url=self.server.base_url)
+
+    def tearDown(self):
+        ai_service.configure()
+        self.server.stop()
+        resilience.breaker.reset()
+
+    @override_settings(AI_JOB_MAX_DEFERRALS=3)
+    def test_deferrals_are_capped(self):
+        job = jobs.enqueue([self.compounds[0].pk])
+        item = job.items.get()
+        for _ in range(2):
+            self.assertTrue(jobs.retry(item, 'RateLimitError', delay=0, count_attempt=False))
+            item.refresh_from_db()
+            self.assertEqual((item.status, item.attempts), (AIJobItem.PENDING, 0))
+        self.assertFalse(jobs.retry(item, 'RateLimitError', delay=0, count_attempt=False))
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.deferrals, item.attempts), (AIJobItem.FAILED, 3, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, job.DONE)
+
+    def test_release_stale(self):
+        job = jobs.enqueue([c.pk for c in self.compounds[:2]])
+        stale, live = job.items.order_by('id')
+        job.items.update(status=AIJobItem.RUNNING, locked_at=timezone.now())
+        AIJobItem.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - jobs.LEASE - timedelta(seconds=1))
+        self.assertEqual(jobs.release_stale(), 1)
+        self.assertEqual(dict(job.items.values_list('id', 'status')),
+                         {stale.pk: AIJobItem.PENDING, live.pk: AIJobItem.RUNNING})
+
+    @mock.patch.object(run_ai_worker, 'DEFAULT_RATE_LIMIT_PAUSE', 0.01)
+    async def test_worker(self):
+        """A 429 defers one item without spending an attempt; an item left running by a dead worker is picked up."""
+        job = await sync_to_async(jobs.enqueue)([c.pk for c in self.compounds])
+        stale = await job.items.order_by('id').afirst()
+        await AIJobItem.objects.filter(pk=stale.pk).aupdate(
+            status=AIJobItem.RUNNING, locked_at=timezone.now() - jobs.LEASE - timedelta(seconds=1))
+        self.server.fail(1, status=429)
+        command = run_ai_worker.Command(stdout=io.StringIO(), stderr=io.StringIO())
+        command.ok = command.failed = 0
+        await command.run(concurrency=1, poll=0.01, once=True)
+
+        self.assertEqual((command.ok, command.failed), (3, 0))
+        items = [item async for item in job.items.order_by('id')]
+        self.assertEqual([item.status for item in items], [AIJobItem.DONE] * 3)
+        self.assertEqual(sum(item.deferrals for item in items), 1)
+        self.assertEqual(sum(item.attempts for item in items), 0)
+        self.assertIn('재등록', command.stdout.getvalue())
+        self.assertIn('요청 한도 초과', command.stderr.getvalue())
+
+    @override_settings(AI_JOB_MAX_DEFERRALS=1)
+    @mock.patch.object(run_ai_worker, 'DEFAULT_RATE_LIMIT_PAUSE', 0.01)
+    async def test_worker_counts_deferral_failures(self):
+        job = await sync_to_async(jobs.enqueue)([self.compounds[0].pk])
+        self.server.fail(1, status=429)
+        command = run_ai_worker.Command(stdout=io.StringIO(), stderr=io.StringIO())
+        command.ok = command.failed = 0
+        await command.run(concurrency=1, poll=0.01, once=True)
+
+        self.assertEqual((command.ok, command.failed), (0, 1))
+        self.assertEqual((await job.items.aget()).status, AIJobItem.FAILED)
+        self.assertIn('1회 연기 후 실패', command.stderr.getvalue())
+
+
+class SpectralSearchTests(TestCase):
+    """Library search scoring and validation of the request tolerances."""
+
+    peaks = [[105.07, 30.0], [147.04, 100.0], [229.09, 55.0], [311.13, 12.0]]
+
+    @classmethod
+    def setUpTestData(cls):
+        crop = Crop.objects.create(name_ko='당귀', name_en='Angelica', plant_part='뿌리', origin='평창')
+        mz, intensity = zip(*cls.peaks)
+        # The same fragments at two precursors: only the first is within the default cosine window.
+        cls.spectra = [Spectrum.objects.create(
+            compound=Compound.objects.create(crop=crop, name=name, annotation_level='L1', source='IN-HOUSE',
+                                             score=90, qc_status='PASS'),
+            precursor_mz=precursor, precursor_type='[M+H]+', num_peaks=len(mz),
+            mz=spectra.pack(mz), intensity=spectra.pack(intensity))
+            for name, precursor in [('Decursin', 329.14), ('Decursinol angelate', 379.14)]]
+
+    def setUp(self):
+        bump_data_version()
+
+    def search(self, **body):
+        return self.client.post(reverse('api_spectra_search'), {'precursor_mz': 329.14, 'peaks': self.peaks, **body},
+                                content_type='application/json')
+
+    def test_self_match(self):
+        response = self.search()
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['spectrum_id'] for r in results], [self.spectra[0].pk])
+        self.assertEqual(results[0]['score'], 1.0)
+        self.assertEqual(results[0]['matched_peaks'], len(self.peaks))
+
+    def test_precursor_filter(self):
+        self.assertEqual(self.search().json()['candidates'], 1)
+        response = self.search(precursor_tolerance=60)
+        self.assertEqual(response.json()['candidates'], 2)
+        self.assertEqual({r['spectrum_id'] for r in response.json()['results']}, {s.pk for s in self.spectra})
+        self.assertEqual(len(self.search(method='modified_cosine').json()['results']), 2)
+
+    def test_invalid_tolerance(self):
+        for body in [{'tolerance': 0}, {'tolerance': -0.02}, {'tolerance': 1e-6},
+                     {'precursor_tolerance': 0}, {'precursor_tolerance': -1}]:
+            with self.subTest(body=body):
+                response = self.search(**body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('at least', response.json()['error'])
+        for raw in ['Infinity', 'NaN']:
+            with self.subTest(tolerance=raw):
+                response = self.client.post(reverse('api_spectra_search'),
+                                            f'{{"precursor_mz": 329.14, "peaks": [[105.0, 1], [147.0, 2]], '
+                                            f'"tolerance": {raw}}}', content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        with mock.patch.object(spectra, 'MAX_TABLE_BINS', 1000):
+            response = self.search(tolerance=0.01)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('too small', response.json()['error'])
+        response = self.search(peaks=[[105.07, 30.0], [float('nan'), 1.0]])
+        self.assertEqual(response.status_code, 400)
+
+
+class MassLookupTests(TestCase):
+    """Mass / RT lookup parsing, the per-query RT filter and closest-first capping."""
+
+    @classmethod
+    def setUpTestData(cls):
+        crop = Crop.objects.create(name_ko='인삼', name_en='Ginseng', plant_part='뿌리', origin='금산')
+        for name, mass, rt in [('Lighter', 299.9995, 10.0), ('Closer', 300.0002, 20.0), ('Far', 300.5, 10.0)]:
+            Compound.objects.create(crop=crop, name=name, annotation_level='L1', source='IN-HOUSE', score=90,
+                                    qc_status='PASS', molecular_weight=mass, retention_time=rt)
+
+    def setUp(self):
+        bump_data_version()
+
+    def post(self, body):
+        return self.client.post(reverse('api_mass_lookup'), body, content_type='application/json')
+
+    def test_closest_first(self):
+        response = self.client.get(reverse('api_mass_lookup'), {'mz': 300.0})
+        self.assertEqual([m['name'] for m in response.json()['results']], ['Closer', 'Lighter'])
+        with mock.patch.object(views, 'MASS_MAX_MATCHES', 1):
+            response = self.post({'queries': [{'mz': 300.0}]})
+        self.assertEqual([m['name'] for m in response.json()['results'][0]['matches']], ['Closer'])
+
+    def test_limit(self):
+        """Clipped windows return the same closest matches as a full expansion."""
+        rng = np.random.default_rng(7)
+        mass = np.sort(rng.uniform(299, 301, 5000))
+        index = mass_index.MassIndex(np.arange(len(mass)), mass, np.full(len(mass), np.nan), [''] * len(mass),
+                                     [''] * len(mass))
+        mz = [299.5, 300.0, 300.9]
+        query, _, match, _ = index.lookup(mz, tolerance=1, unit='da', adducts=['M', '[M+H]+'])
+        clipped_query, _, clipped_match, _ = index.lookup(mz, tolerance=1, unit='da', adducts=['M', '[M+H]+'],
+                                                          limit=5)
+        self.assertEqual(clipped_query.tolist(), [0] * 5 + [1] * 5 + [2] * 5)
+        for q in range(len(mz)):
+            self.assertEqual(clipped_match[clipped_query == q].tolist(), match[query == q][:5].tolist())
+
+    def test_rt_tolerance(self):
+        response = self.post({'queries': [{'mz': 300.0, 'rt': 10.2}, {'mz': 300.0}], 'rt_tolerance': 0.5})
+        results = response.json()['results']
+        self.assertEqual([m['name'] for m in results[0]['matches']], ['Lighter'])
+        # A query without an rt is matched on mass alone.
+        self.assertEqual([m['name'] for m in results[1]['matches']], ['Closer', 'Lighter'])
+
+    def test_invalid_input(self):
+        for body in ['[{"mz": 300.0}]', '{"queries": [{"mz": NaN}]}', '{"queries": [{"mz": Infinity}]}',
+                     '{"queries": [[300.0]]}', '{"queries": [{"mz": 300.0, "rt": NaN}], "rt_tolerance": 1}',
+                     '{"queries": [{"mz": 300.0}], "tolerance": 0}', '{"queries": [{"mz": 0}]}',
+                     '{"queries": [{"mz": 300.0}], "tolerance": 101}',
+                     '{"queries": [{"mz": 300.0}], "tolerance": 1.5, "unit": "da"}']:
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        for mz in ['nan', 'inf', 'x', '-300']:
+            with self.subTest(mz=mz):
+                self.assertEqual(self.client.get(reverse('api_mass_lookup'), {'mz': mz}).status_code, 400)
+
+
+class CompoundApiTests(TestCase):
+    """Keyset paging of /api/compounds/ in both layouts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ginseng = Crop.objects.create(name_ko='인삼', name_en='Ginseng', plant_part='뿌리', origin='금산', year=2025)
+        angelica = Crop.objects.create(name_ko='당귀', name_en='Angelica', plant_part='뿌리', origin='평창', year=2024)
+        # Tied scores exercise the id tie-break of the cursor.
+        for i, score in enumerate([95, 90, 90, 90, 80, 70, 70]):
+            Compound.objects.create(crop=(ginseng, angelica)[i % 2], name=f'Compound {i}', annotation_level='L1',
+                                    source='IN-HOUSE', score=score, qc_status='PASS',
+                                    compound_class=('Saponin', 'Coumarin')[i % 2], molecular_weight=300 + i)
+        cls.expected = list(Compound.objects.order_by('-score', 'id').values_list('id', flat=True))
+
+    def pages(self, **params):
+        cursor, pages = '', []
+        while cursor is not None:
+            response = self.client.get(reverse('api_compounds'), {'limit': 2, 'cursor': cursor, **params})
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            cursor = pages[-1]['next_cursor']
+        return pages
+
+    def test_cursor_round_trip(self):
+        pages = self.pages()
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 2, 1])
+        self.assertEqual([c['id'] for page in pages for c in page['results']], self.expected)
+
+    def test_columns(self):
+        objects = [c for page in self.pages() for c in page['results']]
+        pages = self.pages(format='columns')
+        self.assertEqual([page['count'] for page in pages], [2, 2, 2, 1])
+        decoded = []
+        for page in pages:
+            columns, dicts, crops = page['columns'], page['dicts'], page['crops']
+            for i in range(page['count']):
+                crop = columns['crop'][i]
+                decoded.append({
+                    'id': columns['id'][i], 'name': columns['name'][i], 'score': columns['score'][i],
+                    'mw': columns['mw'][i], 'class': dicts['class'][columns['class'][i]],
+                    'qc': dicts['qc'][columns['qc'][i]], 'crop': crops['name'][crop], 'year': crops['year'][crop],
+                })
+        self.assertEqual(decoded, [{key: c[key] for key in decoded[0]} for c in objects])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('api_compounds'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OriginModelTests(TestCase):
+    """Origin model training, leave-one-out accuracy and prediction input checks."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Two origins told apart by which of Schisandrin / Gomisin A dominates.
+        for place, (first, second) in [('문경', (90, 20)), ('장수', (20, 90))]:
+            for year, noise in [(2021, 0), (2022, 3), (2023, -3)]:
+                crop = Crop.objects.create(name_ko='오미자', name_en='Schisandra', plant_part='열매',
+                                           origin=place, year=year)
+                for name, score in [('Schisandrin', first + noise), ('Gomisin A', second - noise),
+                                    ('Citral', 50 + noise)]:
+                    Compound.objects.create(crop=crop, name=name, annotation_level='L2', source='IN-HOUSE',
+                                            score=score, qc_status='PASS')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = self.settings(ORIGIN_MODEL_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(origin._models.clear)
+
+    def predict(self, body):
+        return self.client.post(reverse('api_origin_predict'), {'crop': '오미자', **body},
+                                content_type='application/json')
+
+    def test_train_and_predict(self):
+        meta = origin.train('오미자', n_components=2, n_neighbors=3)
+        self.assertEqual(meta['classes'], ['문경', '장수'])
+        self.assertEqual(meta['loo_accuracy'], 1.0)
+        response = self.predict({'samples': [{'id': 's1', 'profile': {'Schisandrin': 25, 'Gomisin A': 85}}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['predictions'][0]['origin'], '장수')
+        response = self.predict({'features': ['Gomisin A', 'Schisandrin', 'Unknown'],
+                                 'samples': [{'id': 's2', 'values': [15, 88, 1]}]})
+        self.assertEqual(response.json()['predictions'][0]['origin'], '문경')
+
+    def test_loo_refits_each_fold(self):
+        """Each sample is predicted by scaling and PCA fitted without it, not by the full model."""
+        rng = np.random.default_rng(3)
+        X, labels = rng.normal(size=(12, 30)).astype(np.float32), np.repeat([0, 1], 6)
+        correct = 0
+        for i in range(len(X)):
+            rest = np.arange(len(X)) != i
+            arrays, _ = origin.fit(X[rest], labels[rest], n_components=2)
+            point = ((X[i] - arrays['mean']) / arrays['scale']) @ arrays['components'].T
+            nearest = np.linalg.norm(arrays['train_scores'] - point, axis=1).argmin()
+            correct += arrays['train_labels'][nearest] == labels[i]
+        self.assertAlmostEqual(origin._loo_accuracy(X, labels, n_components=2, k=1), correct / len(X))
+        self.assertIsNone(origin._loo_accuracy(X[:7], labels[:7], n_components=2, k=1))
+
+    def test_retrain_keeps_previous_version(self):
+        for _ in range(3):
+            origin.train('오미자')
+        pointer = next(Path(self.tmp.name).glob('*.json'))
+        meta = json.loads(pointer.read_text())
+        versions = sorted(path.name for path in Path(self.tmp.name).iterdir() if path.is_dir())
+        self.assertEqual(len(versions), 2)
+        self.assertEqual(versions[-1], meta['version'])
+        # A load racing retrains that removed the version it read retries with the new pointer.
+        model = origin.OriginModel.load(meta)
+        with mock.patch.object(origin.OriginModel, 'load', side_effect=[FileNotFoundError(), model]):
+            self.assertIs(origin.get_model('오미자'), model)
+
+    def test_non_finite_values(self):
+        origin.train('오미자')
+        for body in ['{"crop": "오미자", "samples": [{"profile": {"Schisandrin": NaN}}]}',
+                     '{"crop": "오미자", "samples": [{"profile": {"Citral": Infinity}}]}',
+                     '{"crop": "오미자", "samples": [{"profile": {"Citral": 1e300}}]}',
+                     '{"crop": "오미자", "features": ["Citral"], "samples": [{"values": [NaN]}]}']:
+            with self.subTest(body=body):
+                response = self.client.post(reverse('api_origin_predict'), body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('finite', response.json()['error'])
+
+
+class CropSummaryTests(TransactionTestCase):
+    """Summaries follow compound saves and deletes, with one refresh per crop per transaction."""
+
+    def setUp(self):
+        self.crop = Crop.objects.create(name_ko='인삼', name_en='Ginseng', plant_part='뿌리', origin='금산')
+        summaries.flush()
+
+    def add(self, name, score, level='L1'):
+        return Compound.objects.create(crop=self.crop, name=name, annotation_level=level, source='IN-HOUSE',
+                                       score=score, qc_status='PASS', compound_class='Saponin')
+
+    def summary(self):
+        return CropSummary.objects.get(crop=self.crop)
+
+    def test_insert_update_delete(self):
+        with transaction.atomic():
+            rb1, rg1 = self.add('Ginsenoside Rb1', 90), self.add('Ginsenoside Rg1', 70, 'L2')
+        summary = self.summary()
+        self.assertEqual((summary.compound_count, summary.score_avg, summary.l2_count), (2, 80, 1))
+        self.assertEqual([c['name'] for c in summary.compounds], ['Ginsenoside Rb1', 'Ginsenoside Rg1'])
+
+        rg1.score = 95
+        rg1.save()
+        summary = self.summary()
+        self.assertEqual((summary.score_max, summary.compounds[0]['name']), (95, 'Ginsenoside Rg1'))
+
+        rb1.delete()
+        summary = summaries.summaries_by_id([self.crop.pk])[self.crop.pk].summary
+        self.assertEqual((summary.compound_count, summary.score_min, summary.l1_count), (1, 95, 0))
+
+    def test_coalesced(self):
+        with mock.patch.object(summaries, 'refresh', wraps=summaries.refresh) as refresh:
+            with transaction.atomic():
+                for i in range(3):
+                    self.add(f'Compound {i}', 80 + i)
+                refresh.assert_not_called()
+            refresh.assert_called_once_with({self.crop.pk})
+            self.assertEqual(self.summary().compound_count, 3)
+
+            # Autocommit saves (scripts, commands, the worker) refresh right away.
+            refresh.reset_mock()
+            self.add('Compound 3', 83)
+            refresh.assert_called_once_with({self.crop.pk})
+            self.assertEqual(self.summary().compound_count, 4)
+
+
+class ExportTests(TestCase):
+    """Data packages read back in each format, the manifest hash, and the package cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        geumsan = Region.objects.create(code='44710', province='충청남도', name='금산군', short_name='금산')
+        crop = Crop.objects.create(name_ko='인삼', name_en='Ginseng', name_scientific='Panax ginseng',
+                                   plant_part='뿌리', origin='금산', region=geumsan, year=2025)
+        for name, score, rt in [('Ginsenoside Rb1', 95, 12.5), ('Ginsenoside "Rg1", major', 88, None)]:
+            Compound.objects.create(crop=crop, name=name, annotation_level='L1', source='IN-HOUSE', score=score,
+                                    qc_status='PASS', compound_class='Saponin', retention_time=rt)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = self.settings(EXPORT_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def package(self, fmt):
+        response = self.client.get(reverse('api_export'), {'format': fmt})
+        self.assertEqual(response.status_code, 200)
+        return response, zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def rows(self, fmt, data):
+        if fmt == 'csv':
+            header, *rows = csv.reader(io.StringIO(data.decode('utf-8-sig')))
+            self.assertEqual(header, export.NAMES)
+            return [dict(zip(header, row)) for row in rows]
+        if fmt == 'jsonl':
+            return [json.loads(line) for line in data.decode().splitlines()]
+        return export.pq.read_table(io.BytesIO(data)).to_pylist()
+
+    def test_round_trip(self):
+        for fmt in export.FORMATS:
+            if fmt == 'parquet' and export.pa is None:
+                continue
+            with self.subTest(format=fmt):
+                _, package = self.package(fmt)
+                meta = json.loads(package.read('datapackage.json'))
+                resource = meta['resources'][0]
+                data = package.read(resource['path'])
+                self.assertEqual(resource['hash'], f'sha256:{hashlib.sha256(data).hexdigest()}')
+                self.assertEqual(meta['row_count'], 2)
+                rows = self.rows(fmt, data)
+                self.assertEqual([r['name'] for r in rows], ['Ginsenoside Rb1', 'Ginsenoside "Rg1", major'])
+                self.assertEqual({r['region_code'] for r in rows}, {'44710'})
+                if fmt != 'csv':
+                    self.assertEqual([(r['score'], r['retention_time']) for r in rows], [(95, 12.5), (88, None)])
+
+    def test_cache(self):
+        first, _ = self.package('jsonl')
+        body = (Path(self.tmp.name) / f"{first['X-Export-Key']}.zip").read_bytes()
+        second = self.client.get(reverse('api_export'), {'format': 'jsonl'})
+        self.assertIsInstance(second, FileResponse)
+        self.assertEqual(second['X-Export-Key'], first['X-Export-Key'])
+        self.assertEqual(b''.join(second.streaming_content), body)
+        second.close()
+        # A write moves the data version, so the package is rebuilt.
+        Compound.objects.filter(name='Ginsenoside Rb1').update(score=96)
+        bump_data_version()
+        third, package = self.package('jsonl')
+        self.assertNotEqual(third['X-Export-Key'], first['X-Export-Key'])
+        self.assertIn('"score": 96', package.read('compounds.jsonl').decode())
+
+    def test_parquet_without_pyarrow(self):
+        with mock.patch.object(export, 'pa', None):
+            response = self.client.get(reverse('api_export'), {'format': 'parquet'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pyarrow', response.json()['error'])
+
+
+class LogQueueTests(SimpleTestCase):
+    """Records queued for the listener thread reach the file when logging shuts down."""
+
+    SCRIPT = """
+import logging, sys, time
+from core import logs
+
+class SlowHandler(logging.FileHandler):
+    def emit(self, record):
+        time.sleep(0.01)
+        super().emit(record)
+
+handler = SlowHandler(sys.argv[1], encoding='utf-8')
+handler.setFormatter(logs.JSONFormatter())
+logger = logging.getLogger('core.test_shutdown')
+logger.propagate = False
+logger.handlers = [logs.queue_handlers([handler]).handler]
+for i in range(50):
+    logger.warning('record %d', i, extra={'n': i})
+"""
+
+    def test_flushed_at_exit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'out.jsonl'
+            # The script exits right after queueing; the atexit hook must drain the queue.
+            subprocess.run([sys.executable, '-c', self.SCRIPT, str(path)], check=True, timeout=30,
+                           cwd=Path(__file__).resolve().parent.parent)
+            records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+        self.assertEqual([r['n'] for r in records], list(range(50)))
+        self.assertEqual(records[-1]['msg'], 'record 49')
+
+    def test_stop_drains(self):
+        handler = logging.handlers.BufferingHandler(capacity=1000)
+        pipeline = logs._Pipeline([handler])
+        logger = logging.getLogger('core.test_stop')
+        logger.propagate = False
+        logger.handlers = [pipeline.handler]
+        self.addCleanup(setattr, logger, 'handlers', [])
+        for i in range(100):
+            logger.warning('record %d', i)
+        pipeline.stop()
+        self.assertEqual([r.msg for r in handler.buffer], [f'record {i}' for i in range(100)])
@@ -0,0 +1,267 @@
+"""Admission control for the AI endpoints.
+
+Two checks run before a view calls the LLM:
+
+- A token bucket per (endpoint, client IP). A client may spend a burst of
+  AI_RATE_LIMIT_BURST calls, refilled at AI_RATE_LIMIT_PER_MINUTE. Beyond
+  that it gets 429 with Retry-After set to when the next token is due.
+- A global gate of AI_ADMISSION_CONCURRENCY requests in flight per process
+  (shared by every event loop, so it holds under WSGI as well as ASGI).
+  Up to AI_ADMISSION_QUEUE more may wait AI_ADMISSION_WAIT seconds for a
+  slot. Any request beyond that, or one that waited too long, gets 503 at
+  once instead of tying up the server.
+
+Buckets live in this process by default, so each worker enforces its own
+limit. With AI_RATE_LIMIT_DB they are kept in a small SQLite file shared by
+every worker on the host.
+"""
+import asyncio
+import logging
+import math
+import sqlite3
+import threading
+import time
+import weakref
+from collections import deque
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import metrics
+from .http import LRU, client_ip
+
+logger = logging.getLogger('core')
+
+
+class MemoryBuckets:
+    """Token buckets in this process; the least recently used clients are forgotten first."""
+
+    def __init__(self, maxsize=100_000):
+        self.buckets = LRU(maxsize)
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst, now=None):
+        """Spend one token; returns 0, or the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.get(key) or (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self.buckets.set(key, (tokens - 1, now))
+                return 0
+            self.buckets.set(key, (tokens, now))
+        return (1 - tokens) / rate
+
+    async def atake(self, key, rate, burst):
+        return self.take(key, rate, burst)
+
+
+class SQLiteBuckets:
+    """Token buckets in a SQLite file, so every worker on the host shares one limit per client."""
+
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL, updated REAL) WITHOUT ROWID'
+    # Refill and spend in one statement; no row comes back when the bucket is empty.
+    TAKE = """INSERT INTO bucket (key, tokens, updated) VALUES (:key, :burst - 1, :now)
+        ON CONFLICT (key) DO UPDATE SET tokens = min(:burst, tokens + (:now - updated) * :rate) - 1, updated = :now
+        WHERE min(:burst, tokens + (:now - updated) * :rate) >= 1
+        RETURNING tokens"""
+
+    # Every this many calls, drop buckets that have refilled completely.
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+        self.calls = 0
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.execute(self.SCHEMA)
+        return conn
+
+    def take(self, key, rate, burst, now=None):
+        # Wall-clock time: monotonic clocks are not comparable across processes.
+        now = time.time() if now is None else now
+        conn = self._connection()
+        self.calls += 1
+        if self.calls % self.PRUNE_EVERY == 0:
+            conn.execute('DELETE FROM bucket WHERE updated < ?', [now - burst / rate])
+        params = {'key': key, 'burst': burst, 'rate': rate, 'now': now}
+        if conn.execute(self.TAKE, params).fetchone():
+            return 0
+        tokens, updated = conn.execute('SELECT tokens, updated FROM bucket WHERE key = ?', [key]).fetchone()
+        return (1 - min(burst, tokens + (now - updated) * rate)) / rate
+
+    async def atake(self, key, rate, burst):
+        return await sync_to_async(self.take, thread_sensitive=False)(key, rate, burst)
+
+
+def _make_buckets():
+    if settings.AI_RATE_LIMIT_DB:
+        return SQLiteBuckets(settings.AI_RATE_LIMIT_DB)
+    return MemoryBuckets()
+
+
+buckets = _make_buckets()
+
+
+class Gate:
+    """At most ``limit`` holders; at most ``queue`` more wait, each for up to ``wait`` seconds.
+
+    One gate serves every event loop and thread in the process: under WSGI each request runs
+    on its own loop, so an asyncio.Semaphore per loop would not cap anything. A released slot
+    is handed to the oldest waiter on that waiter's loop. ``queue=None`` and ``wait=None``
+    wait without limit; such a gate can be held with ``async with``.
+    """
+
+    def __init__(self, limit, queue=None, wait=None):
+        self.limit = limit
+        self.queue = queue
+        self.wait = wait
+        self.held = 0
+        self.waiters = deque()
+        self.lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        return len(self.waiters)
+
+    async def acquire(self):
+        """True once a slot is held; False when the queue is full or the wait times out."""
+        with self.lock:
+            if self.held < self.limit:
+                self.held += 1
+                return True
+            if self.queue is not None and len(self.waiters) >= self.queue:
+                return False
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], self.wait)
+        except BaseException as e:
+            with self.lock:
+                try:
+                    self.waiters.remove(waiter)
+                except ValueError:
+                    # Handed a slot as the wait ended: pass it on.
+                    self._hand_on()
+            if isinstance(e, asyncio.TimeoutError):
+                return False
+            raise
+        return True
+
+    def release(self):
+        with self.lock:
+            self._hand_on()
+
+    def _hand_on(self):
+        while self.waiters:
+            loop, future = self.waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_grant, future)
+                return
+            except RuntimeError:
+                # The waiter's loop has closed.
+                continue
+        self.held -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+def _grant(future):
+    if not future.done():
+        future.set_result(True)
+
+
+_gate = None
+
+
+def gate():
+    """The admission gate shared by every request in this process."""
+    global _gate
+    if _gate is None:
+        _gate = Gate(settings.AI_ADMISSION_CONCURRENCY, settings.AI_ADMISSION_QUEUE, settings.AI_ADMISSION_WAIT)
+    return _gate
+
+
+def _reject(status, retry_after, message):
+    response = JsonResponse({'error': message, 'retry_after': retry_after}, status=status)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class _Slot:
+    """A held gate slot, released once however many paths try."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.owner.release()
+
+
+async def _released_on_close(content, slot):
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        slot.release()
+
+
+def admit(endpoint):
+    """Decorator for async AI views: per-client rate limit, then a slot in the global gate.
+
+    A streaming response holds its slot until the stream ends.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'POST':
+                return await view(request, *args, **kwargs)
+            ip = client_ip(request)
+            if settings.AI_RATE_LIMIT_PER_MINUTE:
+                wait = await buckets.atake(f'{endpoint}:{ip}', settings.AI_RATE_LIMIT_PER_MINUTE / 60,
+                                           settings.AI_RATE_LIMIT_BURST)
+                if wait:
+                    retry_after = math.ceil(wait)
+                    metrics.inc('ai_admission_total', endpoint=endpoint, result='rate_limited')
+                    logger.warning("API   %s | rate limited | ip=%s retry_after=%ds", endpoint, ip, retry_after)
+                    return _reject(429, retry_after, f'요청이 너무 많습니다. {retry_after}초 후 다시 시도하세요.')
+
+            current = gate()
+            if not await current.acquire():
+                metrics.inc('ai_admission_total', endpoint=endpoint, result='overloaded')
+                logger.warning("API   %s | overloaded | ip=%s waiting=%d", endpoint, ip, current.waiting)
+                return _reject(503, settings.AI_ADMISSION_RETRY_AFTER,
+                               'AI 요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도하세요.')
+            metrics.inc('ai_admission_total', endpoint=endpoint, result='admitted')
+            slot = _Slot(current)
+            try:
+                response = await view(request, *args, **kwargs)
+            except BaseException:
+                slot.release()
+                raise
+            if response.streaming:
+                response.streaming_content = _released_on_close(response.streaming_content, slot)
+                # A stream cancelled before its first chunk never runs the generator's finally.
+                weakref.finalize(response, slot.release)
+            else:
+                slot.release()
+            return response
+        return wrapper
+    return decorator
@@ -7,8 +7,19 @@ urlpatterns = [
     path('research/catalog/', views.research_catalog, name='research_catalog'),
     path('public/', views.public_index, name='public_index'),
     path('public/dashboard/', views.public_dashboard, name='public_dashboard'),
+    # Catalog API
+    path('api/compounds/', views.api_compounds, name='api_compounds'),
+    path('api/search/', views.api_search, name='api_search'),
+    path('api/export/', views.api_export, name='api_export'),
+    path('api/spectra/search/', views.api_spectra_search, name='api_spectra_search'),
+    path('api/mass/lookup/', views.api_mass_lookup, name='api_mass_lookup'),
+    path('api/origin/predict/', views.api_origin_predict, name='api_origin_predict'),
     # AI API
     path('api/chat/', views.api_chat, name='api_chat'),
     path('api/interpret/compound/', views.api_interpret_compound, name='api_interpret_compound'),
     path('api/interpret/dashboard/', views.api_interpret_dashboard, name='api_interpret_dashboard'),
+    path('api/jobs/', views.api_ai_jobs, name='api_ai_jobs'),
+    path('api/jobs/<int:job_id>/', views.api_ai_job, name='api_ai_job'),
+    # Monitoring
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -0,0 +1,64 @@
+"""Global data-version stamp for catalog data.
+
+Every write to Crop/Compound/EnvironmentData bumps the stamp, and derived
+data (facets, summaries, in-memory indexes) is keyed on it. The stamp lives
+in the ``shared`` cache so bumps from management commands reach every web
+worker; payloads keyed on it can stay in the per-process ``default`` cache.
+"""
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_KEY = 'core:data_version'
+
+
+def _store():
+    return caches['shared']
+
+
+def data_version():
+    version = _store().get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a lost stamp never reuses an old version.
+        _store().add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = _store().get(VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    try:
+        return _store().incr(VERSION_KEY)
+    except ValueError:
+        version = time.time_ns()
+        _store().set(VERSION_KEY, version, timeout=None)
+        return version
+
+
+def bump_data_version_on_commit(using=None):
+    """Bump now and again after commit, so caches rebuilt from pre-commit rows are dropped too."""
+    bump_data_version()
+    transaction.on_commit(bump_data_version, using=using)
+
+
+class VersionedValue:
+    """Process-local value rebuilt by ``build()`` the first time each data version is seen.
+
+    For derived data too large to pickle through the cache (in-memory indexes).
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._version = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = data_version()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._value = self._build()
+                    self._version = version
+        return self._value
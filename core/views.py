@@ -1,121 +1,178 @@
+import asyncio
+import base64
+import binascii
+import hmac
 import json
 import logging
+import math
 import time
-from django.http import JsonResponse
+from contextlib import aclosing
+from urllib.parse import urlencode
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
-from .models import Crop, Compound, EnvironmentData
-from . import ai_service
+from .models import AIJob, Compound, Spectrum
+from .catalog import catalog_filters, column_rows, columnar, filter_compounds
+from .dashboard import load_dashboard
+from .facets import catalog_facets
+from .http import client_ip, versioned_page
+from .summaries import summaries_by_id
+from . import ai_service, chat, export, jobs, mass_index, metrics, origin, rag, search, spectra, throttle
 
 logger = logging.getLogger('core')
 
 
-def _client_ip(request):
-    xff = request.META.get('HTTP_X_FORWARDED_FOR')
-    return xff.split(',')[0].strip() if xff else request.META.get('REMOTE_ADDR', '-')
-
-
+@versioned_page()
 def landing(request):
-    logger.info("PAGE  landing | ip=%s", _client_ip(request))
-    crop_count = Crop.objects.values('name_ko').distinct().count()
-    compound_count = Compound.objects.count()
+    logger.info("PAGE  landing | ip=%s", client_ip(request))
+    facets = catalog_facets()
     context = {
-        'crop_count': crop_count,
-        'compound_count': compound_count,
+        'crop_count': facets['crop_count'],
+        'compound_count': facets['compound_count'],
     }
     return render(request, 'landing.html', context)
 
 
+@versioned_page()
 def research_index(request):
-    logger.info("PAGE  research_index | ip=%s", _client_ip(request))
+    logger.info("PAGE  research_index | ip=%s", client_ip(request))
+    facets = catalog_facets()
     context = {
-        'compound_count': Compound.objects.count(),
-        'crop_count': Crop.objects.values('name_ko').distinct().count(),
+        'compound_count': facets['compound_count'],
+        'crop_count': facets['crop_count'],
     }
     return render(request, 'research/index.html', context)
 
 
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 200
+# Rows per columnar block of the virtual catalog list (?format=columns)
+CATALOG_BLOCK_SIZE = 2000
+CATALOG_MAX_BLOCK_SIZE = 10000
+
+
+def _encode_cursor(score, pk):
+    raw = f"{score}:{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Inverse of _encode_cursor. Raises ValueError on a malformed cursor."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        score, pk = base64.urlsafe_b64decode(padded).decode().split(':')
+        return int(score), int(pk)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+
+
+def _compound_page(compounds, cursor='', limit=CATALOG_PAGE_SIZE, columns=False):
+    """Keyset page on (-score, id): cost depends on page size, not on offset.
+
+    With ``columns`` the page is COLUMN_FIELDS tuples (id and score first) instead of compounds.
+    """
+    compounds = compounds.order_by('-score', 'id')
+    if cursor:
+        score, pk = _decode_cursor(cursor)
+        compounds = compounds.filter(Q(score__lt=score) | Q(score=score, id__gt=pk))
+    if columns:
+        compounds = column_rows(compounds)
+    rows = list(compounds[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        score, pk = (last[1], last[0]) if columns else (last.score, last.id)
+        next_cursor = _encode_cursor(score, pk)
+    return rows[:limit], next_cursor
+
+
+# Escaped so a compound name cannot close the inline <script>
+_SCRIPT_ESCAPES = {ord('<'): '\\u003C', ord('>'): '\\u003E', ord('&'): '\\u0026'}
+
+
+def _script_json(data):
+    """Compact JSON for inlining in a template <script>."""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).translate(_SCRIPT_ESCAPES)
+
+
+def _compound_json(c):
+    return {
+        'id': c.id,
+        'name': c.name,
+        'crop': c.crop.name_ko,
+        'crop_en': c.crop.name_en,
+        'part': c.crop.plant_part,
+        'origin': c.crop.origin,
+        'year': c.crop.year,
+        'level': c.annotation_level,
+        'source': c.source,
+        'score': c.score,
+        'similarity': c.similarity,
+        'qc': c.qc_status,
+        'class': c.compound_class,
+        'mw': c.molecular_weight,
+        'rt': c.retention_time,
+    }
+
+
+@versioned_page('crop', 'part', 'origin', 'year', 'qc')
 def research_catalog(request):
+    filters = catalog_filters(request.GET)
     logger.info("PAGE  research_catalog | ip=%s filters={crop=%s, part=%s, origin=%s, qc=%s}",
-                _client_ip(request),
-                request.GET.get('crop', ''), request.GET.get('part', ''),
-                request.GET.get('origin', ''), request.GET.get('qc', 'PASS'))
-    crop_filter = request.GET.get('crop', '')
-    part_filter = request.GET.get('part', '')
-    origin_filter = request.GET.get('origin', '')
-    year_filter = request.GET.get('year', '')
-    qc_filter = request.GET.get('qc', 'PASS')
-
-    compounds = Compound.objects.select_related('crop').all()
-
-    if crop_filter:
-        compounds = compounds.filter(crop__name_ko=crop_filter)
-    if part_filter:
-        compounds = compounds.filter(crop__plant_part=part_filter)
-    if origin_filter:
-        compounds = compounds.filter(crop__origin=origin_filter)
-    if year_filter:
-        compounds = compounds.filter(crop__year=int(year_filter))
-    if qc_filter:
-        compounds = compounds.filter(qc_status=qc_filter)
-
-    crops = Crop.objects.values_list('name_ko', flat=True).distinct()
-    parts = Crop.objects.values_list('plant_part', flat=True).distinct()
-    origins = Crop.objects.values_list('origin', flat=True).distinct()
-    years = Crop.objects.values_list('year', flat=True).distinct().order_by('-year')
+                client_ip(request), filters['crop'], filters['part'], filters['origin'], filters['qc'],
+                extra={'filters': filters})
+
+    rows, next_cursor = _compound_page(filter_compounds(filters), limit=CATALOG_BLOCK_SIZE, columns=True)
+    facets = catalog_facets()
 
     context = {
-        'compounds': compounds,
-        'crops': crops,
-        'parts': parts,
-        'origins': origins,
-        'years': years,
-        'current_crop': crop_filter,
-        'current_part': part_filter,
-        'current_origin': origin_filter,
-        'current_year': year_filter,
-        'current_qc': qc_filter,
-        'total_count': Compound.objects.count(),
+        'catalog_json': _script_json({**columnar(rows), 'next_cursor': next_cursor}),
+        'shown_count': len(rows),
+        'has_more': next_cursor is not None,
+        'filter_query': urlencode(filters),
+        'crops': facets['crops'],
+        'parts': facets['parts'],
+        'origins': facets['origins'],
+        'years': facets['years'],
+        'current_crop': filters['crop'],
+        'current_part': filters['part'],
+        'current_origin': filters['origin'],
+        'current_year': filters['year'],
+        'current_qc': filters['qc'],
+        'current_filters': filters,
+        'total_count': facets['compound_count'],
     }
     return render(request, 'research/catalog.html', context)
 
 
+@versioned_page()
 def public_index(request):
-    logger.info("PAGE  public_index | ip=%s", _client_ip(request))
+    logger.info("PAGE  public_index | ip=%s", client_ip(request))
     context = {
-        'crop_count': Crop.objects.values('name_ko').distinct().count(),
+        'crop_count': catalog_facets()['crop_count'],
     }
     return render(request, 'public/index.html', context)
 
 
+@versioned_page('crop_a', 'crop_b')
 def public_dashboard(request):
     crop_a_name = request.GET.get('crop_a', '인삼')
     crop_b_name = request.GET.get('crop_b', '황기')
     logger.info("PAGE  public_dashboard | ip=%s compare=%s vs %s",
-                _client_ip(request), crop_a_name, crop_b_name)
+                client_ip(request), crop_a_name, crop_b_name)
 
-    crop_a = Crop.objects.filter(name_ko=crop_a_name).first()
-    crop_b = Crop.objects.filter(name_ko=crop_b_name).first()
-
-    compounds_a = list(Compound.objects.filter(crop=crop_a).values('name', 'score', 'compound_class')) if crop_a else []
-    compounds_b = list(Compound.objects.filter(crop=crop_b).values('name', 'score', 'compound_class')) if crop_b else []
-
-    env_data = None
-    if crop_a:
-        env_data = EnvironmentData.objects.filter(region__contains=crop_a.origin).first()
-    if not env_data:
-        env_data = EnvironmentData.objects.first()
-
-    crops = Crop.objects.values_list('name_ko', flat=True).distinct()
+    data = load_dashboard(crop_a_name, crop_b_name)
+    crop_a, crop_b = data['crop_a'], data['crop_b']
+    crops = [name for name, _ in catalog_facets()['crops']]
 
     context = {
-        'crop_a': crop_a,
-        'crop_b': crop_b,
-        'compounds_a': compounds_a,
-        'compounds_b': compounds_b,
-        'compounds_a_json': json.dumps(compounds_a),
-        'compounds_b_json': json.dumps(compounds_b),
-        'env_data': env_data,
+        **data,
+        'charts_json': _script_json(data['charts']),
+        'dashboard_ai_json': json.dumps({'crop_a_id': crop_a and crop_a.pk, 'crop_b_id': crop_b and crop_b.pk}),
         'crops': crops,
         'current_crop_a': crop_a_name,
         'current_crop_b': crop_b_name,
@@ -123,49 +180,494 @@ def public_dashboard(request):
     return render(request, 'public/dashboard.html', context)
 
 
-# ========== AI API Views ==========
+# ========== Catalog API ==========
+
+def api_compounds(request):
+    """GET catalog filters, cursor, limit: a keyset page of compounds.
+
+    ``format=columns`` returns a larger block in the columnar layout of ``catalog.columnar``
+    (the virtual catalog list) instead of one object per compound.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET only'}, status=405)
+    filters = catalog_filters(request.GET)
+    columns = request.GET.get('format') == 'columns'
+    if columns:
+        default, maximum = CATALOG_BLOCK_SIZE, CATALOG_MAX_BLOCK_SIZE
+    else:
+        default, maximum = CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE
+    try:
+        limit = min(max(int(request.GET.get('limit', default)), 1), maximum)
+        compounds, next_cursor = _compound_page(
+            filter_compounds(filters), request.GET.get('cursor', ''), limit, columns)
+    except ValueError:
+        logger.warning("API   compounds | invalid params | ip=%s query=%s",
+                       client_ip(request), request.GET.urlencode())
+        return JsonResponse({'error': 'Invalid cursor, limit or year'}, status=400)
+    logger.info("API   compounds | ip=%s filters={crop=%s, part=%s, origin=%s, year=%s, qc=%s} rows=%d%s",
+                client_ip(request), filters['crop'], filters['part'], filters['origin'],
+                filters['year'], filters['qc'], len(compounds), ' columns' if columns else '',
+                extra={'filters': filters})
+    if columns:
+        return JsonResponse({**columnar(compounds), 'next_cursor': next_cursor},
+                            json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+    return JsonResponse({
+        'results': [_compound_json(c) for c in compounds],
+        'next_cursor': next_cursor,
+    })
+
+
+# ========== Data Package Export ==========
+
+def api_export(request):
+    """GET ?format=csv|jsonl|parquet plus the catalog filters: a zipped data package, streamed."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET only'}, status=405)
+    fmt = request.GET.get('format', 'csv').lower()
+    filters = catalog_filters(request.GET)
+    try:
+        export.check_format(fmt)
+        compounds = filter_compounds(filters)
+    except ValueError as e:
+        logger.warning("API   export | %s | ip=%s", e, client_ip(request))
+        return JsonResponse({'error': str(e)}, status=400)
+
+    key = export.cache_key(fmt, filters)
+    filename = f"metabolome_{fmt}_{time.strftime('%Y%m%d')}.zip"
+    cached = export.cached_package(key)
+    logger.info("API   export | ip=%s format=%s filters={crop=%s, part=%s, origin=%s, year=%s, qc=%s} cache=%s",
+                client_ip(request), fmt, filters['crop'], filters['part'], filters['origin'],
+                filters['year'], filters['qc'], 'hit' if cached else 'miss', extra={'filters': filters})
+    if cached:
+        response = FileResponse(open(cached, 'rb'), as_attachment=True, filename=filename,
+                                content_type='application/zip')
+    else:
+        response = StreamingHttpResponse(export.stream_and_cache(compounds, fmt, filters, key),
+                                         content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Export-Key'] = key
+    return response
+
+
+# ========== Compound Search API ==========
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SUGGEST_SIZE = 10
+
+
+def api_search(request):
+    """GET ?q=ginsenosid rg&limit=20 for ranked compounds; ?q=...&autocomplete=1 for name suggestions."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET only'}, status=405)
+    q = request.GET.get('q', '').strip()
+    autocomplete = request.GET.get('autocomplete') in ('1', 'true')
+    try:
+        limit = min(max(int(request.GET.get('limit', SUGGEST_SIZE if autocomplete else SEARCH_PAGE_SIZE)), 1),
+                    SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        logger.warning("API   search | invalid limit | ip=%s", client_ip(request))
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+
+    t0 = time.perf_counter()
+    if autocomplete:
+        suggestions = search.suggest(q, limit)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        logger.info("API   search | ip=%s autocomplete q=%s suggestions=%d %.1fms",
+                    client_ip(request), q, len(suggestions), elapsed_ms)
+        return JsonResponse({'query': q, 'suggestions': suggestions, 'elapsed_ms': round(elapsed_ms, 2)})
+
+    compounds, fuzzy = search.search(q, limit)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    logger.info("API   search | ip=%s q=%s results=%d fuzzy=%s %.1fms",
+                client_ip(request), q, len(compounds), fuzzy, elapsed_ms)
+    return JsonResponse({
+        'query': q,
+        'results': [{**_compound_json(c), 'synonyms': c.synonyms} for c in compounds],
+        'fuzzy': fuzzy,
+        'elapsed_ms': round(elapsed_ms, 2),
+    })
+
+
+# ========== Spectral Search API ==========
+
+SPECTRUM_MAX_TOP_K = 100
+
+
+def _spectrum_query(body):
+    """Parse a spectral search request body. Raises ValueError with a user-facing message."""
+    try:
+        precursor_mz = float(body['precursor_mz'])
+        peaks = [(float(mz), float(intensity)) for mz, intensity in body['peaks']]
+        options = {
+            'method': body.get('method', 'cosine'),
+            'top_k': min(max(int(body.get('top_k', 10)), 1), SPECTRUM_MAX_TOP_K),
+            'tolerance': float(body.get('tolerance', spectra.FRAGMENT_TOLERANCE)),
+            'min_matched': int(body.get('min_matched', 1)),
+        }
+        if body.get('precursor_tolerance') is not None:
+            options['precursor_tolerance'] = float(body['precursor_tolerance'])
+    except KeyError as e:
+        raise ValueError(f'{e.args[0]} required')
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('precursor_mz and peaks ([[mz, intensity], ...]) must be numeric')
+    if not peaks:
+        raise ValueError('peaks required')
+    if not all(math.isfinite(v) for v in [precursor_mz, *(v for peak in peaks for v in peak)]):
+        raise ValueError('precursor_mz and peaks must be finite')
+    if any(mz <= 0 for mz, _ in peaks):
+        raise ValueError('peak m/z must be positive')
+    return precursor_mz, peaks, options
+
 
 @csrf_exempt
-def api_chat(request):
+def api_spectra_search(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST only'}, status=405)
+    try:
+        precursor_mz, peaks, options = _spectrum_query(json.loads(request.body))
+        t0 = time.perf_counter()
+        library = spectra.library.get()
+        mz, intensity = zip(*peaks)
+        hits, n_candidates = library.search(precursor_mz, mz, intensity, **options)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+    except json.JSONDecodeError:
+        logger.warning("API   spectra_search | invalid JSON | ip=%s", client_ip(request))
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        logger.warning("API   spectra_search | %s | ip=%s", e, client_ip(request))
+        return JsonResponse({'error': str(e)}, status=400)
+
+    spectrum_ids = [int(library.ids[hit['index']]) for hit in hits]
+    rows = Spectrum.objects.select_related('compound__crop').in_bulk(spectrum_ids)
+    results = []
+    for pk, hit in zip(spectrum_ids, hits):
+        spectrum = rows.get(pk)
+        if spectrum is None:
+            continue
+        compound = spectrum.compound
+        results.append({
+            'spectrum_id': pk,
+            'compound_id': compound.id,
+            'compound': compound.name,
+            'crop': compound.crop.name_ko,
+            'origin': compound.crop.origin,
+            'precursor_mz': spectrum.precursor_mz,
+            'precursor_type': spectrum.precursor_type,
+            'score': round(hit['score'], 4),
+            'matched_peaks': hit['matched_peaks'],
+        })
+    logger.info("API   spectra_search | ip=%s method=%s precursor=%.4f peaks=%d candidates=%d hits=%d %.1fms",
+                client_ip(request), options['method'], precursor_mz, len(peaks),
+                n_candidates, len(results), elapsed_ms)
+    return JsonResponse({
+        'results': results,
+        'candidates': n_candidates,
+        'library_size': len(library),
+        'elapsed_ms': round(elapsed_ms, 2),
+    })
+
+
+# ========== Mass / RT Lookup API ==========
+
+MASS_MAX_QUERIES = 5000
+MASS_MAX_MATCHES = 50
+MASS_MAX_TOLERANCE = {'ppm': 100.0, 'da': 1.0}
+
+
+def _finite(value, name):
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f'{name} must be finite')
+    return value
+
+
+def _optional_float(value, name):
+    return None if value in (None, '') else _finite(value, name)
+
+
+def _mass_query(params, batch):
+    """Parse lookup options from GET params or a POST body. Raises ValueError."""
+    if batch:
+        if not isinstance(params, dict):
+            raise ValueError('request body must be a JSON object')
+        queries = params.get('queries')
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, dict) for q in queries):
+            raise ValueError('queries required: [{"mz": ..., "rt": ...}, ...]')
+        if len(queries) > MASS_MAX_QUERIES:
+            raise ValueError(f'at most {MASS_MAX_QUERIES} queries per request')
+        mz = [_finite(q['mz'], 'mz') for q in queries]
+        rt = [math.nan if q.get('rt') is None else _finite(q['rt'], 'rt') for q in queries]
+        adducts = params.get('adducts') or list(mass_index.DEFAULT_ADDUCTS)
+        if not isinstance(adducts, list):
+            raise ValueError('adducts must be a list')
+    else:
+        mz = [_finite(params['mz'], 'mz')]
+        rt = None
+        # An unescaped '+' in a query string arrives as a space: ?adducts=[M+H]+ -> '[M H] '.
+        adducts = params.get('adducts', '').replace(' ', '+')
+        adducts = [a for a in adducts.split(',') if a] or list(mass_index.DEFAULT_ADDUCTS)
+    options = {
+        'tolerance': _finite(params.get('tolerance', 5), 'tolerance'),
+        'unit': str(params.get('unit', 'ppm')).lower(),
+        'adducts': adducts,
+        'rt_min': _optional_float(params.get('rt_min'), 'rt_min'),
+        'rt_max': _optional_float(params.get('rt_max'), 'rt_max'),
+    }
+    if batch and params.get('rt_tolerance') is not None:
+        # Queries without an rt are matched on mass alone.
+        options['rt'] = rt
+        options['rt_tolerance'] = _finite(params['rt_tolerance'], 'rt_tolerance')
+    if any(value <= 0 for value in mz):
+        raise ValueError('mz must be positive')
+    if options['tolerance'] <= 0:
+        raise ValueError('tolerance must be positive')
+    cap = MASS_MAX_TOLERANCE.get(options['unit'])
+    if cap is not None and options['tolerance'] > cap:
+        raise ValueError(f"tolerance must be at most {cap:g} {options['unit']}")
+    return mz, options
+
+
+@csrf_exempt
+def api_mass_lookup(request):
+    """GET ?mz=...&tolerance=5&unit=ppm&adducts=[M+H]+,[M+Na]+&rt_min=12&rt_max=14 for one m/z;
+    POST {"queries": [{"mz", "rt"}, ...], "rt_tolerance": ..., ...} for a batch.
+    """
+    if request.method not in ('GET', 'POST'):
+        return JsonResponse({'error': 'GET or POST only'}, status=405)
+    batch = request.method == 'POST'
+    try:
+        params = json.loads(request.body) if batch else request.GET
+        mz, options = _mass_query(params, batch)
+        t0 = time.perf_counter()
+        index = mass_index.index.get()
+        query, adduct, match, ppm = index.lookup(mz, **options, limit=MASS_MAX_MATCHES)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+    except json.JSONDecodeError:
+        logger.warning("API   mass_lookup | invalid JSON | ip=%s", client_ip(request))
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except (KeyError, TypeError, ValueError) as e:
+        message = f'{e.args[0]} required' if isinstance(e, KeyError) else str(e)
+        logger.warning("API   mass_lookup | %s | ip=%s", message, client_ip(request))
+        return JsonResponse({'error': message}, status=400)
+
+    results = [{'mz': value, 'matches': []} for value in mz]
+    adducts = options['adducts']
+    # Matches arrive closest first (smallest |ppm|), at most MASS_MAX_MATCHES per query.
+    for q, a, i, err in zip(query.tolist(), adduct.tolist(), match.tolist(), ppm.tolist()):
+        results[q]['matches'].append({
+            'compound_id': int(index.ids[i]),
+            'name': index.names[i],
+            'crop': index.crops[i],
+            'adduct': adducts[a],
+            'molecular_weight': float(index.mass[i]),
+            'retention_time': None if math.isnan(index.rt[i]) else float(index.rt[i]),
+            'ppm': round(err, 3),
+        })
+    logger.info("API   mass_lookup | ip=%s queries=%d adducts=%s tol=%s%s matches=%d %.1fms",
+                client_ip(request), len(mz), ','.join(adducts), options['tolerance'],
+                options['unit'], len(match), elapsed_ms)
+    return JsonResponse({
+        'results': results if batch else results[0]['matches'],
+        'index_size': len(index),
+        'elapsed_ms': round(elapsed_ms, 2),
+    })
+
+
+# ========== Origin Discrimination API ==========
+
+ORIGIN_MAX_SAMPLES = 5000
+
+
+@csrf_exempt
+def api_origin_predict(request):
+    """POST {"crop": "인삼", "samples": [{"id": ..., "profile": {compound name: score}}, ...]}.
+
+    For large batches send columns once instead: {"crop", "features": [names],
+    "samples": [{"id": ..., "values": [score per feature]}, ...]}.
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'POST only'}, status=405)
     try:
         body = json.loads(request.body)
-        messages = body.get('messages', [])
-        if not messages:
-            return JsonResponse({'error': 'messages required'}, status=400)
-        last_msg = messages[-1].get('content', '')[:100]
-        logger.info("API   chat | ip=%s msg_count=%d last=\"%s\"",
-                     _client_ip(request), len(messages), last_msg)
-        t0 = time.time()
-        result = ai_service.chat_completion(messages)
-        elapsed = time.time() - t0
-        if 'error' in result:
-            logger.warning("API   chat ERROR | %.1fs | %s", elapsed, result['error'])
+        crop = body.get('crop', '')
+        samples = body.get('samples')
+        if not isinstance(samples, list) or not samples:
+            raise ValueError('samples required: [{"id": ..., "profile": {compound: value}}, ...]')
+        if len(samples) > ORIGIN_MAX_SAMPLES:
+            raise ValueError(f'at most {ORIGIN_MAX_SAMPLES} samples per request')
+        model = origin.get_model(crop)
+        if model is None:
+            return JsonResponse({'error': f'no origin model for crop "{crop}"'}, status=404)
+        t0 = time.perf_counter()
+        if 'features' in body:
+            X, matched = model.vectorize_columns(body['features'], [sample['values'] for sample in samples])
         else:
-            logger.info("API   chat OK | %.1fs | reply=%s...",
-                        elapsed, result.get('content', '')[:80])
-        return JsonResponse(result)
+            X, matched = model.vectorize([sample.get('profile') or {} for sample in samples])
+        probs = model.predict(X)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
     except json.JSONDecodeError:
-        logger.warning("API   chat | invalid JSON | ip=%s", _client_ip(request))
+        logger.warning("API   origin_predict | invalid JSON | ip=%s", client_ip(request))
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        message = f'{e.args[0]} required' if isinstance(e, KeyError) else str(e)
+        logger.warning("API   origin_predict | %s | ip=%s", message, client_ip(request))
+        return JsonResponse({'error': message}, status=400)
+
+    predictions = []
+    for sample, row, n in zip(samples, probs.tolist(), matched):
+        best = max(range(len(row)), key=row.__getitem__)
+        predictions.append({
+            'id': sample.get('id'),
+            'origin': model.classes[best],
+            'confidence': round(row[best], 4),
+            'probabilities': {c: round(p, 4) for c, p in zip(model.classes, row)},
+            'matched_features': n,
+        })
+    logger.info("API   origin_predict | ip=%s crop=%s samples=%d %.1fms",
+                client_ip(request), crop, len(samples), elapsed_ms)
+    return JsonResponse({
+        'crop': crop,
+        'model': {k: model.meta[k] for k in ('classes', 'n_samples', 'n_components', 'loo_accuracy', 'trained_at')},
+        'predictions': predictions,
+        'elapsed_ms': round(elapsed_ms, 2),
+    })
+
+
+# ========== AI API Views ==========
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _chat_events(messages, on_reply=None, extra=None):
+    """Relay the provider token stream as SSE: token* then done, or error.
+
+    ``on_reply(reply)`` is awaited with the complete reply before ``done``; ``extra`` joins the done payload.
+    """
+    t0 = time.time()
+    ttft = None
+    parts = []
+    try:
+        async with aclosing(ai_service.achat_stream(messages)) as stream:
+            async for delta in stream:
+                if ttft is None:
+                    ttft = time.time() - t0
+                parts.append(delta)
+                yield _sse('token', {'content': delta})
+    except (asyncio.CancelledError, GeneratorExit):
+        logger.info("API   chat STREAM cancelled | %.1fs ttft=%s | client disconnected after %d chunks",
+                    time.time() - t0, f"{ttft:.2f}s" if ttft is not None else '-', len(parts))
+        raise
+    except Exception as e:
+        logger.warning("API   chat STREAM ERROR | %.1fs | %s", time.time() - t0, e)
+        yield _sse('error', {'error': str(e)})
+        return
+    reply = ''.join(parts)
+    logger.info("API   chat STREAM OK | %.1fs ttft=%.2fs | reply=%s...",
+                time.time() - t0, ttft or 0.0, reply[:80])
+    if on_reply:
+        await on_reply(reply)
+    yield _sse('done', {'role': 'assistant', 'content': reply, **(extra or {})})
 
 
 @csrf_exempt
-def api_interpret_compound(request):
+@throttle.admit('chat')
+async def api_chat(request):
+    """Chat turn: ``{session, message}`` with history kept server-side (core.chat).
+
+    The prompt also carries the catalog records most relevant to the message (core.rag).
+
+    ``{messages}`` (the whole history, client-held) is still accepted and trimmed to the token budget.
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'POST only'}, status=405)
     try:
         body = json.loads(request.body)
-        compound_data = body.get('compound', {})
+    except json.JSONDecodeError:
+        logger.warning("API   chat | invalid JSON | ip=%s", client_ip(request))
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    message = body.get('message', '')
+    if not isinstance(message, str):
+        return JsonResponse({'error': 'message must be a string'}, status=400)
+    message = message.strip()
+    if message:
+        if not chat.fits(message):
+            return JsonResponse({'error': '메시지가 너무 깁니다.'}, status=400)
+        session, messages = await chat.aprepare(body.get('session'), message, await rag.acontext(message))
+        extra = {'session': str(session.key)}
+
+        async def on_reply(reply):
+            await chat.arecord(session, message, reply)
+    else:
+        messages = body.get('messages', [])
+        if not messages:
+            return JsonResponse({'error': 'message required'}, status=400)
+        context = await rag.acontext(messages[-1].get('content', ''))
+        messages = chat.fit_messages(messages, context)
+        if context:
+            messages.insert(len(messages) - 1, {'role': 'system', 'content': context})
+        extra, on_reply = {}, None
+    tokens = sum(chat.estimate_tokens(m.get('content', '')) for m in messages)
+    logger.info("API   chat | ip=%s session=%s msg_count=%d tokens~%d last=\"%s\"",
+                client_ip(request), extra.get('session', '-'), len(messages), tokens,
+                messages[-1].get('content', '')[:100])
+    if body.get('stream'):
+        response = StreamingHttpResponse(_chat_events(messages, on_reply, extra), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    t0 = time.time()
+    result = await ai_service.achat_completion(messages)
+    elapsed = time.time() - t0
+    if 'error' in result:
+        logger.warning("API   chat ERROR | %.1fs | %s", elapsed, result['error'])
+    else:
+        logger.info("API   chat OK | %.1fs | reply=%s...",
+                    elapsed, result.get('content', '')[:80])
+        if on_reply:
+            await on_reply(result['content'])
+    return JsonResponse({**result, **extra})
+
+
+def _dashboard_payload(crop_a_id, crop_b_id):
+    """ai_service.dashboard_payload for two crops as their dashboard shows them, or None if either is missing."""
+    crops = summaries_by_id([crop_a_id, crop_b_id])
+    if crop_a_id not in crops or crop_b_id not in crops:
+        return None
+    summary_a, summary_b = crops[crop_a_id].summary, crops[crop_b_id].summary
+    return ai_service.dashboard_payload(crops[crop_a_id].name_ko, summary_a.compounds,
+                                        crops[crop_b_id].name_ko, summary_b.compounds, summary_a.environment)
+
+
+@csrf_exempt
+@throttle.admit('interpret_compound')
+async def api_interpret_compound(request):
+    """Interpret one compound: ``{compound_id}``, loaded here with its crop in one query.
+
+    ``{compound}`` (the data itself, assembled by the client) is still accepted.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST only'}, status=405)
+    try:
+        body = json.loads(request.body)
+        if 'compound_id' in body:
+            if not isinstance(body['compound_id'], int):
+                return JsonResponse({'error': 'compound_id must be an integer'}, status=400)
+            compound = await Compound.objects.select_related('crop').filter(pk=body['compound_id']).afirst()
+            if compound is None:
+                return JsonResponse({'error': 'compound not found'}, status=404)
+            compound_data = ai_service.compound_payload(compound)
+        else:
+            compound_data = body.get('compound', {})
         if not compound_data:
-            return JsonResponse({'error': 'compound data required'}, status=400)
+            return JsonResponse({'error': 'compound_id required'}, status=400)
         name = compound_data.get('name', '?')
         crop = compound_data.get('crop', '?')
         logger.info("API   interpret_compound | ip=%s compound=%s crop=%s",
-                     _client_ip(request), name, crop)
+                     client_ip(request), name, crop)
         t0 = time.time()
-        result = ai_service.interpret_compound(compound_data)
+        result = await ai_service.ainterpret_compound(compound_data)
         elapsed = time.time() - t0
         if 'error' in result:
             logger.warning("API   interpret_compound ERROR | %.1fs | %s", elapsed, result['error'])
@@ -173,25 +675,38 @@ def api_interpret_compound(request):
             logger.info("API   interpret_compound OK | %.1fs | %s", elapsed, name)
         return JsonResponse(result)
     except json.JSONDecodeError:
-        logger.warning("API   interpret_compound | invalid JSON | ip=%s", _client_ip(request))
+        logger.warning("API   interpret_compound | invalid JSON | ip=%s", client_ip(request))
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
 
 
 @csrf_exempt
-def api_interpret_dashboard(request):
+@throttle.admit('interpret_dashboard')
+async def api_interpret_dashboard(request):
+    """Interpret a crop comparison: ``{crop_a_id, crop_b_id}``, loaded here from the crops' summaries.
+
+    ``{dashboard}`` (the data itself, assembled by the client) is still accepted.
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'POST only'}, status=405)
     try:
         body = json.loads(request.body)
-        dashboard_data = body.get('dashboard', {})
+        if 'crop_a_id' in body or 'crop_b_id' in body:
+            ids = [body.get('crop_a_id'), body.get('crop_b_id')]
+            if not all(isinstance(pk, int) for pk in ids):
+                return JsonResponse({'error': 'crop_a_id and crop_b_id must be integers'}, status=400)
+            dashboard_data = await sync_to_async(_dashboard_payload)(*ids)
+            if dashboard_data is None:
+                return JsonResponse({'error': 'crop not found'}, status=404)
+        else:
+            dashboard_data = body.get('dashboard', {})
         if not dashboard_data:
-            return JsonResponse({'error': 'dashboard data required'}, status=400)
+            return JsonResponse({'error': 'crop_a_id and crop_b_id required'}, status=400)
         crop_a = dashboard_data.get('crop_a', {}).get('name', '?')
         crop_b = dashboard_data.get('crop_b', {}).get('name', '?')
         logger.info("API   interpret_dashboard | ip=%s compare=%s vs %s",
-                     _client_ip(request), crop_a, crop_b)
+                     client_ip(request), crop_a, crop_b)
         t0 = time.time()
-        result = ai_service.interpret_dashboard(dashboard_data)
+        result = await ai_service.ainterpret_dashboard(dashboard_data)
         elapsed = time.time() - t0
         if 'error' in result:
             logger.warning("API   interpret_dashboard ERROR | %.1fs | %s", elapsed, result['error'])
@@ -199,5 +714,77 @@ def api_interpret_dashboard(request):
             logger.info("API   interpret_dashboard OK | %.1fs | %s vs %s", elapsed, crop_a, crop_b)
         return JsonResponse(result)
     except json.JSONDecodeError:
-        logger.warning("API   interpret_dashboard | invalid JSON | ip=%s", _client_ip(request))
+        logger.warning("API   interpret_dashboard | invalid JSON | ip=%s", client_ip(request))
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+
+# ========== AI Batch Jobs ==========
+
+def _job_compound_ids(body):
+    """Compound ids for a batch job from ``compound_ids`` or a catalog ``filters`` dict.
+
+    Raises ValueError with a user-facing message.
+    """
+    limit = settings.AI_JOB_MAX_ITEMS
+    if 'compound_ids' in body:
+        ids = body['compound_ids']
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            raise ValueError('compound_ids must be a list of integers')
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > limit:
+            raise ValueError(f'at most {limit} compounds per job')
+        unknown = set(ids) - set(Compound.objects.filter(pk__in=ids).values_list('id', flat=True))
+        if unknown:
+            raise ValueError(f'unknown compound ids: {sorted(unknown)[:20]}')
+        return ids
+    if isinstance(body.get('filters'), dict):
+        compounds = filter_compounds(catalog_filters(body['filters'])).order_by('-score', 'id')
+        ids = list(compounds.values_list('id', flat=True)[:limit + 1])
+        if len(ids) > limit:
+            raise ValueError(f'filter matches more than {limit} compounds; narrow it down')
+        return ids
+    raise ValueError('compound_ids or filters required')
+
+
+@csrf_exempt
+def api_ai_jobs(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST only'}, status=405)
+    try:
+        body = json.loads(request.body)
+        ids = _job_compound_ids(body)
+    except json.JSONDecodeError:
+        logger.warning("API   ai_jobs | invalid JSON | ip=%s", client_ip(request))
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        logger.warning("API   ai_jobs | %s | ip=%s", e, client_ip(request))
+        return JsonResponse({'error': str(e)}, status=400)
+    if not ids:
+        return JsonResponse({'error': 'no compounds matched'}, status=400)
+    job = jobs.enqueue(ids, body.get('filters'))
+    logger.info("API   ai_jobs | ip=%s job=%d items=%d", client_ip(request), job.pk, len(ids))
+    return JsonResponse({
+        'job_id': job.pk,
+        'status': job.status,
+        'total': len(ids),
+        'status_url': reverse('api_ai_job', args=[job.pk]),
+    }, status=202)
+
+
+def api_ai_job(request, job_id):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET only'}, status=405)
+    job = AIJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return JsonResponse({'error': 'job not found'}, status=404)
+    return JsonResponse(jobs.job_status(job, include_items=request.GET.get('items') != '0'))
+
+
+# ========== Metrics ==========
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (all workers, see core.metrics)."""
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')